@@ -0,0 +1,8 @@
+"""
+Benchmarks for the chat and ingestion paths.
+
+Everything runs locally: LLM calls go to the mock provider, web search to a
+stub HTTP server and documents come from a seeded synthetic corpus, so runs
+need no API keys or network and are comparable between machines and
+commits. See README.md ("Benchmarks") for usage.
+"""
@@ -0,0 +1,337 @@
+"""
+End-to-end benchmark of the chat execution path.
+
+Runs synthetic workflows (1-20 knowledge base nodes, with and without web
+search, chat histories of several lengths) through WorkflowExecutor.execute
+and through POST /api/chat/execute, against the mock LLM provider, a stub
+search server and a seeded synthetic corpus. Reports throughput, latency
+percentiles, a per-stage breakdown from the execution logs and peak RSS.
+
+    cd backend
+    python -m benchmarks.chat --output bench.json
+    python -m benchmarks.chat --embeddings hash --kb 1,5 --compare bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.metrics import compare, environment, peak_rss_mb, save, stage_breakdown, summarize
+
+
+BENCH_USER_HEADER = "X-Bench-User"
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the chat execution path")
+    parser.add_argument("--mode", choices=("executor", "endpoint", "both"), default="both")
+    parser.add_argument("--kb", type=_int_list, default=[1, 5, 20], help="knowledge base node counts (max 20)")
+    parser.add_argument("--web", default="off,on", help="web search settings to run: off, on or off,on")
+    parser.add_argument("--history", type=_int_list, default=[0, 10, 40], help="chat history lengths in turns")
+    parser.add_argument("--iterations", type=int, default=30, help="measured executions per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured executions per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="executions in flight")
+    parser.add_argument("--retrieval-mode", default="dense", choices=("dense", "sparse", "hybrid"))
+    parser.add_argument("--chunks-per-document", type=int, default=40)
+    parser.add_argument("--embeddings", choices=("local", "hash"), default="local",
+                        help="local sentence-transformers model, or hashed bag-of-words when it is unavailable")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--llm-error-rate", type=float, default=0)
+    parser.add_argument("--search-latency-ms", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--workdir", help="directory for the database, ChromaDB and indexes (default: temporary)")
+    args = parser.parse_args(argv)
+    args.web = [part.strip() == "on" for part in args.web.split(",") if part.strip()]
+    if max(args.kb) > 20:
+        parser.error("--kb supports at most 20 knowledge base nodes")
+    return args
+
+
+def build_workflow(collections: List[Tuple[str, str]], web: bool, retrieval_mode: str) -> Dict[str, Any]:
+    """userQuery -> N knowledgeBase -> llmEngine (mock provider) -> output"""
+    nodes = [{"id": "query", "type": "userQuery", "data": {}}]
+    edges = []
+    for i, (collection_name, filename) in enumerate(collections):
+        node_id = f"kb{i}"
+        nodes.append({"id": node_id, "type": "knowledgeBase", "data": {
+            "collectionName": collection_name,
+            "filename": filename,
+            "retrievalMode": retrieval_mode,
+            "rerank": False
+        }})
+        edges.append({"source": "query", "target": node_id})
+        edges.append({"source": node_id, "target": "llm"})
+    if not collections:
+        edges.append({"source": "query", "target": "llm"})
+    nodes.append({"id": "llm", "type": "llmEngine", "data": {
+        "provider": "mock",
+        "model": "gemini-2.5-flash",
+        "prompt": "You are a helpful assistant. Answer from the provided context.",
+        "enableWebSearch": web,
+        "serpApiKey": "bench" if web else "",
+        "cacheResponses": False
+    }})
+    nodes.append({"id": "output", "type": "output", "data": {}})
+    edges.append({"source": "llm", "target": "output"})
+    return {"nodes": nodes, "edges": edges}
+
+
+def configure(args: argparse.Namespace, workdir: str):
+    """Point settings at the work directory and local stand-ins; must run before backend imports"""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ["CHROMA_PERSIST_DIR"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_DIR"] = os.path.join(workdir, "lexical")
+    os.environ["LLM_PROVIDER"] = "mock"
+    os.environ["LLM_MOCK_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["LLM_MOCK_TOKENS_PER_SECOND"] = str(args.llm_tokens_per_second)
+    os.environ["LLM_MOCK_ERROR_RATE"] = str(args.llm_error_rate)
+    os.environ["LLM_MOCK_SEED"] = str(args.seed)
+    # Every query is new, but the response cache would still hide repeats across scenarios
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("BRAVE_API_KEY", "bench")
+
+
+def create_registry(embedding_service: Any) -> Any:
+    """A ServiceRegistry built around the given embedding service (no ingestion pipeline)"""
+    from config import settings
+    from services.conversation_memory import ConversationMemory
+    from services.lexical_index import LexicalIndexStore
+    from services.registry import ServiceRegistry
+    from services.response_cache import ResponseCache
+    from services.vector_store import VectorStoreService
+    
+    class BenchmarkRegistry(ServiceRegistry):
+        def __init__(self):
+            self.chroma_client = VectorStoreService.create_client()
+            self.vector_store = VectorStoreService(client=self.chroma_client)
+            self.embedding_service = embedding_service
+            self.lexical_index = LexicalIndexStore(settings.LEXICAL_INDEX_DIR, settings.LEXICAL_INDEX_CACHE_SIZE)
+            self.reranker = None
+            self.memory = ConversationMemory(embedding_service)
+            self.response_cache = ResponseCache(max_entries=settings.RESPONSE_CACHE_SIZE)
+            self.log_sink = self._create_log_sink()
+            self.http_session = self._create_http_session(32)
+        
+        def close(self):
+            from services.llm import LLMService
+            from services.web_search import WebSearchService
+            
+            self.memory.shutdown()
+            self.log_sink.shutdown()
+            self.http_session.close()
+            WebSearchService.shutdown()
+            LLMService.shutdown()
+    
+    return BenchmarkRegistry()
+
+
+def executor_runner(registry: Any) -> Callable[..., Tuple[str, List[Dict[str, Any]]]]:
+    def run(workflow: Dict[str, Any], query: str, history: List[Dict[str, str]], worker: int):
+        executor = registry.create_executor()
+        result = executor.execute(workflow, query, {}, chat_history=history, user_id=1)
+        return result["response"], result["logs"]
+    return run
+
+
+def endpoint_runner(registry: Any) -> Tuple[Callable[..., Tuple[str, List[Dict[str, Any]]]], Callable[[], None]]:
+    """Serve the app with uvicorn on a free local port; returns (run, stop)"""
+    import socket
+    import threading
+    
+    import requests
+    import uvicorn
+    from fastapi import Request
+    from main import app
+    from models.user import User
+    from services.auth import get_current_user
+    from services.registry import get_registry
+    
+    def bench_user(request: Request) -> User:
+        # One user per worker so the per-user execution limit does not reject the load
+        user_id = int(request.headers.get(BENCH_USER_HEADER, "1"))
+        return User(id=user_id, email=f"bench{user_id}@example.com", name="bench", hashed_password="")
+    
+    app.dependency_overrides[get_current_user] = bench_user
+    app.dependency_overrides[get_registry] = lambda: registry
+    
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # Startup hooks would build the production registry; the overrides replace it
+    app.router.on_startup.clear()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=64))
+    url = f"http://127.0.0.1:{port}/api/chat/execute"
+    
+    def run(workflow: Dict[str, Any], query: str, history: List[Dict[str, str]], worker: int):
+        response = session.post(
+            url,
+            json={"workflow": workflow, "query": query, "config": {}, "chat_history": history},
+            headers={BENCH_USER_HEADER: str(worker + 1)},
+            timeout=120
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        body = response.json()
+        return body["response"], body["logs"]
+    
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=10)
+        session.close()
+    
+    return run, stop
+
+
+def run_scenario(
+    name: str,
+    run: Callable[..., Tuple[str, List[Dict[str, Any]]]],
+    workflow: Dict[str, Any],
+    queries: List[str],
+    history: List[Dict[str, str]],
+    warmup: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    for query in queries[:warmup]:
+        run(workflow, query, history, 0)
+    measured = queries[warmup:]
+    
+    def timed(item: Tuple[int, str]) -> Tuple[float, Optional[List[Dict[str, Any]]], Optional[str]]:
+        index, query = item
+        started = time.perf_counter()
+        try:
+            response, logs = run(workflow, query, history, index % concurrency)
+        except Exception as e:
+            return (time.perf_counter() - started) * 1000, None, str(e)
+        error = response if response.startswith("Error generating response") else None
+        return (time.perf_counter() - started) * 1000, logs, error
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, enumerate(measured)))
+    wall = time.perf_counter() - started
+    
+    latencies = [ms for ms, _, error in outcomes if error is None]
+    errors = [error for _, _, error in outcomes if error is not None]
+    latency = summarize(latencies)
+    return {
+        "name": name,
+        "executions": len(measured),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "mean_ms": latency.get("mean_ms"),
+        "p50_ms": latency.get("p50_ms"),
+        "p95_ms": latency.get("p95_ms"),
+        "p99_ms": latency.get("p99_ms"),
+        "max_ms": latency.get("max_ms"),
+        "stages": stage_breakdown(logs for _, logs, _ in outcomes if logs is not None),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="chat-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    configure(args, workdir)
+    
+    from benchmarks.standins import HashEmbeddingService, SearchStubServer
+    from config import settings
+    from database import init_db
+    from services.web_search import WebSearchService
+    
+    search = SearchStubServer(args.search_latency_ms, args.search_latency_ms * 1.5).start()
+    settings.SERPAPI_URL = search.serpapi_url
+    settings.BRAVE_SEARCH_URL = search.brave_url
+    init_db()
+    
+    if args.embeddings == "hash":
+        embedding_service = HashEmbeddingService()
+    else:
+        from services.local_embedding import LocalEmbeddingService
+        embedding_service = LocalEmbeddingService()
+    registry = create_registry(embedding_service)
+    
+    corpus = SyntheticCorpus(max(args.kb), chunks_per_document=args.chunks_per_document, seed=args.seed)
+    started = time.perf_counter()
+    corpus.load(registry.vector_store, embedding_service, registry.lexical_index, user_id=1)
+    print(f"Loaded {corpus.num_documents} synthetic documents "
+          f"({corpus.num_documents * corpus.chunks_per_document} chunks) in {time.perf_counter() - started:.1f}s")
+    
+    modes = ["executor", "endpoint"] if args.mode == "both" else [args.mode]
+    scenarios = []
+    try:
+        for mode in modes:
+            if mode == "executor":
+                run, stop = executor_runner(registry), None
+            else:
+                run, stop = endpoint_runner(registry)
+            for kb_count in args.kb:
+                collections = [(d["collection_name"], d["filename"]) for d in corpus.documents[:kb_count]]
+                for web in args.web:
+                    workflow = build_workflow(collections, web, args.retrieval_mode)
+                    for turns in args.history:
+                        name = f"{mode}/kb{kb_count}/{'web' if web else 'noweb'}/h{turns}"
+                        # Fresh queries per scenario so no cache carries over between them
+                        queries = [q for q, _ in corpus.queries(args.warmup + args.iterations, kb_count, seed=name)]
+                        history = SyntheticCorpus.chat_history(turns, seed=args.seed)
+                        WebSearchService.shared_cache().clear()
+                        # Per-step log lines would dominate the output (and the timings)
+                        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                            result = run_scenario(name, run, workflow, queries, history, args.warmup, args.concurrency)
+                        scenarios.append(result)
+                        print(f"{name:32} {result['throughput_rps']:>7} req/s  p50 {result['p50_ms']}ms  "
+                              f"p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  errors {result['errors']}  "
+                              f"rss {result['peak_rss_mb']}MB")
+            if stop is not None:
+                stop()
+    finally:
+        registry.close()
+        search.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    results = {
+        "benchmark": "chat",
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+        "search_requests": search.requests,
+        "scenarios": scenarios
+    }
+    if args.output:
+        save(results, args.output)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        for line in compare(results, baseline):
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
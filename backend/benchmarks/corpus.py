@@ -0,0 +1,163 @@
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+
+COMMON_WORDS = (
+    "the", "of", "and", "to", "in", "is", "for", "that", "with", "as", "on", "by",
+    "this", "are", "be", "from", "which", "or", "an", "it", "at", "can", "its", "their"
+)
+
+DOMAIN_WORDS = (
+    "system", "process", "model", "data", "network", "policy", "report", "market",
+    "energy", "protein", "climate", "contract", "engine", "signal", "tariff", "reactor",
+    "vaccine", "ledger", "harbor", "orbit", "glacier", "circuit", "enzyme", "treaty",
+    "turbine", "archive", "sensor", "budget", "canal", "genome", "fiber", "quota",
+    "satellite", "membrane", "pipeline", "consensus", "catalyst", "dividend", "aquifer", "lattice"
+)
+
+
+class SyntheticCorpus:
+    """
+    Seeded synthetic documents for retrieval benchmarks.
+    
+    Each document has its own topic vocabulary mixed with common words, so
+    queries drawn from one document retrieve mostly from it. The same seed
+    always produces the same documents and queries.
+    """
+    
+    def __init__(
+        self,
+        num_documents: int,
+        chunks_per_document: int = 40,
+        words_per_chunk: int = 120,
+        seed: int = 0
+    ):
+        self.num_documents = num_documents
+        self.chunks_per_document = chunks_per_document
+        self.words_per_chunk = words_per_chunk
+        self.seed = seed
+        self.documents = [self._document(i) for i in range(num_documents)]
+    
+    def _document(self, index: int) -> Dict[str, Any]:
+        rng = random.Random(f"{self.seed}:doc:{index}")
+        topic = [f"{rng.choice(DOMAIN_WORDS)}{rng.randint(0, 999)}" for _ in range(30)] + rng.sample(DOMAIN_WORDS, 8)
+        chunks = []
+        for _ in range(self.chunks_per_document):
+            words = [
+                rng.choice(topic) if rng.random() < 0.35 else rng.choice(COMMON_WORDS + DOMAIN_WORDS)
+                for _ in range(self.words_per_chunk)
+            ]
+            sentences = [" ".join(words[i:i + 15]).capitalize() + "." for i in range(0, len(words), 15)]
+            chunks.append(" ".join(sentences))
+        return {
+            "collection_name": f"bench_{self.seed}_{index:03d}",
+            "filename": f"synthetic_{index:03d}.txt",
+            "chunks": chunks
+        }
+    
+    def text(self, index: int) -> str:
+        """Full text of a document, e.g. for ingestion benchmarks"""
+        return "\n\n".join(self.documents[index]["chunks"])
+    
+    def load(
+        self,
+        vector_store: Any,
+        embedding_service: Any,
+        lexical_index: Optional[Any] = None,
+        user_id: Optional[int] = None,
+        batch_size: int = 256
+    ) -> List[str]:
+        """Embed and index every document; returns the collection names"""
+        names = []
+        for document in self.documents:
+            texts = document["chunks"]
+            metadatas = [{"chunk_index": i, "filename": document["filename"]} for i in range(len(texts))]
+            embeddings: List[List[float]] = []
+            for start in range(0, len(texts), batch_size):
+                embeddings.extend(embedding_service.generate_embeddings(texts[start:start + batch_size]))
+            vector_store.add_documents(document["collection_name"], texts, embeddings, metadatas, user_id=user_id)
+            if lexical_index is not None:
+                lexical_index.build(document["collection_name"], texts, metadatas, user_id=user_id)
+            names.append(document["collection_name"])
+        return names
+    
+    def queries(self, count: int, documents: Optional[int] = None, seed: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(query, source document) pairs drawn from the first `documents` documents"""
+        rng = random.Random(f"{self.seed if seed is None else seed}:queries")
+        pool = self.documents[:documents or self.num_documents]
+        queries = []
+        for _ in range(count):
+            index = rng.randrange(len(pool))
+            words = [w.strip(".").lower() for w in rng.choice(pool[index]["chunks"]).split()]
+            start = rng.randrange(max(1, len(words) - 8))
+            queries.append((f"What does the document say about {' '.join(words[start:start + 8])}?", index))
+        return queries
+    
+    @staticmethod
+    def chat_history(turns: int, seed: int = 0) -> List[Dict[str, str]]:
+        """Alternating user/assistant messages, `turns` exchanges long"""
+        rng = random.Random(f"{seed}:history")
+        messages = []
+        for _ in range(turns):
+            messages.append({"role": "user", "content": " ".join(rng.choices(DOMAIN_WORDS + COMMON_WORDS, k=12)) + "?"})
+            messages.append({"role": "assistant", "content": " ".join(rng.choices(DOMAIN_WORDS + COMMON_WORDS, k=60)) + "."})
+        return messages
+
+
+def page_text(rng: random.Random, lines: int = 40, words_per_line: int = 13) -> str:
+    """About one printed page of prose"""
+    words = COMMON_WORDS + DOMAIN_WORDS
+    sentences, sentence = [], []
+    for _ in range(lines * words_per_line):
+        sentence.append(rng.choice(words))
+        if len(sentence) >= rng.randint(8, 20):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    text = " ".join(sentences)
+    # Wrap into lines so PDF pages fill the same way text pages do
+    out, line = [], []
+    for word in text.split():
+        line.append(word)
+        if len(line) == words_per_line:
+            out.append(" ".join(line))
+            line = []
+    if line:
+        out.append(" ".join(line))
+    return "\n".join(out)
+
+
+def generate_file(directory: str, file_format: str, pages: int, seed: int = 0) -> str:
+    """
+    Write a synthetic pdf, txt or md document of `pages` pages (reused if it
+    already exists). Markdown gets a heading per page and a paragraph break
+    every few lines, text files a blank line between pages.
+    """
+    path = os.path.join(directory, f"synthetic_{seed}_{pages}p.{file_format}")
+    if os.path.exists(path):
+        return path
+    rng = random.Random(f"{seed}:{file_format}:{pages}")
+    staging = f"{path}.partial"
+    if file_format == "pdf":
+        import fitz  # PyMuPDF
+        
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_text((54, 60), page_text(rng), fontsize=9)
+        doc.save(staging, garbage=0, deflate=True)
+        doc.close()
+    elif file_format in ("txt", "md"):
+        with open(staging, "w", encoding="utf-8") as f:
+            for number in range(1, pages + 1):
+                text = page_text(rng)
+                if file_format == "md":
+                    lines = text.split("\n")
+                    text = f"## Section {number}\n\n" + "\n\n".join(
+                        "\n".join(lines[i:i + 8]) for i in range(0, len(lines), 8)
+                    )
+                f.write(text + "\n\n")
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+    os.replace(staging, path)
+    return path
@@ -0,0 +1,272 @@
+"""
+Throughput benchmark of the document ingestion path.
+
+Runs the stages of an upload one after another over generated PDF, TXT and
+Markdown files (1 to 5,000 pages): text extraction
+(TextExtractor.iter_pages), chunking (the configured chunker), embedding
+(generate_embeddings in ingestion-sized batches) and the ChromaDB insert
+(VectorStoreService.add_documents). Reports pages/s, chunks/s,
+embeddings/s, insert rate and peak memory per stage, and names the
+slowest stage. Optionally profiles each document with cProfile or records a
+py-spy flamegraph of the whole run.
+
+    cd backend
+    python -m benchmarks.ingestion --output ingest.json
+    python -m benchmarks.ingestion --formats pdf --pages 1000 --profile cprofile
+    python -m benchmarks.ingestion --profile py-spy --pages 5000
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from benchmarks.corpus import generate_file
+from benchmarks.metrics import RSSSampler, compare, environment, peak_rss_mb, save
+
+
+STAGES = ("extract", "chunk", "embed", "insert")
+PYSPY_ENV = "BENCH_UNDER_PYSPY"
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the document ingestion path")
+    parser.add_argument("--formats", default="pdf,txt,md", help="comma-separated: pdf, txt, md")
+    parser.add_argument("--pages", type=_int_list, default=[1, 10, 100, 1000, 5000], help="document sizes in pages")
+    parser.add_argument("--chunking", choices=("tokens", "characters"), help="chunking strategy (default: CHUNKING_STRATEGY)")
+    parser.add_argument("--embed-batch-size", type=int, help="texts per generate_embeddings call (default: INGEST_EMBED_BATCH_SIZE)")
+    parser.add_argument("--insert-batch-size", type=int, default=1000, help="chunks per add_documents call")
+    parser.add_argument("--extract-processes", type=int, help="PDF extraction processes (default: PDF_EXTRACT_PROCESSES)")
+    parser.add_argument("--embeddings", choices=("local", "hash"), default="local",
+                        help="local sentence-transformers model, or hashed bag-of-words when it is unavailable")
+    parser.add_argument("--skip-embed", action="store_true", help="stop after chunking (extraction and chunking only)")
+    parser.add_argument("--profile", choices=("cprofile", "py-spy"), help="write a profile per document, or a flamegraph of the run")
+    parser.add_argument("--profile-dir", default="profiles", help="where profiles and flamegraphs are written")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--workdir", help="directory for generated files and ChromaDB (default: temporary; reuse it to skip file generation)")
+    args = parser.parse_args(argv)
+    args.formats = [part.strip() for part in args.formats.split(",") if part.strip()]
+    unknown = set(args.formats) - {"pdf", "txt", "md"}
+    if unknown:
+        parser.error(f"unsupported format(s): {', '.join(sorted(unknown))}")
+    return args
+
+
+def run_under_pyspy(args: argparse.Namespace, argv: List[str]) -> int:
+    """Re-run this benchmark under py-spy, which samples the child processes too"""
+    pyspy = shutil.which("py-spy")
+    if pyspy is None:
+        print("py-spy not found on PATH (pip install py-spy)", file=sys.stderr)
+        return 1
+    os.makedirs(args.profile_dir, exist_ok=True)
+    flamegraph = os.path.join(args.profile_dir, f"ingestion-{datetime.now():%Y%m%d-%H%M%S}.svg")
+    command = [pyspy, "record", "--subprocesses", "-o", flamegraph, "--", sys.executable, "-m", "benchmarks.ingestion", *argv]
+    code = subprocess.run(command, env={**os.environ, PYSPY_ENV: "1"}).returncode
+    print(f"Flamegraph written to {flamegraph}")
+    return code
+
+
+def rate(count: float, seconds: float) -> Optional[float]:
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def run_document(
+    path: str,
+    pages: int,
+    extractor: Any,
+    chunker_factory: Any,
+    embedding_service: Any,
+    vector_store: Any,
+    embed_batch_size: int,
+    insert_batch_size: int,
+    skip_embed: bool
+) -> Dict[str, Any]:
+    stages: Dict[str, Dict[str, Any]] = {}
+    
+    with RSSSampler() as memory:
+        started = time.perf_counter()
+        segments = list(extractor.iter_pages(path))
+        seconds = time.perf_counter() - started
+    characters = sum(len(text) for _, text in segments)
+    stages["extract"] = {
+        "seconds": round(seconds, 3),
+        "pages_per_s": rate(pages, seconds),
+        "chars_per_s": rate(characters, seconds),
+        **memory.to_dict()
+    }
+    
+    chunker = chunker_factory()
+    with RSSSampler() as memory:
+        started = time.perf_counter()
+        chunks = list(chunker.chunk(iter(segments)))
+        seconds = time.perf_counter() - started
+    del segments
+    stages["chunk"] = {
+        "seconds": round(seconds, 3),
+        "chunks": len(chunks),
+        "chunks_per_s": rate(len(chunks), seconds),
+        "tokens_per_chunk": chunker.stats.to_dict().get("mean_tokens"),
+        **memory.to_dict()
+    }
+    
+    if not skip_embed and chunks:
+        texts = [chunk["text"] for chunk in chunks]
+        with RSSSampler() as memory:
+            started = time.perf_counter()
+            embeddings: List[List[float]] = []
+            for start in range(0, len(texts), embed_batch_size):
+                embeddings.extend(embedding_service.generate_embeddings(texts[start:start + embed_batch_size]))
+            seconds = time.perf_counter() - started
+        stages["embed"] = {
+            "seconds": round(seconds, 3),
+            "embeddings_per_s": rate(len(embeddings), seconds),
+            **memory.to_dict()
+        }
+        
+        collection_name = f"bench_{os.path.basename(path).replace('.', '_')}_{int(time.time() * 1000)}"
+        metadatas = []
+        for i, chunk in enumerate(chunks):
+            meta = {"chunk_index": i, "filename": os.path.basename(path)}
+            if chunk.get("page_start") is not None:
+                meta["page_start"] = chunk["page_start"]
+                meta["page_end"] = chunk["page_end"]
+            metadatas.append(meta)
+        with RSSSampler() as memory:
+            started = time.perf_counter()
+            for start in range(0, len(texts), insert_batch_size):
+                end = start + insert_batch_size
+                vector_store.add_documents(collection_name, texts[start:end], embeddings[start:end], metadatas[start:end])
+            seconds = time.perf_counter() - started
+        stages["insert"] = {
+            "seconds": round(seconds, 3),
+            "inserts_per_s": rate(len(texts), seconds),
+            **memory.to_dict()
+        }
+        vector_store.delete_collection(collection_name)
+    
+    total = sum(stage["seconds"] for stage in stages.values())
+    return {
+        "pages": pages,
+        "chunks": len(chunks),
+        "total_seconds": round(total, 3),
+        "pages_per_s": rate(pages, total),
+        "chunks_per_s": rate(len(chunks), total),
+        "embeddings_per_s": (stages.get("embed") or {}).get("embeddings_per_s"),
+        "inserts_per_s": (stages.get("insert") or {}).get("inserts_per_s"),
+        "bottleneck": max(stages, key=lambda name: stages[name]["seconds"]),
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.profile == "py-spy" and not os.environ.get(PYSPY_ENV):
+        return run_under_pyspy(args, argv)
+    
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingest-bench-")
+    files_dir = os.path.join(workdir, "files")
+    os.makedirs(files_dir, exist_ok=True)
+    os.environ["CHROMA_PERSIST_DIR"] = os.path.join(workdir, "chroma")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    
+    from config import settings
+    from services.chunking import TokenChunker, create_chunker
+    from services.text_extractor import TextExtractor
+    from services.vector_store import VectorStoreService
+    
+    if args.embeddings == "hash":
+        from benchmarks.standins import HashEmbeddingService
+        embedding_service = HashEmbeddingService()
+    else:
+        from services.local_embedding import LocalEmbeddingService
+        embedding_service = LocalEmbeddingService()
+    vector_store = VectorStoreService(client=VectorStoreService.create_client())
+    extractor = TextExtractor(processes=args.extract_processes)
+    strategy = args.chunking or settings.CHUNKING_STRATEGY
+    options: Dict[str, Any] = {}
+    if strategy == TokenChunker.name:
+        options = {"max_tokens": settings.CHUNK_MAX_TOKENS or None, "overlap_tokens": settings.CHUNK_OVERLAP_TOKENS}
+    
+    def chunker_factory():
+        return create_chunker(strategy, embedding_service.tokenizer, embedding_service.max_input_tokens, options)
+    
+    if args.profile == "cprofile":
+        os.makedirs(args.profile_dir, exist_ok=True)
+    
+    scenarios = []
+    try:
+        for file_format in args.formats:
+            for pages in args.pages:
+                started = time.perf_counter()
+                path = generate_file(files_dir, file_format, pages, args.seed)
+                generated = time.perf_counter() - started
+                name = f"{file_format}/{pages}p"
+                profiler = cProfile.Profile() if args.profile == "cprofile" else None
+                if profiler is not None:
+                    profiler.enable()
+                result = run_document(
+                    path, pages, extractor, chunker_factory, embedding_service, vector_store,
+                    args.embed_batch_size or settings.INGEST_EMBED_BATCH_SIZE,
+                    args.insert_batch_size, args.skip_embed
+                )
+                if profiler is not None:
+                    profiler.disable()
+                    profile_path = os.path.join(args.profile_dir, f"ingestion-{file_format}-{pages}p.prof")
+                    profiler.dump_stats(profile_path)
+                    result["profile"] = profile_path
+                    summary = io.StringIO()
+                    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+                    print(summary.getvalue())
+                result = {"name": name, "format": file_format, "file_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+                          "generate_seconds": round(generated, 2), **result}
+                scenarios.append(result)
+                stages = "  ".join(
+                    f"{stage} {result['stages'][stage]['seconds']}s" for stage in STAGES if stage in result["stages"]
+                )
+                print(f"{name:10} {result['pages_per_s']:>9} pages/s  {result['chunks']:>6} chunks  "
+                      f"{stages}  bottleneck {result['bottleneck']}  rss {result['peak_rss_mb']}MB")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    results = {
+        "benchmark": "ingestion",
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "parameters": {
+            **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+            "chunking": strategy,
+            "embedding_model": getattr(embedding_service, "model_name", None)
+        },
+        "scenarios": scenarios
+    }
+    if args.output:
+        save(results, args.output)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        for line in compare(results, baseline, keys=("pages_per_s", "chunks_per_s", "embeddings_per_s", "inserts_per_s")):
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
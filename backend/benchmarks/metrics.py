@@ -0,0 +1,137 @@
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return round(ordered[rank], 2)
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": round(max(values), 2)
+    }
+
+
+def stage_breakdown(executions: Iterable[List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-stage durations from ExecutionLogger entries: every completed step
+    ("Knowledge Base", "LLM Engine", ...) and every stage of a
+    "Stage timings" entry ("Knowledge Base.dense", ...). Steps that run once
+    per node are counted per occurrence; parallel nodes overlap, so stages
+    do not add up to the end-to-end latency.
+    """
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for logs in executions:
+        for entry in logs:
+            metadata = entry.get("metadata") or {}
+            if entry.get("status") == "completed" and metadata.get("duration_ms") is not None:
+                durations[entry["step_name"]].append(float(metadata["duration_ms"]))
+            for stage, ms in (metadata.get("timings_ms") or {}).items():
+                durations[f"{entry['step_name']}.{stage}"].append(float(ms))
+    return {stage: summarize(values) for stage, values in sorted(durations.items())}
+
+
+def peak_rss_mb() -> float:
+    """Process high-water mark of resident memory"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory now (Linux /proc only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RSSSampler:
+    """
+    Peak resident memory while a block runs, sampled every `interval`
+    seconds on a background thread. Where /proc is unavailable only the
+    process high-water mark is reported.
+    """
+    
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_mb: Optional[float] = None
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+                self.peak_mb = rss
+    
+    def __enter__(self) -> "RSSSampler":
+        self.start_mb = self.peak_mb = current_rss_mb()
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            rss = current_rss_mb()
+            if rss is not None and rss > self.peak_mb:
+                self.peak_mb = rss
+    
+    def to_dict(self) -> Dict[str, Any]:
+        if self.start_mb is None:
+            return {"peak_rss_mb": peak_rss_mb(), "rss_growth_mb": None}
+        return {"peak_rss_mb": round(self.peak_mb, 1), "rss_growth_mb": round(self.peak_mb - self.start_mb, 1)}
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine()
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], keys=("throughput_rps", "p50_ms", "p95_ms", "p99_ms")) -> List[str]:
+    """One line per scenario present in both runs, with relative changes"""
+    previous = {s["name"]: s for s in baseline.get("scenarios", [])}
+    lines = []
+    for scenario in current.get("scenarios", []):
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+        parts = []
+        for key in keys:
+            new, old = scenario.get(key), before.get(key)
+            if new is None or not old:
+                continue
+            parts.append(f"{key} {old:g} -> {new:g} ({(new - old) / old * 100:+.1f}%)")
+        lines.append(f"{scenario['name']}: " + ", ".join(parts))
+    return lines
+
+
+def save(results: Dict[str, Any], path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from services.local_embedding import EmbeddingCache
+
+
+TOKEN_RE = re.compile(r"\w+")
+PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class HashTokenizer:
+    """
+    Word/punctuation tokenizer with the call signature the chunkers use
+    (input_ids and optional offset_mapping), standing in for the model's
+    WordPiece tokenizer. It yields somewhat fewer tokens per word.
+    """
+    
+    def __call__(self, text: str, add_special_tokens: bool = False, return_offsets_mapping: bool = False, **kwargs):
+        matches = list(PIECE_RE.finditer(text))
+        encoding = {"input_ids": [hash(m.group()) & 0x7FFF for m in matches]}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = [m.span() for m in matches]
+        return encoding
+
+
+class HashEmbeddingService:
+    """
+    Deterministic bag-of-words embeddings (feature hashing), for machines
+    without the sentence-transformers model. Exposes the parts of the
+    LocalEmbeddingService interface the chat path uses, including the
+    query cache, so only the model's encode time differs.
+    """
+    
+    def __init__(self, dimensions: int = 384, cache_size: int = 10000):
+        self.model_name = f"hash-{dimensions}"
+        self.dimensions = dimensions
+        self.query_cache = EmbeddingCache(max_entries=cache_size)
+        self.tokenizer = HashTokenizer()
+        self.max_input_tokens = 254
+    
+    def _encode(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def generate_embedding(self, text: str) -> List[float]:
+        return self._encode(text).tolist()
+    
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._encode(text).tolist() for text in texts]
+    
+    def content_key(self, text: str) -> str:
+        return EmbeddingCache.make_key(self.model_name, text, lowercase=True)
+    
+    def lookup_query_embedding(self, query: str) -> Tuple[List[float], bool]:
+        vector, hit = self.query_cache.get_or_compute(self.content_key(query), lambda: self._encode(query))
+        return vector.tolist(), hit
+    
+    def generate_query_embedding(self, query: str) -> List[float]:
+        return self.lookup_query_embedding(query)[0]
+    
+    def stats(self) -> Dict[str, object]:
+        return {"cache": self.query_cache.stats(), "batcher": None}
+
+
+class SearchStubServer:
+    """
+    Local HTTP server answering in the SerpAPI and Brave response formats
+    after a fixed latency. Point SERPAPI_URL / BRAVE_SEARCH_URL at
+    `serpapi_url` / `brave_url`.
+    """
+    
+    def __init__(self, serpapi_latency_ms: float = 300, brave_latency_ms: float = 400, results: int = 5):
+        latencies = {"/serpapi": serpapi_latency_ms / 1000, "/brave": brave_latency_ms / 1000}
+        self.requests = 0
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path not in latencies:
+                    self.send_error(404)
+                    return
+                stub.requests += 1
+                time.sleep(latencies[url.path])
+                query = (parse_qs(url.query).get("q") or [""])[0]
+                items = [
+                    {"title": f"Result {i + 1} for {query}", "link": f"https://example.com/{i}", "snippet": f"Snippet {i + 1} about {query}."}
+                    for i in range(results)
+                ]
+                if url.path == "/serpapi":
+                    body = {"organic_results": items}
+                else:
+                    body = {"web": {"results": [
+                        {"title": item["title"], "url": item["link"], "description": item["snippet"]} for item in items
+                    ]}}
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="search-stub", daemon=True)
+    
+    @property
+    def serpapi_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/serpapi"
+    
+    @property
+    def brave_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/brave"
+    
+    def start(self) -> "SearchStubServer":
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,54 @@
+"""
+Lexical Index Backfill Script
+Builds the BM25 indexes used by sparse/hybrid retrieval for documents that
+were uploaded before lexical indexing existed. New uploads are indexed
+during ingestion.
+
+Usage:
+    python build_lexical_indexes.py            # index documents missing one
+    python build_lexical_indexes.py --rebuild  # rebuild every index
+"""
+import sys
+sys.path.insert(0, '.')
+
+from config import settings
+from database import SessionLocal
+from models.document import Document
+from services.lexical_index import LexicalIndexStore
+from services.vector_store import VectorStoreService
+
+
+def backfill(rebuild: bool = False):
+    store = VectorStoreService()
+    lexical_index = LexicalIndexStore(settings.LEXICAL_INDEX_DIR)
+    
+    db = SessionLocal()
+    try:
+        documents = db.query(Document).all()
+    finally:
+        db.close()
+    
+    print(f"📦 Found {len(documents)} document(s)")
+    built = 0
+    for document in documents:
+        name = document.collection_name
+        if not name or (lexical_index.has(name) and not rebuild):
+            continue
+        try:
+            chunks = store.get_document_chunks(name, user_id=document.user_id)
+            rows = sorted(
+                zip(chunks["documents"], chunks["metadatas"]),
+                key=lambda row: (row[1] or {}).get("chunk_index", 0)
+            )
+            lexical_index.build(name, [row[0] for row in rows], [row[1] or {} for row in rows], user_id=document.user_id)
+            built += 1
+            print(f"   ✓ {name} ({len(rows)} chunks)")
+        except Exception as e:
+            print(f"   ❌ {name}: {e}")
+    
+    print("")
+    print(f"✅ Built {built} lexical index(es).")
+
+
+if __name__ == "__main__":
+    backfill(rebuild="--rebuild" in sys.argv)
@@ -11,17 +11,134 @@ class Settings(BaseSettings):
     
     # Gemini API
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    # Pooled clients per (API key, model); per-call timeout and retries with jittered backoff
+    LLM_CLIENT_POOL_SIZE: int = int(os.getenv("LLM_CLIENT_POOL_SIZE", "32"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    # LLM backend: "gemini" or "mock" (deterministic, offline; for benchmarks and load tests)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))  # blocking provider calls in flight
+    LLM_MOCK_LATENCY_MS: float = float(os.getenv("LLM_MOCK_LATENCY_MS", "200"))  # time to first token
+    LLM_MOCK_TOKENS_PER_SECOND: float = float(os.getenv("LLM_MOCK_TOKENS_PER_SECOND", "50"))  # 0 = instant
+    LLM_MOCK_RESPONSE_TOKENS: int = int(os.getenv("LLM_MOCK_RESPONSE_TOKENS", "64"))
+    LLM_MOCK_ERROR_RATE: float = float(os.getenv("LLM_MOCK_ERROR_RATE", "0"))
+    LLM_MOCK_SEED: int = int(os.getenv("LLM_MOCK_SEED", "0"))
     
     # Web Search
     SERP_API_KEY: str = os.getenv("SERP_API_KEY", "")
     BRAVE_API_KEY: str = os.getenv("BRAVE_API_KEY", "")
+    SERPAPI_URL: str = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+    BRAVE_SEARCH_URL: str = os.getenv("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
+    WEB_SEARCH_CONNECT_TIMEOUT: float = float(os.getenv("WEB_SEARCH_CONNECT_TIMEOUT", "3"))
+    WEB_SEARCH_READ_TIMEOUT: float = float(os.getenv("WEB_SEARCH_READ_TIMEOUT", "8"))
+    WEB_SEARCH_CACHE_SIZE: int = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "2000"))
+    WEB_SEARCH_CACHE_TTL_SECONDS: float = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "900"))  # 0 disables
+    # Hedged search: start the secondary provider if the primary has not answered in time
+    WEB_SEARCH_HEDGING: bool = os.getenv("WEB_SEARCH_HEDGING", "true").lower() == "true"
+    WEB_SEARCH_HEDGE_DELAY_MS: float = float(os.getenv("WEB_SEARCH_HEDGE_DELAY_MS", "800"))  # 0 = race both
+    WEB_SEARCH_WORKERS: int = int(os.getenv("WEB_SEARCH_WORKERS", "8"))
+    WEB_SEARCH_BREAKER_FAILURES: int = int(os.getenv("WEB_SEARCH_BREAKER_FAILURES", "5"))
+    WEB_SEARCH_BREAKER_RESET_SECONDS: float = float(os.getenv("WEB_SEARCH_BREAKER_RESET_SECONDS", "30"))
     
     # ChromaDB
     CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./chroma_data")
+    # "per_document" (one collection per upload) or "shared" (filtered chunks
+    # in one collection per user, or a single global one)
+    VECTOR_STORE_MODE: str = os.getenv("VECTOR_STORE_MODE", "per_document")
+    VECTOR_STORE_SHARED_SCOPE: str = os.getenv("VECTOR_STORE_SHARED_SCOPE", "user")
     
     # Upload directory
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     
+    # Background ingestion pipeline (worker threads per stage)
+    INGEST_EXTRACT_WORKERS: int = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+    INGEST_EMBED_WORKERS: int = int(os.getenv("INGEST_EMBED_WORKERS", "1"))
+    INGEST_INDEX_WORKERS: int = int(os.getenv("INGEST_INDEX_WORKERS", "1"))
+    INGEST_EMBED_BATCH_SIZE: int = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+    INGEST_REUSE_EMBEDDINGS: bool = os.getenv("INGEST_REUSE_EMBEDDINGS", "true").lower() == "true"
+    CHUNK_EMBEDDING_STORE_MAX_ENTRIES: int = int(os.getenv("CHUNK_EMBEDDING_STORE_MAX_ENTRIES", "500000"))  # 0 = unbounded
+    
+    # PDF extraction: page ranges are sharded across processes for large files
+    PDF_EXTRACT_PROCESSES: int = int(os.getenv("PDF_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+    PDF_PAGES_PER_SHARD: int = int(os.getenv("PDF_PAGES_PER_SHARD", "16"))
+    
+    # Chunking: "tokens" (sized by the embedding tokenizer) or "characters" (legacy)
+    CHUNKING_STRATEGY: str = os.getenv("CHUNKING_STRATEGY", "tokens")
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "0"))  # 0 = model input limit
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    
+    # Retrieval: dense (vectors), sparse (BM25) or hybrid (both, fused with RRF)
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", "./lexical_data")
+    LEXICAL_INDEX_CACHE_SIZE: int = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "64"))
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "dense")
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    
+    # Optional cross-encoder reranking of over-fetched candidates
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "50"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "300"))  # 0 = no limit
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+    
+    # LLM prompt assembly: input token budget per model ("model=tokens,...")
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+    CONTEXT_MODEL_BUDGETS: str = os.getenv("CONTEXT_MODEL_BUDGETS", "")
+    CONTEXT_HISTORY_SHARE: float = float(os.getenv("CONTEXT_HISTORY_SHARE", "0.25"))
+    CONTEXT_WEB_SHARE: float = float(os.getenv("CONTEXT_WEB_SHARE", "0.25"))
+    CONTEXT_CHARS_PER_TOKEN: float = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+    
+    # Conversation memory: recent turns verbatim, older ones summarized / recalled
+    CHAT_HISTORY_TURNS: int = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+    CHAT_SUMMARY_MODE: str = os.getenv("CHAT_SUMMARY_MODE", "extractive")  # extractive, llm or off
+    CHAT_SUMMARY_MODEL: str = os.getenv("CHAT_SUMMARY_MODEL", "gemini-2.5-flash")
+    CHAT_SUMMARY_MAX_CHARS: int = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "2000"))
+    CHAT_RECALL_TURNS: int = int(os.getenv("CHAT_RECALL_TURNS", "3"))  # 0 disables semantic recall
+    CHAT_RECALL_MIN_SCORE: float = float(os.getenv("CHAT_RECALL_MIN_SCORE", "0.35"))
+    CHAT_RECALL_SCAN: int = int(os.getenv("CHAT_RECALL_SCAN", "500"))  # newest older turns searched
+    CHAT_HISTORY_PAGE_SIZE: int = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "50"))
+    
+    # Response cache for repeated questions (per workflow, models and document versions)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_SCOPE: str = os.getenv("RESPONSE_CACHE_SCOPE", "workflow")  # or "conversation"
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    RESPONSE_CACHE_SIMILARITY: float = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))  # 0 = exact match only
+    
+    # Workflow execution scheduler
+    EXECUTION_WORKERS: int = int(os.getenv("EXECUTION_WORKERS", "8"))
+    EXECUTION_QUEUE_SIZE: int = int(os.getenv("EXECUTION_QUEUE_SIZE", "32"))
+    EXECUTION_PER_USER_LIMIT: int = int(os.getenv("EXECUTION_PER_USER_LIMIT", "4"))
+    
+    # Execution log persistence ("buffered" writes in the background, "sync" in the request's commit)
+    EXECUTION_LOG_MODE: str = os.getenv("EXECUTION_LOG_MODE", "buffered")
+    EXECUTION_LOG_BATCH_SIZE: int = int(os.getenv("EXECUTION_LOG_BATCH_SIZE", "500"))
+    EXECUTION_LOG_FLUSH_MS: float = float(os.getenv("EXECUTION_LOG_FLUSH_MS", "1000"))
+    EXECUTION_LOG_BUFFER_SIZE: int = int(os.getenv("EXECUTION_LOG_BUFFER_SIZE", "10000"))
+    EXECUTION_LOG_COPY: bool = os.getenv("EXECUTION_LOG_COPY", "true").lower() == "true"  # COPY on PostgreSQL
+    
+    # Workflow node pool (parallel branches within one execution)
+    NODE_WORKERS: int = int(os.getenv("NODE_WORKERS", "16"))
+    NODE_TIMEOUT_SECONDS: float = float(os.getenv("NODE_TIMEOUT_SECONDS", "60"))
+    
+    # Compiled workflow plans kept in memory (LRU)
+    PLAN_CACHE_SIZE: int = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+    
+    # Query embedding cache (set EMBEDDING_CACHE_PATH to persist to disk)
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "")
+    EMBEDDING_CACHE_DISK_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "100000"))
+    
+    # Micro-batching of concurrent single-text embeddings
+    EMBEDDING_BATCHING: bool = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    
     class Config:
         env_file = ".env"
 
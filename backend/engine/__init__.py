@@ -1,3 +1,4 @@
 from .executor import WorkflowExecutor
+from .compiler import ExecutionPlan, WorkflowValidationError, compile_workflow, get_plan
 
-__all__ = ["WorkflowExecutor"]
+__all__ = ["WorkflowExecutor", "ExecutionPlan", "WorkflowValidationError", "compile_workflow", "get_plan"]
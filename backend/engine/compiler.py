@@ -0,0 +1,227 @@
+import hashlib
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from config import settings
+
+
+NODE_TYPES = ("userQuery", "knowledgeBase", "llmEngine", "output")
+
+# Node types an LLM node reads from the shared execution context
+CONTEXT_WRITER_TYPES = ("userQuery", "knowledgeBase")
+
+
+class WorkflowValidationError(ValueError):
+    """Raised when a workflow definition cannot be compiled"""
+    
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """
+    Immutable, validated form of a workflow definition.
+    
+    Shared between concurrent executions, so node data must be treated as
+    read-only.
+    """
+    definition_hash: str
+    order: Tuple[str, ...]
+    nodes: Mapping[str, Mapping[str, Any]]
+    dependencies: Mapping[str, FrozenSet[str]]
+    ancestors: Mapping[str, FrozenSet[str]]
+    positions: Mapping[str, int]
+    
+    def node_type(self, node_id: str) -> Optional[str]:
+        return self.nodes[node_id].get("type")
+    
+    def node_data(self, node_id: str) -> Mapping[str, Any]:
+        return self.nodes[node_id].get("data") or {}
+    
+    def nodes_of_type(self, node_type: str) -> List[str]:
+        return [node_id for node_id in self.order if self.node_type(node_id) == node_type]
+
+
+def hash_definition(definition: Dict[str, Any]) -> str:
+    """Stable content hash of a workflow definition"""
+    canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def validate_workflow(definition: Dict[str, Any], require_complete: bool = True) -> List[str]:
+    """Return a list of problems with a workflow definition (empty when valid)"""
+    try:
+        compile_workflow(definition, require_complete=require_complete)
+    except WorkflowValidationError as e:
+        return e.errors
+    return []
+
+
+def compile_workflow(
+    definition: Dict[str, Any],
+    require_complete: bool = True,
+    definition_hash: Optional[str] = None
+) -> ExecutionPlan:
+    """
+    Validate a workflow definition and turn it into an ExecutionPlan.
+    
+    Checks for malformed or duplicate nodes, unknown node types, node data
+    that is not an object, malformed edges or edges pointing at missing
+    nodes, cycles and (when require_complete) a missing LLM Engine or Output
+    node. Raises WorkflowValidationError listing every problem found.
+    """
+    errors: List[str] = []
+    if not isinstance(definition, dict):
+        raise WorkflowValidationError(["Workflow definition must be an object"])
+    raw_nodes = definition.get("nodes") or []
+    raw_edges = definition.get("edges") or []
+    if not isinstance(raw_nodes, list) or not isinstance(raw_edges, list):
+        raise WorkflowValidationError(["Workflow nodes and edges must be lists"])
+    
+    nodes: Dict[str, Mapping[str, Any]] = {}
+    for node in raw_nodes:
+        node_id = node.get("id") if isinstance(node, dict) else None
+        if not isinstance(node_id, (str, int)) or node_id == "":
+            errors.append("Node without an id")
+            continue
+        if node_id in nodes:
+            errors.append(f"Duplicate node id: {node_id}")
+            continue
+        node_type = node.get("type")
+        if node_type not in NODE_TYPES:
+            errors.append(f"Unknown node type '{node_type}' for node {node_id}")
+        data = node.get("data") or {}
+        if not isinstance(data, dict):
+            errors.append(f"Node {node_id} data must be an object")
+            data = {}
+        nodes[node_id] = MappingProxyType({
+            "id": node_id,
+            "type": node_type,
+            "data": MappingProxyType(dict(data))
+        })
+    
+    index = {node_id: i for i, node_id in enumerate(nodes)}
+    inputs: Dict[str, set] = {node_id: set() for node_id in nodes}
+    outputs: Dict[str, List[str]] = {node_id: [] for node_id in nodes}
+    for edge in raw_edges:
+        if not isinstance(edge, dict):
+            errors.append(f"Malformed edge: {str(edge)[:100]}")
+            continue
+        source = edge.get("source")
+        target = edge.get("target")
+        missing = [end for end in (source, target) if not isinstance(end, (str, int)) or end not in nodes]
+        if missing:
+            errors.append(f"Edge {source} -> {target} references missing node(s): {', '.join(map(str, missing))}")
+            continue
+        if source not in inputs[target]:
+            inputs[target].add(source)
+            outputs[source].append(target)
+    
+    # Kahn's algorithm with a heap keyed on definition order, so the plan is
+    # deterministic and independent of edge order
+    in_degree = {node_id: len(sources) for node_id, sources in inputs.items()}
+    heap = [index[node_id] for node_id, degree in in_degree.items() if degree == 0]
+    heapq.heapify(heap)
+    node_ids = list(nodes)
+    order: List[str] = []
+    while heap:
+        current = node_ids[heapq.heappop(heap)]
+        order.append(current)
+        for neighbor in outputs[current]:
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                heapq.heappush(heap, index[neighbor])
+    
+    if len(order) < len(nodes):
+        cyclic = sorted(set(nodes) - set(order), key=index.get)
+        errors.append(f"Workflow contains a cycle involving: {', '.join(map(str, cyclic))}")
+    
+    if require_complete:
+        node_types = {node.get("type") for node in nodes.values()}
+        if "llmEngine" not in node_types:
+            errors.append("Workflow must include an LLM Engine node")
+        if "output" not in node_types:
+            errors.append("Workflow must include an Output node")
+    
+    if errors:
+        raise WorkflowValidationError(errors)
+    
+    # Besides its direct inputs, an LLM node waits for every userQuery and
+    # knowledgeBase node ordered before it, because it reads the query
+    # template and all retrieved contexts from the shared context
+    dependencies: Dict[str, FrozenSet[str]] = {}
+    context_writers: List[str] = []
+    for node_id in order:
+        node_type = nodes[node_id].get("type")
+        deps = set(inputs[node_id])
+        if node_type == "llmEngine":
+            deps.update(context_writers)
+        elif node_type in CONTEXT_WRITER_TYPES:
+            context_writers.append(node_id)
+        dependencies[node_id] = frozenset(deps)
+    
+    # Transitive dependencies: everything guaranteed finished before a node starts
+    ancestors: Dict[str, FrozenSet[str]] = {}
+    for node_id in order:
+        reached = set(dependencies[node_id])
+        for dep in dependencies[node_id]:
+            reached.update(ancestors[dep])
+        ancestors[node_id] = frozenset(reached)
+    
+    return ExecutionPlan(
+        definition_hash=definition_hash or hash_definition(definition),
+        order=tuple(order),
+        nodes=MappingProxyType(nodes),
+        dependencies=MappingProxyType(dependencies),
+        ancestors=MappingProxyType(ancestors),
+        positions=MappingProxyType({node_id: i for i, node_id in enumerate(order)})
+    )
+
+
+class PlanCache:
+    """Thread-safe LRU of compiled plans keyed by definition hash"""
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max(1, max_size)
+        self._plans: "OrderedDict[str, ExecutionPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_plan(self, definition: Dict[str, Any]) -> ExecutionPlan:
+        """Return the cached plan for a definition, compiling it on a miss"""
+        key = hash_definition(definition)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        
+        plan = compile_workflow(definition, definition_hash=key)
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+    
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+_plan_cache = PlanCache(settings.PLAN_CACHE_SIZE)
+
+
+def get_plan(definition: Dict[str, Any]) -> ExecutionPlan:
+    """Compile a workflow definition through the process-wide plan cache"""
+    return _plan_cache.get_plan(definition)
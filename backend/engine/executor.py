@@ -1,19 +1,78 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Mapping, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import threading
+import time
+from config import settings
+from engine.compiler import ExecutionPlan, get_plan
 from services.local_embedding import LocalEmbeddingService
 from services.vector_store import VectorStoreService
 from services.llm import LLMService
 from services.web_search import WebSearchService
 from services.execution_logger import ExecutionLogger
+from services.lexical_index import LexicalIndexStore, reciprocal_rank_fusion
+from services.reranker import CrossEncoderReranker
+from services.context_budget import ContextBudgetManager, model_token_budget
+from services.response_cache import ResponseCache
+
+
+# Cheap nodes run on the coordinating thread instead of the node pool
+INLINE_NODE_TYPES = {"userQuery", "output"}
+
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+NODE_STEP_NAMES = {
+    "userQuery": "User Query",
+    "knowledgeBase": "Knowledge Base",
+    "llmEngine": "LLM Engine",
+    "output": "Output",
+}
+
+_node_pool: Optional[ThreadPoolExecutor] = None
+_node_pool_lock = threading.Lock()
+
+
+def get_node_pool() -> ThreadPoolExecutor:
+    """Shared pool running workflow nodes across all executions"""
+    global _node_pool
+    if _node_pool is None:
+        with _node_pool_lock:
+            if _node_pool is None:
+                _node_pool = ThreadPoolExecutor(
+                    max_workers=settings.NODE_WORKERS,
+                    thread_name_prefix="workflow-node"
+                )
+    return _node_pool
+
+
+def shutdown_node_pool():
+    """Shut down the shared node pool if it was started"""
+    global _node_pool
+    with _node_pool_lock:
+        if _node_pool is not None:
+            _node_pool.shutdown()
+            _node_pool = None
 
 
 class WorkflowExecutor:
     """Executes a workflow based on node connections"""
     
-    def __init__(self):
-        self.embedding_service = LocalEmbeddingService()
-        self.vector_store = VectorStoreService()
-        self.llm_service = LLMService()
-        self.web_search_service = WebSearchService()
+    def __init__(
+        self,
+        embedding_service: Optional[LocalEmbeddingService] = None,
+        vector_store: Optional[VectorStoreService] = None,
+        llm_service: Optional[LLMService] = None,
+        web_search_service: Optional[WebSearchService] = None,
+        lexical_index: Optional[LexicalIndexStore] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        response_cache: Optional[ResponseCache] = None
+    ):
+        self.embedding_service = embedding_service or LocalEmbeddingService()
+        self.vector_store = vector_store or VectorStoreService()
+        self.llm_service = llm_service or LLMService()
+        self.web_search_service = web_search_service or WebSearchService()
+        self.lexical_index = lexical_index
+        self.reranker = reranker
+        self.response_cache = response_cache
     
     def execute(
         self, 
@@ -22,7 +81,10 @@ class WorkflowExecutor:
         config: Dict[str, Any], 
         chat_history: Optional[List[Dict]] = None,
         execution_id: Optional[str] = None,
-        workflow_id: Optional[int] = None
+        workflow_id: Optional[int] = None,
+        listener: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        user_id: Optional[int] = None,
+        conversation_memory: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Execute a workflow and return the final response with logs
@@ -34,222 +96,586 @@ class WorkflowExecutor:
             chat_history: Previous conversation messages for context
             execution_id: UUID for grouping execution logs
             workflow_id: ID of the workflow being executed
+            listener: Optional callback receiving live events ("log",
+                "chunks", "token") while the workflow runs; when set the
+                LLM response is streamed token by token
+            user_id: Owner of the execution, used to scope shared vector
+                store lookups to the user's documents
+            conversation_memory: {"text", "stats"} from ConversationMemory;
+                the summary and recalled turns older than chat_history
         
         Returns:
             Dict containing 'response' and 'logs'
         """
         # Initialize logger
-        logger = ExecutionLogger(execution_id or "unknown", workflow_id)
-        
-        nodes = workflow_definition.get("nodes", [])
-        edges = workflow_definition.get("edges", [])
+        logger = ExecutionLogger(execution_id or "unknown", workflow_id, listener=listener)
         
         logger.start_step("Workflow", f"Starting workflow execution with query: {user_query[:50]}...")
         
-        # Build node map and adjacency list
-        node_map = {node["id"]: node for node in nodes}
-        adjacency = self._build_adjacency_list(edges)
-        
-        # Find the execution order
-        execution_order = self._get_execution_order(nodes, edges)
+        # Validation, topological sort and dependency analysis are cached
+        # per definition hash, so repeated chats skip graph processing
+        plan = get_plan(workflow_definition)
+        execution_order = plan.order
         logger.info("Workflow", f"Execution order determined: {len(execution_order)} nodes", 
-                   {"node_count": len(execution_order)})
+                   {"node_count": len(execution_order), "plan_hash": plan.definition_hash[:12]})
         
-        # Execute nodes in order
         context = {
             "query": user_query,
             "kb_contexts": [],
             "web_context": None,
             "response": None,
-            "chat_history": chat_history or []
+            "chat_history": chat_history or [],
+            "conversation_memory": (conversation_memory or {}).get("text", "")
         }
+        if conversation_memory:
+            stats = conversation_memory.get("stats", {})
+            logger.info("Workflow", 
+                       f"Conversation memory: {stats.get('recent_turns', 0)} recent turn(s), "
+                       f"{stats.get('summarized_turns', 0)} summarized, {len(stats.get('recalled', []))} recalled",
+                       stats)
         
-        for node_id in execution_order:
-            node = node_map.get(node_id)
-            if not node:
-                continue
-            
-            node_type = node.get("type")
-            node_data = node.get("data", {})
+        # Repeated questions against unchanged documents skip retrieval and the LLM
+        cache_scope = self._response_cache_scope(plan, context, user_id)
+        if cache_scope is not None:
+            hit = self.response_cache.get(cache_scope[0], user_query, embed=self._cache_embedding)
+            if hit is not None:
+                return self._serve_cached(plan, hit, logger)
+            logger.info("Workflow", "Response cache miss")
+        
+        position = plan.positions
+        kb_results: Dict[str, Dict[str, str]] = {}
+        responses: Dict[str, str] = {}
+        
+        # Web search only needs the query, so start it right away instead of
+        # waiting for the knowledge base nodes ahead of the LLM
+        web_futures = {}
+        for node_id in plan.nodes_of_type("llmEngine"):
+            web_future = self._start_web_search(plan.node_data(node_id), user_query, config, logger)
+            if web_future:
+                web_futures[node_id] = web_future
+        
+        def prepare(node_id: str) -> Dict[str, Any]:
+            # Runs on this thread before the node is submitted. Only knowledge
+            # bases upstream of the LLM node are certain to have finished;
+            # they merge in execution order, not completion order, so prompts
+            # are deterministic
+            if plan.node_type(node_id) != "llmEngine":
+                return {}
+            llm_context = dict(context)
+            llm_context["kb_contexts"] = [
+                kb_results[kb_id]
+                for kb_id in sorted(plan.ancestors[node_id] & kb_results.keys(), key=position.get)
+            ]
+            return {"context": llm_context}
+        
+        def run_node(node_id: str, inputs: Dict[str, Any]):
+            node_type = plan.node_type(node_id)
+            node_data = plan.node_data(node_id)
             
             if node_type == "userQuery":
                 logger.start_step("User Query", "Processing user input")
                 query_template = node_data.get("queryTemplate", "")
                 if query_template:
-                    context["query_template"] = query_template
                     logger.info("User Query", "Query template applied", {"template_length": len(query_template)})
                 logger.complete_step("User Query", f"Query received: {user_query[:50]}...")
+                return {"query_template": query_template} if query_template else {}
             
             elif node_type == "knowledgeBase":
                 kb_name = node_data.get("filename", "Unknown")
-                logger.start_step("Knowledge Base", f"Querying: {kb_name}")
+                logger.start_step("Knowledge Base", f"Querying: {kb_name}", step_id=node_id)
                 
-                kb_context = self._execute_knowledge_base(
+                hits = self._execute_knowledge_base(
                     node_data, 
-                    context["query"],
+                    user_query,
                     config,
-                    logger
+                    logger,
+                    user_id=user_id
                 )
-                if kb_context:
-                    context["kb_contexts"].append({
-                        "filename": kb_name,
-                        "content": kb_context
-                    })
+                if hits:
+                    kb_context = "\n\n---\n\n".join(hit["text"] for hit in hits)
                     logger.complete_step("Knowledge Base", f"Retrieved context from {kb_name}", 
-                                        {"context_length": len(kb_context)})
-                else:
-                    logger.error_step("Knowledge Base", f"No context retrieved from {kb_name}")
+                                        {"context_length": len(kb_context)}, step_id=node_id)
+                    # Chunks stay separate (in rank order) for prompt packing
+                    chunks = [{"text": hit["text"], "metadata": hit["metadata"]} for hit in hits]
+                    return {"kb_context": {"filename": kb_name, "content": kb_context, "chunks": chunks}}
+                logger.error_step("Knowledge Base", f"No context retrieved from {kb_name}", step_id=node_id)
+                return {}
             
             elif node_type == "llmEngine":
                 model = node_data.get("model", "gemini-2.5-flash")
-                logger.start_step("LLM Engine", f"Generating response using {model}")
+                logger.start_step("LLM Engine", f"Generating response using {model}", step_id=node_id)
                 
-                context["response"] = self._execute_llm_engine(
+                response = self._execute_llm_engine(
                     node_data,
-                    context,
+                    inputs["context"],
                     config,
-                    logger
+                    logger,
+                    web_future=web_futures.get(node_id)
                 )
                 
-                if context["response"] and not context["response"].startswith("Error"):
+                if response and not response.startswith("Error"):
                     logger.complete_step("LLM Engine", "Response generated successfully",
-                                        {"response_length": len(context["response"]), "model": model})
+                                        {"response_length": len(response), "model": model}, step_id=node_id)
                 else:
-                    logger.error_step("LLM Engine", context["response"] or "Failed to generate response")
+                    logger.error_step("LLM Engine", response or "Failed to generate response", step_id=node_id)
+                return {"response": response}
             
             elif node_type == "output":
                 logger.start_step("Output", "Preparing final response")
                 logger.complete_step("Output", "Response ready for display")
+            
+            return {}
+        
+        def merge_result(node_id: str, result: Dict[str, Any]):
+            if "query_template" in result:
+                context["query_template"] = result["query_template"]
+            if "kb_context" in result:
+                kb_results[node_id] = result["kb_context"]
+            if "response" in result:
+                responses[node_id] = result["response"]
+        
+        self._run_graph(plan, prepare, run_node, merge_result, logger)
+        context["kb_contexts"] = [kb_results[kb_id] for kb_id in sorted(kb_results, key=position.get)]
+        # With several LLM nodes the last one in execution order answers,
+        # whichever finished last
+        for node_id in reversed(plan.nodes_of_type("llmEngine")):
+            if node_id in responses:
+                context["response"] = responses[node_id]
+                break
+        
+        response = context.get("response")
+        if cache_scope is not None and response and not response.startswith("Error"):
+            self.response_cache.put(cache_scope[0], user_query, response, cache_scope[1], embed=self._cache_embedding)
         
         logger.complete_step("Workflow", "Workflow execution completed")
         
         return {
-            "response": context.get("response", "No response generated"),
-            "logs": logger.get_logs()
+            "response": response or "No response generated",
+            "logs": logger.get_logs(),
+            "cached": False
         }
     
-    def _build_adjacency_list(self, edges: List[Dict]) -> Dict[str, List[str]]:
-        """Build adjacency list from edges"""
-        adjacency = {}
-        for edge in edges:
-            source = edge.get("source")
-            target = edge.get("target")
-            if source not in adjacency:
-                adjacency[source] = []
-            adjacency[source].append(target)
-        return adjacency
+    def _response_cache_scope(
+        self,
+        plan: ExecutionPlan,
+        context: Dict[str, Any],
+        user_id: Optional[int]
+    ) -> Optional[Tuple[str, List[str]]]:
+        """
+        (scope key, collections) for the response cache, or None when the
+        workflow's response must not be cached: caching is off on an LLM
+        node, or a node uses web search (live results).
+        
+        Answers are shared by everyone asking the same workflow against the
+        same document versions. LLM nodes with cacheScope "conversation"
+        also key on the user and the conversation so far, so follow-up
+        questions are only reused within the same conversation.
+        """
+        llm_nodes = plan.nodes_of_type("llmEngine")
+        if self.response_cache is None or not llm_nodes:
+            return None
+        models = []
+        per_conversation = False
+        for node_id in llm_nodes:
+            node_data = plan.node_data(node_id)
+            if not node_data.get("cacheResponses", settings.RESPONSE_CACHE_ENABLED) or node_data.get("enableWebSearch"):
+                return None
+            models.append((node_data.get("model", "gemini-2.5-flash"), float(node_data.get("temperature", 0.7))))
+            per_conversation = per_conversation or (
+                node_data.get("cacheScope") or settings.RESPONSE_CACHE_SCOPE
+            ) == "conversation"
+        
+        collections = []
+        for node_id in plan.nodes_of_type("knowledgeBase"):
+            node_data = plan.node_data(node_id)
+            collections.extend(node_data.get("collectionNames") or [])
+            if node_data.get("collectionName"):
+                collections.append(node_data["collectionName"])
+        
+        parts: Dict[str, Any] = {
+            "workflow": plan.definition_hash,
+            "models": models,
+            # Versions are read for the requesting user, so a collection the
+            # user does not own never shares entries with its owner
+            "collections": ResponseCache.collection_versions(collections, user_id=user_id)
+        }
+        if per_conversation:
+            parts.update(
+                user_id=user_id,
+                history=context["chat_history"],
+                memory=context["conversation_memory"]
+            )
+        return ResponseCache.scope_key(**parts), collections
     
-    def _get_execution_order(self, nodes: List[Dict], edges: List[Dict]) -> List[str]:
-        """Determine execution order using topological sort"""
-        in_degree = {node["id"]: 0 for node in nodes}
-        adjacency = {}
-        
-        for edge in edges:
-            source = edge.get("source")
-            target = edge.get("target")
-            in_degree[target] = in_degree.get(target, 0) + 1
-            if source not in adjacency:
-                adjacency[source] = []
-            adjacency[source].append(target)
-        
-        queue = [node_id for node_id, degree in in_degree.items() if degree == 0]
-        execution_order = []
-        
-        while queue:
-            current = queue.pop(0)
-            execution_order.append(current)
-            
-            for neighbor in adjacency.get(current, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+    def _cache_embedding(self, query: str) -> List[float]:
+        return self.embedding_service.generate_query_embedding(query)
+    
+    def _serve_cached(self, plan: ExecutionPlan, hit: Any, logger: ExecutionLogger) -> Dict[str, Any]:
+        """Finish an execution with a cached response"""
+        metadata = {
+            "cache_hit": True,
+            "match": hit.match,
+            "similarity": round(hit.similarity, 4),
+            "age_seconds": round(hit.age_seconds, 1),
+            "cached_query": hit.cached_query[:200]
+        }
+        logger.info("Workflow", f"Response cache hit ({hit.match})", metadata)
+        for node_id in plan.nodes_of_type("llmEngine"):
+            logger.start_step("LLM Engine", "Looking up cached response", step_id=node_id)
+            logger.complete_step("LLM Engine", "Response served from cache", metadata, step_id=node_id)
+        if logger.listener:
+            logger.emit("token", {"text": hit.response})
+        logger.complete_step("Workflow", "Workflow execution completed")
+        return {
+            "response": hit.response,
+            "logs": logger.get_logs(),
+            "cached": True
+        }
+    
+    def _run_graph(
+        self,
+        plan: ExecutionPlan,
+        prepare: Callable[[str], Dict[str, Any]],
+        run_node: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+        merge_result: Callable[[str, Dict[str, Any]], None],
+        logger: ExecutionLogger
+    ):
+        """
+        Run every node as soon as all of its dependencies have finished.
+        
+        Slow nodes (knowledge base retrieval, LLM calls) run on the shared node
+        pool so independent branches overlap. A node's inputs are prepared and
+        its result merged back on this thread, so nodes never read shared
+        state while other nodes write it. A node exceeding its timeout is logged as an error and its
+        dependents continue without its output.
+        """
+        remaining = {node_id: set(deps) for node_id, deps in plan.dependencies.items()}
+        dependents: Dict[str, List[str]] = {node_id: [] for node_id in plan.order}
+        for node_id, deps in plan.dependencies.items():
+            for dep in deps:
+                dependents[dep].append(node_id)
+        
+        ready = [node_id for node_id in plan.order if not remaining[node_id]]
+        running: Dict[Future, tuple] = {}
+        
+        def finish(node_id: str):
+            for dependent in dependents[node_id]:
+                remaining[dependent].discard(node_id)
+                if not remaining[dependent]:
+                    ready.append(dependent)
         
-        return execution_order
+        while ready or running:
+            while ready:
+                node_id = ready.pop(0)
+                inputs = prepare(node_id)
+                if plan.node_type(node_id) in INLINE_NODE_TYPES:
+                    merge_result(node_id, run_node(node_id, inputs) or {})
+                    finish(node_id)
+                    continue
+                timeout = self._node_timeout(plan.node_data(node_id))
+                running[get_node_pool().submit(run_node, node_id, inputs)] = (node_id, time.monotonic() + timeout)
+            
+            if not running:
+                break
+            
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait(
+                list(running),
+                timeout=max(0.0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED
+            )
+            
+            for future in done:
+                node_id, _ = running.pop(future)
+                try:
+                    merge_result(node_id, future.result() or {})
+                except Exception as e:
+                    logger.error_step(NODE_STEP_NAMES.get(plan.node_type(node_id), "Workflow"),
+                                      f"Node failed: {str(e)}", {"node_id": node_id}, step_id=node_id)
+                finish(node_id)
+            
+            now = time.monotonic()
+            for future, (node_id, deadline) in list(running.items()):
+                if future not in done and deadline <= now:
+                    # The worker thread cannot be interrupted; its late
+                    # result is simply discarded
+                    del running[future]
+                    future.cancel()
+                    logger.error_step(NODE_STEP_NAMES.get(plan.node_type(node_id), "Workflow"),
+                                      f"Node timed out after {self._node_timeout(plan.node_data(node_id)):g}s",
+                                      {"node_id": node_id}, step_id=node_id)
+                    finish(node_id)
+    
+    def _node_timeout(self, node_data: Mapping[str, Any]) -> float:
+        """Per-node timeout in seconds (node data override or default)"""
+        try:
+            return float(node_data.get("timeoutSeconds") or settings.NODE_TIMEOUT_SECONDS)
+        except (TypeError, ValueError):
+            return float(settings.NODE_TIMEOUT_SECONDS)
     
     def _execute_knowledge_base(
         self, 
-        node_data: Dict[str, Any], 
+        node_data: Mapping[str, Any], 
         query: str,
         config: Dict[str, Any],
-        logger: ExecutionLogger
-    ) -> Optional[str]:
-        """Execute knowledge base retrieval"""
-        collection_name = node_data.get("collectionName")
+        logger: ExecutionLogger,
+        user_id: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Execute knowledge base retrieval; returns the hits, best first"""
+        # A node may cover several documents ("collectionNames"), which the
+        # shared vector store answers with a single filtered query
+        collection_names = list(node_data.get("collectionNames") or [])
+        if not collection_names and node_data.get("collectionName"):
+            collection_names = [node_data.get("collectionName")]
+        collection_name = ", ".join(collection_names)
         
-        if not collection_name:
+        if not collection_names:
             logger.error_step("Knowledge Base", "No collection name configured")
             return None
         
+        mode = node_data.get("retrievalMode") or settings.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            logger.error_step("Knowledge Base", f"Unknown retrieval mode '{mode}'")
+            return None
+        try:
+            top_k = max(1, int(node_data.get("topK") or settings.RETRIEVAL_TOP_K))
+        except (TypeError, ValueError):
+            top_k = settings.RETRIEVAL_TOP_K
+        
+        rerank = bool(node_data.get("rerank", settings.RERANK_ENABLED)) and self.reranker is not None
+        fetch_k = top_k
+        if rerank:
+            try:
+                fetch_k = max(top_k, int(node_data.get("rerankCandidates") or settings.RERANK_CANDIDATES))
+            except (TypeError, ValueError):
+                fetch_k = max(top_k, settings.RERANK_CANDIDATES)
+        
         try:
-            logger.info("Knowledge Base", f"Generating embedding for query")
-            query_embedding = self.embedding_service.generate_query_embedding(query)
-            logger.info("Knowledge Base", f"Embedding generated", {"embedding_dim": len(query_embedding)})
+            timings: Dict[str, float] = {}
+            hits = self._retrieve(collection_names, query, mode, fetch_k, logger, user_id, timings)
             
-            logger.info("Knowledge Base", f"Querying ChromaDB collection: {collection_name}")
-            results = self.vector_store.query(
-                collection_name=collection_name,
-                query_embedding=query_embedding,
-                n_results=5
-            )
+            if rerank and len(hits) > 1:
+                hits = self._rerank(query, hits, top_k, logger, timings)
+            hits = hits[:top_k]
             
-            documents = results.get("documents", [[]])[0]
-            logger.info("Knowledge Base", f"Retrieved {len(documents)} chunks", {"chunk_count": len(documents)})
+            logger.timings("Knowledge Base", timings)
+            logger.info("Knowledge Base", f"Retrieved {len(hits)} chunks", {
+                "chunk_count": len(hits),
+                "mode": mode,
+                "reranked": rerank
+            })
             
-            if documents:
-                context = "\n\n---\n\n".join(documents)
-                return context
+            logger.emit("chunks", {
+                "collection_name": collection_name,
+                "mode": mode,
+                "chunks": [
+                    {
+                        "collection_name": hit["metadata"].get("collection_name", collection_names[0]),
+                        "chunk_index": hit["metadata"].get("chunk_index"),
+                        "filename": hit["metadata"].get("filename"),
+                        "page_start": hit["metadata"].get("page_start"),
+                        "page_end": hit["metadata"].get("page_end"),
+                        "distance": hit.get("distance"),
+                        "bm25_score": hit.get("bm25_score"),
+                        "rrf_score": hit.get("rrf_score"),
+                        "rerank_score": hit.get("rerank_score"),
+                        "length": len(hit["text"])
+                    }
+                    for hit in hits
+                ]
+            })
             
-            return None
+            return hits or None
         except Exception as e:
             logger.error_step("Knowledge Base", f"Retrieval error: {str(e)}")
             return None
     
+    def _rerank(
+        self,
+        query: str,
+        hits: List[Dict[str, Any]],
+        top_k: int,
+        logger: ExecutionLogger,
+        timings: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """Reorder candidates with the cross-encoder; keeps retrieval order on failure"""
+        started = time.perf_counter()
+        try:
+            order, scores, rerank_stats = self.reranker.rerank(
+                query,
+                [hit["text"] for hit in hits],
+                top_k,
+                budget_ms=settings.RERANK_BUDGET_MS
+            )
+        except Exception as e:
+            logger.info("Knowledge Base", f"Reranking skipped: {str(e)}")
+            return hits
+        finally:
+            timings["rerank"] = (time.perf_counter() - started) * 1000
+        
+        for i, score in enumerate(scores):
+            if score is not None:
+                hits[i]["rerank_score"] = round(score, 4)
+        logger.info("Knowledge Base", f"Reranked {rerank_stats['candidates']} candidates", rerank_stats)
+        return [hits[i] for i in order]
+    
+    def _retrieve(
+        self,
+        collection_names: List[str],
+        query: str,
+        mode: str,
+        top_k: int,
+        logger: ExecutionLogger,
+        user_id: Optional[int] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Dense, sparse (BM25) or hybrid retrieval.
+        
+        Hybrid takes a wider candidate list from both retrievers and fuses
+        them with reciprocal rank fusion. Documents without a lexical index
+        are answered densely. Stage durations (ms) are added to timings.
+        """
+        timings = timings if timings is not None else {}
+        candidates = max(top_k, settings.HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+        
+        sparse_hits = None
+        if mode in ("sparse", "hybrid") and self.lexical_index is not None:
+            started = time.perf_counter()
+            results = self.lexical_index.search(collection_names, query, candidates, user_id)
+            timings["sparse"] = (time.perf_counter() - started) * 1000
+            if results is not None:
+                sparse_hits = [
+                    {"text": doc, "metadata": meta, "bm25_score": round(score, 4)}
+                    for doc, meta, score in zip(results["documents"][0], results["metadatas"][0], results["scores"][0])
+                ]
+                logger.info("Knowledge Base", f"BM25 matched {len(sparse_hits)} chunks")
+        if mode == "sparse":
+            if sparse_hits is not None:
+                return sparse_hits[:top_k]
+            logger.info("Knowledge Base", "No lexical index for this document, falling back to dense retrieval")
+        
+        logger.info("Knowledge Base", "Generating embedding for query")
+        started = time.perf_counter()
+        query_embedding, cache_hit = self.embedding_service.lookup_query_embedding(query)
+        timings["embedding"] = (time.perf_counter() - started) * 1000
+        logger.info("Knowledge Base", f"Embedding {'reused from cache' if cache_hit else 'generated'}", {
+            "embedding_dim": len(query_embedding),
+            "embedding_cache": "hit" if cache_hit else "miss",
+            "embedding_cache_stats": self.embedding_service.query_cache.stats()
+        })
+        
+        logger.info("Knowledge Base", f"Querying ChromaDB collection: {', '.join(collection_names)}")
+        started = time.perf_counter()
+        results = self.vector_store.query_many(
+            collection_names=collection_names,
+            query_embedding=query_embedding,
+            n_results=candidates,
+            user_id=user_id
+        )
+        timings["dense"] = (time.perf_counter() - started) * 1000
+        dense_hits = [
+            {"text": doc, "metadata": meta or {}, "distance": distance}
+            for doc, meta, distance in zip(
+                (results.get("documents") or [[]])[0],
+                (results.get("metadatas") or [[]])[0],
+                (results.get("distances") or [[]])[0]
+            )
+        ]
+        if not sparse_hits:
+            return dense_hits[:top_k]
+        
+        # Same chunk text from both retrievers counts as one candidate
+        by_text: Dict[str, Dict[str, Any]] = {}
+        for hit in dense_hits + sparse_hits:
+            by_text.setdefault(hit["text"], {}).update(hit)
+        fused = reciprocal_rank_fusion(
+            [[hit["text"] for hit in dense_hits], [hit["text"] for hit in sparse_hits]],
+            k=settings.RRF_K
+        )
+        hits = []
+        for text, score in fused[:top_k]:
+            hit = by_text[text]
+            hit["rrf_score"] = round(score, 5)
+            hits.append(hit)
+        return hits
+    
+    def _start_web_search(
+        self,
+        node_data: Mapping[str, Any],
+        query: str,
+        config: Dict[str, Any],
+        logger: ExecutionLogger
+    ) -> Optional[Future]:
+        """Start the web search of an LLM node on the node pool, if enabled"""
+        enable_web_search = node_data.get("enableWebSearch", False)
+        serp_api_key = node_data.get("serpApiKey") or config.get("serpApiKey")
+        if not (enable_web_search and serp_api_key):
+            return None
+        
+        def search() -> str:
+            logger.info("LLM Engine", "Performing web search")
+            self.web_search_service.configure(serp_api_key=serp_api_key)
+            web_results = self.web_search_service.search(query)
+            logger.info("LLM Engine", "Web search completed", {"results_length": len(web_results)})
+            return web_results
+        
+        return get_node_pool().submit(search)
+    
     def _execute_llm_engine(
         self,
-        node_data: Dict[str, Any],
+        node_data: Mapping[str, Any],
         context: Dict[str, Any],
         config: Dict[str, Any],
-        logger: ExecutionLogger
+        logger: ExecutionLogger,
+        web_future: Optional[Future] = None
     ) -> str:
         """Execute LLM generation"""
         api_key = node_data.get("apiKey") or config.get("geminiApiKey")
         model = node_data.get("model", "gemini-2.5-flash")
         prompt_template = node_data.get("prompt", "")
         temperature = float(node_data.get("temperature", 0.7))
-        enable_web_search = node_data.get("enableWebSearch", False)
-        serp_api_key = node_data.get("serpApiKey") or config.get("serpApiKey")
-        
-        self.llm_service.configure(api_key, model)
         
-        # Prepare context - combine ALL knowledge base contexts
-        combined_context = ""
-        
-        kb_contexts = context.get("kb_contexts", [])
-        if kb_contexts:
-            combined_context += "=== KNOWLEDGE BASE CONTEXTS ===\n\n"
-            for i, kb in enumerate(kb_contexts, 1):
-                combined_context += f"--- Document {i}: {kb['filename']} ---\n"
-                combined_context += kb['content']
-                combined_context += "\n\n"
-            logger.info("LLM Engine", f"Using context from {len(kb_contexts)} knowledge base(s)",
-                       {"kb_count": len(kb_contexts), "context_length": len(combined_context)})
+        # Each node gets its own pooled client so parallel LLM nodes with
+        # different keys or models do not reconfigure a shared service
+        llm_service = self.llm_service.bind(api_key, model, provider=node_data.get("provider"))
         
-        # Web search if enabled
+        # Web search if enabled (started concurrently with retrieval)
         web_results = ""
-        if enable_web_search and serp_api_key:
+        if web_future is not None:
             try:
-                logger.info("LLM Engine", "Performing web search")
-                self.web_search_service.configure(serp_api_key=serp_api_key)
-                web_results = self.web_search_service.search(context["query"])
-                logger.info("LLM Engine", "Web search completed", {"results_length": len(web_results)})
+                web_results = web_future.result()
             except Exception as e:
                 logger.error_step("LLM Engine", f"Web search failed: {str(e)}")
         
         system_prompt = prompt_template if prompt_template else None
-        chat_history = context.get("chat_history", [])
         query_template = context.get("query_template", "")
+        kb_contexts = context.get("kb_contexts", [])
+        
+        # Fit knowledge base chunks, web results and chat history into the
+        # model's input budget, most relevant material first
+        budget = ContextBudgetManager(model_token_budget(model, node_data.get("contextTokenBudget")))
+        packed = budget.pack(
+            context["query"],
+            kb_contexts,
+            web_results=web_results,
+            chat_history=context.get("chat_history", []),
+            system_prompt=system_prompt,
+            query_template=query_template,
+            conversation_memory=context.get("conversation_memory", "")
+        )
+        combined_context = packed.kb_context
+        web_results = packed.web_results
+        chat_history = packed.chat_history
+        conversation_memory = packed.conversation_memory or None
+        if kb_contexts:
+            logger.info("LLM Engine", f"Using context from {len(kb_contexts)} knowledge base(s)",
+                       {"kb_count": len(kb_contexts), "context_length": len(combined_context)})
+        logger.info("LLM Engine", 
+                   f"Prompt packed: ~{packed.report['tokens_used']}/{packed.report['token_budget']} tokens, "
+                   f"{len(packed.report['dropped'])} source(s) dropped or truncated",
+                   packed.report)
         
-        final_query = context["query"]
         if query_template:
             combined_context = f"=== USER QUERY TEMPLATE ===\n{query_template}\n\n{combined_context}"
         
@@ -258,23 +684,31 @@ class WorkflowExecutor:
                     "has_web_results": bool(web_results),
                     "chat_history_length": len(chat_history)})
         
+        on_token = None
+        if logger.listener:
+            on_token = lambda text: logger.emit("token", {"text": text})
+        
         try:
             if web_results:
-                response = self.llm_service.generate_with_web_context(
+                response = llm_service.generate_with_web_context(
                     query=context["query"],
                     web_results=web_results,
                     context=combined_context if combined_context else None,
                     system_prompt=system_prompt,
                     temperature=temperature,
-                    chat_history=chat_history
+                    chat_history=chat_history,
+                    on_token=on_token,
+                    conversation_memory=conversation_memory
                 )
             else:
-                response = self.llm_service.generate_response(
+                response = llm_service.generate_response(
                     query=context["query"],
                     context=combined_context if combined_context else None,
                     system_prompt=system_prompt,
                     temperature=temperature,
-                    chat_history=chat_history
+                    chat_history=chat_history,
+                    on_token=on_token,
+                    conversation_memory=conversation_memory
                 )
             
             return response
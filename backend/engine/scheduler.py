@@ -0,0 +1,210 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from config import settings
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a workflow execution cannot be admitted"""
+    
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExecutionScheduler:
+    """
+    Runs blocking workflow executions on a bounded worker pool.
+    
+    Work is admitted only while the number of in-flight executions (running
+    plus queued) is below ``max_workers + max_queue_size`` and the submitting
+    user is below ``per_user_limit``; everything else is rejected with a
+    SchedulerBusyError so the router can answer 429 instead of piling up.
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = 8,
+        max_queue_size: int = 32,
+        per_user_limit: int = 4,
+        sample_size: int = 1000
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        self.per_user_limit = max(1, per_user_limit)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="workflow-exec"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._per_user: Dict[Any, int] = {}
+        self._wait_ms: Deque[float] = deque(maxlen=sample_size)
+        self._run_ms: Deque[float] = deque(maxlen=sample_size)
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+    
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_size
+    
+    async def run(self, user_id: Any, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Run ``fn`` on the worker pool and await its result"""
+        return await self.submit(user_id, fn, *args, **kwargs)
+    
+    def submit(self, user_id: Any, fn: Callable[..., Any], /, *args, **kwargs) -> "asyncio.Future":
+        """
+        Admit ``fn`` and schedule it on the worker pool.
+        
+        Admission happens synchronously, so a SchedulerBusyError is raised
+        before the caller commits to a response (e.g. a streaming one).
+        Must be called from the event loop; returns an awaitable future.
+        """
+        self._admit(user_id)
+        enqueued_at = time.monotonic()
+        
+        def job():
+            started_at = time.monotonic()
+            with self._lock:
+                self._running += 1
+                self._wait_ms.append((started_at - enqueued_at) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_ms.append((time.monotonic() - started_at) * 1000)
+        
+        try:
+            future = self._pool.submit(job)
+        except RuntimeError:
+            self._release(user_id, failed=True)
+            raise SchedulerBusyError("Execution scheduler is shutting down", self._retry_after())
+        
+        # Release the slot when the job really finishes, not when the caller
+        # stops waiting: a disconnected client must not free a busy worker.
+        future.add_done_callback(
+            lambda f: self._release(user_id, failed=f.cancelled() or f.exception() is not None)
+        )
+        return asyncio.wrap_future(future)
+    
+    def _admit(self, user_id: Any):
+        with self._lock:
+            if self._per_user.get(user_id, 0) >= self.per_user_limit:
+                self._rejected += 1
+                raise SchedulerBusyError(
+                    f"Too many concurrent executions (limit {self.per_user_limit} per user)",
+                    self._retry_after_locked()
+                )
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise SchedulerBusyError(
+                    "Execution queue is full, please retry shortly",
+                    self._retry_after_locked()
+                )
+            self._in_flight += 1
+            self._submitted += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+    
+    def _release(self, user_id: Any, failed: bool = False):
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+            remaining = self._per_user.get(user_id, 1) - 1
+            if remaining > 0:
+                self._per_user[user_id] = remaining
+            else:
+                self._per_user.pop(user_id, None)
+    
+    def _retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after_locked()
+    
+    def _retry_after_locked(self) -> int:
+        """Estimate seconds until a slot frees up from recent run times"""
+        if not self._run_ms:
+            return 1
+        avg_run_s = sum(self._run_ms) / len(self._run_ms) / 1000
+        queued = max(0, self._in_flight - self.max_workers)
+        waves = queued / self.max_workers + 1
+        return max(1, math.ceil(avg_run_s * waves))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, throughput counters and wait/run times"""
+        with self._lock:
+            wait_ms = sorted(self._wait_ms)
+            run_ms = sorted(self._run_ms)
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "per_user_limit": self.per_user_limit,
+                "running": self._running,
+                "queue_depth": max(0, self._in_flight - self._running),
+                "active_users": len(self._per_user),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "wait_ms": _summarize(wait_ms),
+                "run_ms": _summarize(run_ms),
+            }
+    
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and wait for running executions"""
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _summarize(samples) -> Dict[str, Optional[float]]:
+    """Percentile summary of an already sorted sample list"""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    
+    def pct(p: float) -> float:
+        index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+        return round(samples[index], 2)
+    
+    return {
+        "count": len(samples),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": round(samples[-1], 2),
+    }
+
+
+_scheduler: Optional[ExecutionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ExecutionScheduler:
+    """Return the process-wide execution scheduler, creating it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ExecutionScheduler(
+                    max_workers=settings.EXECUTION_WORKERS,
+                    max_queue_size=settings.EXECUTION_QUEUE_SIZE,
+                    per_user_limit=settings.EXECUTION_PER_USER_LIMIT
+                )
+    return _scheduler
+
+
+def shutdown_scheduler():
+    """Shut down the process-wide scheduler if it was started"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
@@ -3,6 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 import os
 
 from database import init_db
+from engine.scheduler import get_scheduler, shutdown_scheduler
+from engine.executor import shutdown_node_pool
+from services.registry import init_registry, shutdown_registry
 from routers import documents_router, workflows_router, chat_router, auth_router
 from config import settings
 
@@ -43,8 +46,23 @@ app.include_router(chat_router)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database, shared services and execution scheduler on startup"""
     init_db()
+    registry = init_registry()
+    get_scheduler()
+    
+    # Pick up uploads that were mid-ingestion when the server stopped
+    resumed = registry.ingestion.resume_pending()
+    if resumed:
+        print(f"Resumed {resumed} ingestion job(s)")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain running workflow executions, then release shared services"""
+    shutdown_scheduler()
+    shutdown_node_pool()
+    shutdown_registry()
 
 
 @app.get("/")
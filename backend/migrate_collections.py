@@ -0,0 +1,60 @@
+"""
+Vector Store Migration Script
+Moves legacy per-document ChromaDB collections (doc_*) into the shared
+multi-tenant store used when VECTOR_STORE_MODE=shared.
+
+Usage:
+    python migrate_collections.py            # migrate everything
+    python migrate_collections.py --dry-run  # only list what would move
+"""
+import sys
+sys.path.insert(0, '.')
+
+from database import SessionLocal
+from models.document import Document
+from services.vector_store import VectorStoreService
+
+
+def migrate(dry_run: bool = False):
+    store = VectorStoreService(mode="shared")
+    legacy = [name for name in store.list_collections() if name.startswith("doc_")]
+    
+    if not legacy:
+        print("✅ No legacy doc_* collections found, nothing to migrate.")
+        return
+    
+    db = SessionLocal()
+    try:
+        owners = {
+            doc.collection_name: doc.user_id
+            for doc in db.query(Document).filter(Document.collection_name.in_(legacy)).all()
+        }
+    finally:
+        db.close()
+    
+    print(f"📦 Found {len(legacy)} legacy collection(s)")
+    moved_total = 0
+    for name in legacy:
+        user_id = owners.get(name)
+        if user_id is None:
+            print(f"   ⚠️  {name}: no matching document row, skipped")
+            continue
+        target = store.shared_collection_name(user_id)
+        if dry_run:
+            print(f"   • {name} -> {target}")
+            continue
+        try:
+            moved = store.migrate_collection(name, user_id=user_id)
+            moved_total += moved
+            print(f"   ✓ {name} -> {target} ({moved} chunks)")
+        except Exception as e:
+            print(f"   ❌ {name}: {e}")
+    
+    if not dry_run:
+        print("")
+        print(f"✅ Migration complete! {moved_total} chunks moved.")
+        print("📝 Set VECTOR_STORE_MODE=shared and restart the backend.")
+
+
+if __name__ == "__main__":
+    migrate(dry_run="--dry-run" in sys.argv)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from database import Base
 
@@ -23,3 +23,37 @@ class ChatLog(Base):
             "assistant_message": self.assistant_message,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
+
+
+class ConversationSummary(Base):
+    """Rolling summary of the chat turns that fell out of the verbatim window"""
+    __tablename__ = "conversation_summaries"
+    __table_args__ = (UniqueConstraint("user_id", "workflow_id", name="uq_conversation_summary"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
+    summary = Column(Text, nullable=False, default="")
+    last_chat_log_id = Column(Integer, nullable=False, default=0)  # newest turn folded in
+    turns_summarized = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "workflow_id": self.workflow_id,
+            "summary": self.summary,
+            "last_chat_log_id": self.last_chat_log_id,
+            "turns_summarized": self.turns_summarized,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ChatTurnEmbedding(Base):
+    """Embedding of one chat turn, used to recall relevant earlier turns"""
+    __tablename__ = "chat_turn_embeddings"
+    
+    chat_log_id = Column(Integer, ForeignKey("chat_logs.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False, index=True)
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from sqlalchemy.sql import func
+from database import Base
+
+
+class ChunkEmbedding(Base):
+    """Content-addressed chunk embedding shared by every upload containing the chunk"""
+    __tablename__ = "chunk_embeddings"
+    
+    content_hash = Column(String(128), primary_key=True)  # "<model>:<sha256 of normalized text>"
+    dimensions = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # refreshed on reuse, for pruning
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
+from sqlalchemy.sql import func
+from database import Base
+
+
+class IngestionJob(Base):
+    """Background document ingestion job (upload -> extract -> embed -> index)"""
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String(36), primary_key=True, index=True)  # UUID, also names the upload file
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)  # set up front for updates
+    target_document_id = Column(Integer, nullable=True)  # document an update replaces; kept if that document is deleted
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500))  # content-addressed, may be shared with other uploads
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the uploaded bytes
+    collection_name = Column(String(255))  # ChromaDB collection name
+    status = Column(String(20), nullable=False, default="queued")  # queued, extracting, embedding, indexing, ready, failed
+    last_completed_stage = Column(String(20), nullable=True)  # extracting, embedding, indexing
+    chunking = Column(JSON, nullable=True)  # strategy and options chosen at upload
+    chunk_stats = Column(JSON, nullable=True)  # chunk count / token utilization after extraction
+    chunk_diff = Column(JSON, nullable=True)  # added/kept/removed chunks in the vector store
+    chunks_total = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    chunks_reused = Column(Integer, default=0)  # chunks whose vector came from the content-hash index
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "document_id": self.document_id,
+            "target_document_id": self.target_document_id,
+            "filename": self.filename,
+            "collection_name": self.collection_name,
+            "status": self.status,
+            "last_completed_stage": self.last_completed_stage,
+            "chunking": self.chunking,
+            "chunk_stats": self.chunk_stats,
+            "chunk_diff": self.chunk_diff,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "content_hash": self.content_hash,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
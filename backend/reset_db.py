@@ -13,6 +13,10 @@ def reset_database():
     
     # Drop all tables in correct order (respecting foreign keys)
     with engine.connect() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS ingestion_jobs CASCADE"))
+        conn.execute(text("DROP TABLE IF EXISTS chunk_embeddings CASCADE"))
+        conn.execute(text("DROP TABLE IF EXISTS chat_turn_embeddings CASCADE"))
+        conn.execute(text("DROP TABLE IF EXISTS conversation_summaries CASCADE"))
         conn.execute(text("DROP TABLE IF EXISTS chat_logs CASCADE"))
         conn.execute(text("DROP TABLE IF EXISTS execution_logs CASCADE"))
         conn.execute(text("DROP TABLE IF EXISTS documents CASCADE"))
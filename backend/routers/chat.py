@@ -1,15 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable
+import asyncio
+import json
 import uuid
 
-from database import get_db
+from database import get_db, SessionLocal
 from models.chat import ChatLog
 from models.execution_log import ExecutionLog
 from models.user import User
-from engine.executor import WorkflowExecutor
+from engine.scheduler import get_scheduler, SchedulerBusyError
+from engine.compiler import get_plan, WorkflowValidationError
 from services.auth import get_current_user
+from services.registry import get_registry, ServiceRegistry
+from services.web_search import WebSearchService
+from services.llm import LLMService
+from config import settings
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -24,86 +32,299 @@ class ExecuteRequest(BaseModel):
     query: str
     config: Dict[str, Any]  # API keys and other config
     workflow_id: Optional[int] = None
+    # Omit to use the saved conversation of workflow_id (windowed, summarized
+    # and recalled server-side); when sent, it is used as given
     chat_history: Optional[List[ChatMessageItem]] = None
 
 
 @router.post("/execute")
 async def execute_workflow(
     request: ExecuteRequest, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
 ):
     """Execute a workflow with a user query"""
     try:
         execution_id = str(uuid.uuid4())
-        executor = WorkflowExecutor()
         
         history = None
-        if request.chat_history:
+        if request.chat_history is not None:
             history = [{"role": msg.role, "content": msg.content} for msg in request.chat_history]
         
-        result = executor.execute(
-            workflow_definition=request.workflow,
-            user_query=request.query,
-            config=request.config,
-            chat_history=history,
-            execution_id=execution_id,
-            workflow_id=request.workflow_id
+        # Reject invalid graphs before they take a worker slot
+        get_plan(request.workflow)
+        
+        # Execution is fully blocking (embedding, ChromaDB, search, Gemini),
+        # and so is persisting the turn, so both run on the scheduler's
+        # worker pool instead of the event loop
+        result = await get_scheduler().run(
+            current_user.id,
+            _run_and_persist,
+            registry,
+            request,
+            current_user.id,
+            execution_id,
+            history
         )
         
         response = result["response"]
         logs = result.get("logs", [])
         
-        # Save execution logs
-        for log in logs:
-            db_log = ExecutionLog(
-                execution_id=execution_id,
-                workflow_id=request.workflow_id,
-                step_name=log["step_name"],
-                status=log["status"],
-                message=log["message"],
-                log_metadata=log.get("metadata")
-            )
-            db.add(db_log)
-        
-        # Save chat log with user_id
-        if request.workflow_id:
-            chat_log = ChatLog(
-                user_id=current_user.id,
-                workflow_id=request.workflow_id,
-                user_message=request.query,
-                assistant_message=response
-            )
-            db.add(chat_log)
-        
-        db.commit()
-        
         return {
             "response": response,
             "query": request.query,
             "execution_id": execution_id,
-            "logs": logs
+            "logs": logs,
+            "cached": result.get("cached", False)
         }
+    except WorkflowValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {str(e)}")
+    except SchedulerBusyError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
 
 
+@router.post("/execute/stream")
+async def execute_workflow_stream(
+    request: ExecuteRequest,
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """
+    Execute a workflow and stream progress as Server-Sent Events.
+    
+    Events: "log" (execution log entries as steps start/complete),
+    "chunks" (retrieved knowledge base chunk metadata), "token" (LLM output
+    fragments), then "done" with the final response or "error".
+    """
+    execution_id = str(uuid.uuid4())
+    user_id = current_user.id
+    
+    history = None
+    if request.chat_history is not None:
+        history = [{"role": msg.role, "content": msg.content} for msg in request.chat_history]
+    
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def listener(event: str, data: Dict[str, Any]):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+    
+    try:
+        get_plan(request.workflow)
+    except WorkflowValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {str(e)}")
+    
+    # Admit before the response starts so a full queue still answers 429
+    try:
+        # Rows are persisted on the worker, so they are written even if the
+        # client disconnects before the stream finishes
+        future = get_scheduler().submit(
+            user_id, _run_and_persist, registry, request, user_id, execution_id, history, listener
+        )
+    except SchedulerBusyError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    async def event_stream():
+        yield _sse("start", {"execution_id": execution_id, "query": request.query})
+        while not (future.done() and events.empty()):
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                event, data = getter.result()
+                yield _sse(event, data)
+            else:
+                getter.cancel()
+        
+        try:
+            result = future.result()
+            yield _sse("done", {
+                "response": result["response"],
+                "query": request.query,
+                "execution_id": execution_id,
+                "cached": result.get("cached", False)
+            })
+        except Exception as e:
+            yield _sse("error", {"detail": f"Execution error: {str(e)}", "execution_id": execution_id})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _run_workflow(registry: ServiceRegistry, **kwargs) -> Dict[str, Any]:
+    """Build an executor from shared services and run the workflow (called on a worker thread)"""
+    # Unless the client sends its own history, saved conversations come from
+    # the database: recent turns verbatim, older ones as a rolling summary
+    # plus recalled turns
+    memory = registry.memory.load(
+        kwargs["user_query"],
+        user_id=kwargs.get("user_id"),
+        workflow_id=kwargs.get("workflow_id"),
+        chat_history=kwargs.get("chat_history")
+    )
+    kwargs["chat_history"] = memory.messages
+    kwargs["conversation_memory"] = {"text": memory.text, "stats": memory.stats}
+    executor = registry.create_executor()
+    return executor.execute(**kwargs)
+
+
+def _run_and_persist(
+    registry: ServiceRegistry,
+    request: ExecuteRequest,
+    user_id: int,
+    execution_id: str,
+    history: Optional[List[Dict[str, str]]],
+    listener: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """Run the workflow and persist the turn (called on a worker thread)"""
+    result = _run_workflow(
+        registry,
+        workflow_definition=request.workflow,
+        user_query=request.query,
+        config=request.config,
+        chat_history=history,
+        execution_id=execution_id,
+        workflow_id=request.workflow_id,
+        listener=listener,
+        user_id=user_id
+    )
+    db = SessionLocal()
+    try:
+        _save_execution(registry, db, execution_id, request, user_id, result["response"], result.get("logs", []))
+    finally:
+        db.close()
+    _refresh_memory(registry, request, user_id)
+    return result
+
+
+def _refresh_memory(registry: ServiceRegistry, request: ExecuteRequest, user_id: int):
+    """Update the conversation summary and turn embeddings after a saved turn"""
+    if not request.workflow_id:
+        return
+    api_key = request.config.get("geminiApiKey")
+    for node in request.workflow.get("nodes", []):
+        if node.get("type") == "llmEngine" and (node.get("data") or {}).get("apiKey"):
+            api_key = node["data"]["apiKey"]
+            break
+    registry.memory.schedule_refresh(user_id, request.workflow_id, api_key=api_key)
+
+
+def _save_execution(
+    registry: ServiceRegistry,
+    db: Session,
+    execution_id: str,
+    request: ExecuteRequest,
+    user_id: int,
+    response: str,
+    logs: List[Dict[str, Any]]
+):
+    """Persist execution logs and the chat turn of one execution"""
+    # Log rows go to the bulk sink (buffered in the background by default);
+    # the chat turn is committed now because the next turn's memory reads it
+    registry.log_sink.write(db, execution_id, request.workflow_id, logs)
+    
+    # Save chat log with user_id
+    if request.workflow_id:
+        chat_log = ChatLog(
+            user_id=user_id,
+            workflow_id=request.workflow_id,
+            user_message=request.query,
+            assistant_message=response
+        )
+        db.add(chat_log)
+    
+    db.commit()
+
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats(current_user: User = Depends(get_current_user)):
+    """Get queue depth, wait-time and throughput metrics of the execution scheduler"""
+    return get_scheduler().stats()
+
+
+@router.get("/embedding/stats")
+async def get_embedding_stats(
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """Get query embedding cache and micro-batching metrics"""
+    return registry.embedding_service.stats()
+
+
+@router.get("/search/stats")
+async def get_web_search_stats(current_user: User = Depends(get_current_user)):
+    """Get web search cache, hedging, circuit breaker and latency metrics"""
+    return WebSearchService.stats()
+
+
+@router.get("/llm/stats")
+async def get_llm_client_stats(current_user: User = Depends(get_current_user)):
+    """Get pooled Gemini client metrics"""
+    return LLMService.client_pool().stats()
+
+
+@router.get("/log-sink/stats")
+async def get_log_sink_stats(
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """Get execution log buffer and bulk write metrics"""
+    return registry.log_sink.stats()
+
+
+@router.get("/cache/stats")
+async def get_response_cache_stats(
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """Get response cache size and hit-rate metrics"""
+    return registry.response_cache.stats()
+
+
 @router.get("/history/{workflow_id}")
 async def get_chat_history(
     workflow_id: int, 
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get chat history for a workflow owned by current user"""
-    logs = db.query(ChatLog).filter(
+    """
+    Get chat history for a workflow owned by current user.
+    
+    Returns the latest `limit` turns (CHAT_HISTORY_PAGE_SIZE by default) in
+    order; pass the chat_log_id of the oldest message as `before` to page back.
+    """
+    limit = max(1, min(limit or settings.CHAT_HISTORY_PAGE_SIZE, 500))
+    query = db.query(ChatLog).filter(
         ChatLog.workflow_id == workflow_id,
         ChatLog.user_id == current_user.id
-    ).order_by(ChatLog.created_at).all()
+    )
+    if before is not None:
+        query = query.filter(ChatLog.id < before)
+    logs = query.order_by(ChatLog.id.desc()).limit(limit).all()
     
     messages = []
-    for log in logs:
-        messages.append({"role": "user", "content": log.user_message})
-        messages.append({"role": "assistant", "content": log.assistant_message})
+    for log in reversed(logs):
+        messages.append({"role": "user", "content": log.user_message, "chat_log_id": log.id})
+        messages.append({"role": "assistant", "content": log.assistant_message, "chat_log_id": log.id})
     
     return messages
 
@@ -112,9 +333,11 @@ async def get_chat_history(
 async def clear_chat_history(
     workflow_id: int, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
 ):
     """Clear chat history for a workflow owned by current user"""
+    registry.memory.clear(db, current_user.id, workflow_id)
     db.query(ChatLog).filter(
         ChatLog.workflow_id == workflow_id,
         ChatLog.user_id == current_user.id
@@ -127,12 +350,14 @@ async def clear_chat_history(
 async def get_execution_logs(
     execution_id: str, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
 ):
     """Get execution logs for a specific execution"""
+    await _flush_logs(registry)
     logs = db.query(ExecutionLog).filter(
         ExecutionLog.execution_id == execution_id
-    ).order_by(ExecutionLog.created_at).all()
+    ).order_by(ExecutionLog.created_at, ExecutionLog.id).all()
     
     return [log.to_dict() for log in logs]
 
@@ -142,11 +367,19 @@ async def get_workflow_execution_logs(
     workflow_id: int, 
     limit: int = 50, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
 ):
     """Get recent execution logs for a workflow"""
+    await _flush_logs(registry)
     logs = db.query(ExecutionLog).filter(
         ExecutionLog.workflow_id == workflow_id
-    ).order_by(ExecutionLog.created_at.desc()).limit(limit).all()
+    ).order_by(ExecutionLog.created_at.desc(), ExecutionLog.id.desc()).limit(limit).all()
     
     return [log.to_dict() for log in reversed(logs)]
+
+
+async def _flush_logs(registry: ServiceRegistry):
+    """Write buffered execution logs so reads include the latest executions"""
+    if registry.log_sink.stats()["pending_rows"]:
+        await asyncio.get_running_loop().run_in_executor(None, registry.log_sink.flush)
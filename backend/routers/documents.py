@@ -1,17 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.exc import OperationalError
+from typing import Any, Dict, Optional, Tuple
+import hashlib
 import os
 import uuid
 import time
 
 from database import get_db
 from models.document import Document
+from models.ingestion_job import IngestionJob
 from models.user import User
-from services.text_extractor import TextExtractor
-from services.local_embedding import LocalEmbeddingService
-from services.vector_store import VectorStoreService
 from services.auth import get_current_user
+from services.chunking import CHUNKING_STRATEGIES, TokenChunker
+from services.ingestion import TERMINAL_STATUSES, remove_unreferenced_file
+from services.registry import get_registry, ServiceRegistry
 from config import settings
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
@@ -34,16 +37,12 @@ def safe_remove_file(file_path: str, retries: int = 3):
                 pass
 
 
-@router.post("/upload")
-async def upload_document(
-    file: UploadFile = File(...),
-    api_key: Optional[str] = Form(None),
-    embedding_model: str = Form("local"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Upload and process a document for the current user"""
-    # Validate file type
+# Uploads are streamed to disk in chunks of this size instead of read whole
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def check_file_type(file: UploadFile) -> str:
+    """Return the lowercased extension of an upload, or raise 400"""
     allowed_extensions = ['.pdf', '.txt', '.md']
     file_ext = os.path.splitext(file.filename)[1].lower()
     
@@ -52,72 +51,174 @@ async def upload_document(
             status_code=400,
             detail=f"File type not supported. Allowed: {allowed_extensions}"
         )
+    return file_ext
+
+
+def chunking_options(
+    chunking_strategy: Optional[str],
+    chunk_max_tokens: Optional[int],
+    chunk_overlap_tokens: Optional[int]
+) -> Dict[str, Any]:
+    """Validate the per-upload chunking fields and fill in defaults"""
+    strategy = chunking_strategy or settings.CHUNKING_STRATEGY
+    if strategy not in CHUNKING_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Chunking strategy not supported. Allowed: {sorted(CHUNKING_STRATEGIES)}"
+        )
+    chunking: Dict[str, Any] = {"strategy": strategy}
+    if strategy == TokenChunker.name:
+        chunking["max_tokens"] = chunk_max_tokens or settings.CHUNK_MAX_TOKENS or None
+        chunking["overlap_tokens"] = (
+            settings.CHUNK_OVERLAP_TOKENS if chunk_overlap_tokens is None else chunk_overlap_tokens
+        )
+    return chunking
+
+
+async def save_upload(file: UploadFile, file_id: str) -> Tuple[str, str]:
+    """
+    Stream an upload to a temporary file and return (temp_path, content_hash).
     
-    # Save the file
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{file_ext}")
+    The file is moved under its content hash by queue_job, so identical
+    uploads (from any user) share one copy on disk.
+    """
+    temp_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}.part")
+    digest = hashlib.sha256()
     
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
     except Exception as e:
+        safe_remove_file(temp_path)
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
-    
-    # Extract text
+    return temp_path, digest.hexdigest()
+
+
+def content_path(content_hash: str, file_ext: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, f"{content_hash}{file_ext}")
+
+
+def queue_job(db: Session, registry: ServiceRegistry, job: IngestionJob, temp_path: str) -> Dict[str, Any]:
+    """Persist an ingestion job, move its upload in place and hand it to the background pipeline"""
     try:
-        extractor = TextExtractor()
-        text_content = extractor.extract(file_path)
-        chunks = extractor.chunk_text(text_content)
+        db.add(job)
+        db.commit()
     except Exception as e:
-        safe_remove_file(file_path)
-        raise HTTPException(status_code=500, detail=f"Error extracting text: {str(e)}")
+        db.rollback()
+        safe_remove_file(temp_path)
+        raise HTTPException(status_code=500, detail=f"Error saving to database: {str(e)}")
     
-    # Generate embeddings
+    # The committed job now references the shared file, so a concurrent
+    # delete of its last other user keeps it (see remove_unreferenced_file)
     try:
-        embedding_service = LocalEmbeddingService()
-        embeddings = embedding_service.generate_embeddings(chunks)
-    except Exception as e:
-        safe_remove_file(file_path)
-        raise HTTPException(status_code=500, detail=f"Error generating embeddings: {str(e)}")
+        if os.path.exists(job.file_path):
+            safe_remove_file(temp_path)
+        else:
+            os.replace(temp_path, job.file_path)
+    except OSError as e:
+        safe_remove_file(temp_path)
+        job.status = "failed"
+        job.error = f"Error saving file: {str(e)}"
+        db.commit()
+        raise HTTPException(status_code=500, detail=job.error)
     
-    # Store in vector database
-    try:
-        collection_name = f"doc_{file_id}"
-        vector_store = VectorStoreService()
-        vector_store.add_documents(
-            collection_name=collection_name,
-            texts=chunks,
-            embeddings=embeddings,
-            metadatas=[{"chunk_index": i, "filename": file.filename} for i in range(len(chunks))]
-        )
-    except Exception as e:
-        safe_remove_file(file_path)
-        raise HTTPException(status_code=500, detail=f"Error storing embeddings: {str(e)}")
+    registry.ingestion.submit(job.id)
+    db.refresh(job)
+    return job.to_dict()
+
+
+@router.post("/upload", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...),
+    api_key: Optional[str] = Form(None),
+    embedding_model: str = Form("local"),
+    chunking_strategy: Optional[str] = Form(None),
+    chunk_max_tokens: Optional[int] = Form(None),
+    chunk_overlap_tokens: Optional[int] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """
+    Upload a document for the current user.
     
-    # Save to database
-    try:
-        document = Document(
-            user_id=current_user.id,
-            filename=file.filename,
-            file_path=file_path,
-            content=text_content[:5000],
-            collection_name=collection_name
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-    except Exception as e:
-        safe_remove_file(file_path)
-        raise HTTPException(status_code=500, detail=f"Error saving to database: {str(e)}")
+    The file is saved and an ingestion job is queued; extraction, embedding
+    and indexing run in the background. Poll /jobs/{job_id} for progress.
+    """
+    file_ext = check_file_type(file)
+    chunking = chunking_options(chunking_strategy, chunk_max_tokens, chunk_overlap_tokens)
+    
+    file_id = str(uuid.uuid4())
+    temp_path, content_hash = await save_upload(file, file_id)
     
-    return {
-        "id": document.id,
-        "filename": document.filename,
-        "collection_name": collection_name,
-        "chunks_count": len(chunks),
-        "message": "Document uploaded and processed successfully"
-    }
+    return queue_job(db, registry, IngestionJob(
+        id=file_id,
+        user_id=current_user.id,
+        filename=file.filename,
+        file_path=content_path(content_hash, file_ext),
+        content_hash=content_hash,
+        collection_name=f"doc_{file_id}",
+        chunking=chunking,
+        status="queued"
+    ), temp_path)
+
+
+@router.get("/jobs")
+async def list_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List ingestion jobs for the current user, newest first"""
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.user_id == current_user.id
+    ).order_by(IngestionJob.created_at.desc()).all()
+    return [job.to_dict() for job in jobs]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status of an ingestion job owned by the current user"""
+    job = db.query(IngestionJob).filter(
+        IngestionJob.id == job_id,
+        IngestionJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """Retry a failed ingestion job from its last completed stage"""
+    job = db.query(IngestionJob).filter(
+        IngestionJob.id == job_id,
+        IngestionJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried (status: {job.status})")
+    if not job.last_completed_stage and not os.path.exists(job.file_path):
+        # Failed jobs do not keep their upload; extraction needs it again
+        raise HTTPException(status_code=409, detail="The uploaded file is no longer available, upload it again")
+    
+    registry.ingestion.submit(job.id)
+    db.refresh(job)
+    return job.to_dict()
 
 
 @router.get("")
@@ -146,13 +247,24 @@ async def get_document(
     return document.to_dict()
 
 
-@router.delete("/{document_id}")
-async def delete_document(
-    document_id: int, 
+@router.put("/{document_id}", status_code=202)
+async def update_document(
+    document_id: int,
+    file: UploadFile = File(...),
+    chunking_strategy: Optional[str] = Form(None),
+    chunk_max_tokens: Optional[int] = Form(None),
+    chunk_overlap_tokens: Optional[int] = Form(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
 ):
-    """Delete a document owned by the current user"""
+    """
+    Replace a document's content, re-indexing only what changed.
+    
+    The new file goes through the ingestion pipeline; chunks are diffed
+    against the stored ones by content hash, so unchanged chunks keep their
+    vectors and the collection name used by workflows stays the same.
+    """
     document = db.query(Document).filter(
         Document.id == document_id,
         Document.user_id == current_user.id
@@ -160,18 +272,71 @@ async def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    pending = db.query(IngestionJob).filter(
+        IngestionJob.document_id == document.id,
+        IngestionJob.status.notin_(TERMINAL_STATUSES)
+    ).first()
+    if pending:
+        raise HTTPException(status_code=409, detail=f"Document is already being updated (job {pending.id})")
+    
+    file_ext = check_file_type(file)
+    chunking = chunking_options(chunking_strategy, chunk_max_tokens, chunk_overlap_tokens)
+    
+    file_id = str(uuid.uuid4())
+    temp_path, content_hash = await save_upload(file, file_id)
+    
+    return queue_job(db, registry, IngestionJob(
+        id=file_id,
+        user_id=current_user.id,
+        document_id=document.id,
+        target_document_id=document.id,
+        filename=file.filename,
+        file_path=content_path(content_hash, file_ext),
+        content_hash=content_hash,
+        collection_name=document.collection_name,
+        chunking=chunking,
+        status="queued"
+    ), temp_path)
+
+
+@router.delete("/{document_id}")
+async def delete_document(
+    document_id: int, 
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    registry: ServiceRegistry = Depends(get_registry)
+):
+    """Delete a document owned by the current user"""
+    try:
+        # An update in its indexing stage holds this row lock until it commits
+        document = db.query(Document).filter(
+            Document.id == document_id,
+            Document.user_id == current_user.id
+        ).with_for_update(nowait=True).first()
+    except OperationalError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Document is being re-indexed, try again shortly")
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Remove the row first, so a queued update of this document fails
+    # instead of re-indexing it
+    db.delete(document)
+    db.commit()
+    
     # Delete from vector store
     try:
-        vector_store = VectorStoreService()
-        vector_store.delete_collection(document.collection_name)
+        registry.vector_store.delete_collection(document.collection_name, user_id=current_user.id)
     except Exception:
         pass
+    try:
+        registry.lexical_index.delete(document.collection_name)
+    except Exception:
+        pass
+    registry.response_cache.invalidate_collection(document.collection_name)
     
-    # Delete file
-    if document.file_path and os.path.exists(document.file_path):
-        os.remove(document.file_path)
-    
-    db.delete(document)
-    db.commit()
+    # Delete file unless another upload shares it
+    if document.file_path:
+        remove_unreferenced_file(db, document.file_path)
     
     return {"message": "Document deleted successfully"}
@@ -7,10 +7,20 @@ from database import get_db
 from models.workflow import Workflow
 from models.user import User
 from services.auth import get_current_user
+from engine.compiler import validate_workflow
 
 router = APIRouter(prefix="/api/workflows", tags=["workflows"])
 
 
+def check_definition(definition: Dict[str, Any]):
+    """Reject workflow graphs that could never execute"""
+    # An empty canvas is a valid draft (the dashboard creates workflows this way)
+    require_complete = bool(definition.get("nodes"))
+    errors = validate_workflow(definition, require_complete=require_complete)
+    if errors:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {'; '.join(errors)}")
+
+
 class WorkflowCreate(BaseModel):
     name: str
     definition: Dict[str, Any]  # Contains nodes and edges
@@ -28,6 +38,7 @@ async def create_workflow(
     current_user: User = Depends(get_current_user)
 ):
     """Create a new workflow for the current user"""
+    check_definition(workflow.definition)
     try:
         db_workflow = Workflow(
             user_id=current_user.id,
@@ -86,6 +97,7 @@ async def update_workflow(
     if workflow_update.name is not None:
         workflow.name = workflow_update.name
     if workflow_update.definition is not None:
+        check_definition(workflow_update.definition)
         workflow.definition = workflow_update.definition
     
     db.commit()
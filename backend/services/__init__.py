@@ -3,7 +3,9 @@ from .embedding import EmbeddingService
 from .local_embedding import LocalEmbeddingService
 from .vector_store import VectorStoreService
 from .llm import LLMService
+from .llm_providers import LLMProvider, GeminiProvider, MockLLMProvider
 from .web_search import WebSearchService
+from .registry import ServiceRegistry
 
 __all__ = [
     "TextExtractor",
@@ -11,5 +13,9 @@ __all__ = [
     "LocalEmbeddingService",
     "VectorStoreService",
     "LLMService",
-    "WebSearchService"
+    "LLMProvider",
+    "GeminiProvider",
+    "MockLLMProvider",
+    "WebSearchService",
+    "ServiceRegistry"
 ]
@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, List
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.chunk_embedding import ChunkEmbedding
+
+
+class ChunkEmbeddingStore:
+    """
+    Content-hash index of chunk embeddings.
+    
+    Keys come from LocalEmbeddingService.content_key(), so identical chunk
+    text (after whitespace/Unicode normalization) maps to one stored vector
+    regardless of which document or user it came from.
+    
+    Vectors are only a shortcut (they can always be recomputed), so rather
+    than tracking which documents still reference them the store is capped
+    at max_entries (0 = unbounded): prune() drops the least recently used.
+    """
+    
+    def __init__(self, lookup_batch_size: int = 500, max_entries: int = 0):
+        self.lookup_batch_size = max(1, lookup_batch_size)
+        self.max_entries = max(0, max_entries)
+    
+    def lookup(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the stored vectors for whichever keys are known"""
+        unique = list(dict.fromkeys(keys))
+        found: Dict[str, np.ndarray] = {}
+        db = SessionLocal()
+        try:
+            for start in range(0, len(unique), self.lookup_batch_size):
+                batch = unique[start:start + self.lookup_batch_size]
+                rows = db.query(ChunkEmbedding).filter(ChunkEmbedding.content_hash.in_(batch)).all()
+                for row in rows:
+                    found[row.content_hash] = np.frombuffer(row.vector, dtype=np.float32)
+                if rows and self.max_entries:
+                    db.query(ChunkEmbedding).filter(
+                        ChunkEmbedding.content_hash.in_([row.content_hash for row in rows])
+                    ).update({ChunkEmbedding.last_used_at: func.now()}, synchronize_session=False)
+                    db.commit()
+        finally:
+            db.close()
+        return found
+    
+    def save(self, vectors: Dict[str, np.ndarray]):
+        """Store new vectors; keys written concurrently by another upload are skipped"""
+        if not vectors:
+            return
+        rows = self._rows(vectors)
+        db = SessionLocal()
+        try:
+            db.add_all(rows)
+            db.commit()
+        except IntegrityError:
+            # Another job stored some of these meanwhile; insert the rest one by one
+            db.rollback()
+            for row in self._rows(vectors):
+                try:
+                    db.add(row)
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+        finally:
+            db.close()
+    
+    def prune(self) -> int:
+        """Delete the least recently used vectors beyond max_entries; returns how many"""
+        if not self.max_entries:
+            return 0
+        db = SessionLocal()
+        try:
+            excess = db.query(func.count(ChunkEmbedding.content_hash)).scalar() - self.max_entries
+            if excess <= 0:
+                return 0
+            oldest = db.query(ChunkEmbedding.content_hash).order_by(
+                ChunkEmbedding.last_used_at, ChunkEmbedding.created_at
+            ).limit(excess).scalar_subquery()
+            removed = db.query(ChunkEmbedding).filter(
+                ChunkEmbedding.content_hash.in_(oldest)
+            ).delete(synchronize_session=False)
+            db.commit()
+            return removed
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _rows(vectors: Dict[str, np.ndarray]) -> List[ChunkEmbedding]:
+        rows = []
+        for key, vector in vectors.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append(ChunkEmbedding(content_hash=key, dimensions=vector.shape[0], vector=vector.tobytes()))
+        return rows
@@ -0,0 +1,275 @@
+import re
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from services.text_extractor import TextExtractor
+
+
+# Blank line between paragraphs
+PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n")
+# Markdown ATX heading at the start of a line
+HEADING_RE = re.compile(r"^[ \t]{0,3}#{1,6}[ \t]+\S")
+# Whitespace following sentence-ending punctuation
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class Unit(NamedTuple):
+    """Smallest piece the packer works with: a sentence, heading or token window"""
+    text: str
+    separator: str  # joins this unit to the previous one in a chunk
+    tokens: int
+    page_start: Optional[int]
+    page_end: Optional[int]
+    heading: bool
+
+
+class ChunkStats:
+    """Chunk-count and token-utilization statistics for one document"""
+    
+    def __init__(self, token_limit: int):
+        self.token_limit = token_limit
+        self.chunk_count = 0
+        self.total_tokens = 0
+        self.min_tokens: Optional[int] = None
+        self.max_tokens = 0
+        self.over_limit = 0  # chunks the embedding model would truncate
+    
+    def add(self, tokens: int):
+        self.chunk_count += 1
+        self.total_tokens += tokens
+        self.min_tokens = tokens if self.min_tokens is None else min(self.min_tokens, tokens)
+        self.max_tokens = max(self.max_tokens, tokens)
+        if tokens > self.token_limit:
+            self.over_limit += 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        mean = self.total_tokens / self.chunk_count if self.chunk_count else 0.0
+        return {
+            "chunk_count": self.chunk_count,
+            "total_tokens": self.total_tokens,
+            "mean_tokens": round(mean, 1),
+            "min_tokens": self.min_tokens,
+            "max_tokens": self.max_tokens,
+            "token_limit": self.token_limit,
+            "utilization": round(mean / self.token_limit, 3) if self.token_limit else None,
+            "over_limit": self.over_limit
+        }
+
+
+class TokenChunker:
+    """
+    Packs sentences into chunks sized by the embedding model's tokenizer.
+    
+    The page stream is cut into paragraphs as it arrives; each paragraph is
+    tokenized once (with offsets) and split into sentences, which are packed
+    greedily up to max_tokens. Markdown headings always start a new chunk and
+    label the chunks that follow. Sentences longer than max_tokens are split
+    on token boundaries. Every character is scanned a constant number of
+    times, so the pass is linear in document size.
+    """
+    
+    name = "tokens"
+    MAX_PENDING_CHARS = 16 * 1024  # force a block cut if no paragraph break shows up
+    
+    def __init__(self, tokenizer: Any, max_tokens: int = 254, overlap_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(8, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.stats = ChunkStats(self.max_tokens)
+    
+    def chunk(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Dict[str, Any]]:
+        """Yield {"text", "page_start", "page_end", "tokens", "section"} dicts"""
+        current: List[Unit] = []
+        current_tokens = 0
+        section: Optional[str] = None
+        chunk_section: Optional[str] = None
+        
+        for unit in self._units(pages):
+            if unit.heading and current:
+                yield self._emit(current, current_tokens, chunk_section)
+                current, current_tokens = [], 0
+            elif current and current_tokens + unit.tokens > self.max_tokens:
+                yield self._emit(current, current_tokens, chunk_section)
+                current = self._overlap(current, unit.tokens)
+                current_tokens = sum(u.tokens for u in current)
+            
+            if unit.heading:
+                section = unit.text.strip().lstrip("#").strip()
+            if not current:
+                chunk_section = section
+            current.append(unit)
+            current_tokens += unit.tokens
+        
+        if current:
+            yield self._emit(current, current_tokens, chunk_section)
+    
+    def _overlap(self, previous: List[Unit], next_tokens: int) -> List[Unit]:
+        """Trailing units of the previous chunk to repeat at the start of the next"""
+        carried: List[Unit] = []
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        for unit in reversed(previous[1:]):
+            if unit.heading or unit.tokens > budget:
+                break
+            carried.insert(0, unit)
+            budget -= unit.tokens
+        return carried
+    
+    def _emit(self, units: List[Unit], tokens: int, section: Optional[str]) -> Dict[str, Any]:
+        text = units[0].text + "".join(u.separator + u.text for u in units[1:])
+        self.stats.add(tokens)
+        return {
+            "text": text,
+            "page_start": units[0].page_start,
+            "page_end": units[-1].page_end,
+            "tokens": tokens,
+            "section": section
+        }
+    
+    def _units(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Unit]:
+        for block, page_start, page_end in self._blocks(pages):
+            separator = "\n\n"
+            lines = block.split("\n")
+            # Headings become their own units; the lines between them are one paragraph
+            paragraph: List[str] = []
+            for line in lines + [None]:
+                if line is not None and not HEADING_RE.match(line):
+                    paragraph.append(line)
+                    continue
+                text = "\n".join(paragraph).strip()
+                if text:
+                    yield from self._sentence_units(text, separator, page_start, page_end)
+                    separator = "\n"
+                paragraph = []
+                if line is not None:
+                    tokens = len(self._encode(line.strip())["input_ids"])
+                    yield Unit(line.strip(), separator, tokens, page_start, page_end, True)
+                    separator = "\n"
+    
+    def _sentence_units(
+        self,
+        text: str,
+        separator: str,
+        page_start: Optional[int],
+        page_end: Optional[int]
+    ) -> Iterator[Unit]:
+        """Split a paragraph into sentence units using one tokenizer call"""
+        encoding = self._encode(text, offsets=True)
+        offsets = encoding["offset_mapping"]
+        
+        # Sentence spans, then token ranges per span by walking the offsets once
+        spans: List[Tuple[int, int]] = []
+        start = 0
+        for match in SENTENCE_BREAK_RE.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+        
+        token_index, token_count = 0, len(offsets)
+        for span_start, span_end in spans:
+            first = token_index
+            while token_index < token_count and offsets[token_index][0] < span_end:
+                token_index += 1
+            sentence_offsets = offsets[first:token_index]
+            if len(sentence_offsets) <= self.max_tokens:
+                sentence = text[span_start:span_end]
+                if sentence:
+                    yield Unit(sentence, separator, len(sentence_offsets), page_start, page_end, False)
+                    separator = " "
+                continue
+            # Over-long sentence: cut on token boundaries
+            for i in range(0, len(sentence_offsets), self.max_tokens):
+                window = sentence_offsets[i:i + self.max_tokens]
+                piece = text[window[0][0]:window[-1][1]]
+                yield Unit(piece, separator, len(window), page_start, page_end, False)
+                separator = " "
+    
+    def _encode(self, text: str, offsets: bool = False) -> Dict[str, Any]:
+        return self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=offsets,
+            truncation=False,
+            verbose=False
+        )
+    
+    def _blocks(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """Cut the page stream into paragraphs, tracking the pages each spans"""
+        pending = ""
+        marks: List[Tuple[int, Optional[int]]] = []  # (offset in pending, page)
+        scan_from = 0
+        
+        def page_at(position: int) -> Optional[int]:
+            index = max(0, bisect_right([offset for offset, _ in marks], position) - 1)
+            return marks[index][1] if marks else None
+        
+        def take(end: int, resume: int):
+            nonlocal pending, marks, scan_from
+            block = (pending[:end], page_at(0), page_at(max(0, end - 1)))
+            keep_from = max(0, bisect_right([offset for offset, _ in marks], resume) - 1)
+            marks = [(max(0, offset - resume), page) for offset, page in marks[keep_from:]]
+            pending = pending[resume:]
+            scan_from = 0
+            return block
+        
+        for page_number, segment in pages:
+            if not segment:
+                continue
+            marks.append((len(pending), page_number))
+            pending += segment
+            
+            while True:
+                # Resume at the last newline already seen, in case a break straddles segments
+                match = PARAGRAPH_BREAK_RE.search(pending, max(0, pending.rfind("\n", 0, scan_from)))
+                if match:
+                    block = take(match.start(), match.end())
+                elif len(pending) > self.MAX_PENDING_CHARS:
+                    cut = pending.rfind("\n", 0, self.MAX_PENDING_CHARS)
+                    if cut <= 0:
+                        cut = self.MAX_PENDING_CHARS
+                    block = take(cut, cut)
+                else:
+                    scan_from = len(pending)
+                    break
+                if block[0].strip():
+                    yield block
+        
+        if pending.strip():
+            yield pending, page_at(0), page_at(len(pending) - 1)
+
+
+class CharacterChunker:
+    """Fixed-size character windows aligned to sentence ends (the original chunker)"""
+    
+    name = "characters"
+    
+    def __init__(self, tokenizer: Any, max_tokens: int = 254, chunk_size: int = 1000, overlap: int = 200):
+        self.tokenizer = tokenizer
+        self.chunk_size = max(1, chunk_size)
+        self.overlap = max(0, min(overlap, self.chunk_size // 2))
+        self.stats = ChunkStats(max_tokens)
+    
+    def chunk(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Dict[str, Any]]:
+        for chunk in TextExtractor().chunk_pages(pages, self.chunk_size, self.overlap):
+            tokens = len(self.tokenizer(chunk["text"], add_special_tokens=False, verbose=False)["input_ids"])
+            self.stats.add(tokens)
+            yield {**chunk, "tokens": tokens, "section": None}
+
+
+CHUNKING_STRATEGIES = {
+    TokenChunker.name: TokenChunker,
+    CharacterChunker.name: CharacterChunker,
+}
+
+
+def create_chunker(strategy: str, tokenizer: Any, token_limit: int, options: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Build a chunker for an upload.
+    
+    token_limit is the embedding model's input limit; a requested
+    max_tokens above it is clamped so no chunk is silently truncated.
+    """
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{strategy}'. Available: {sorted(CHUNKING_STRATEGIES)}")
+    options = dict(options or {})
+    max_tokens = min(options.pop("max_tokens", None) or token_limit, token_limit)
+    return CHUNKING_STRATEGIES[strategy](tokenizer, max_tokens=max_tokens, **options)
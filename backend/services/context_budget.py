@@ -0,0 +1,314 @@
+import math
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import settings
+
+
+KB_HEADER = "=== KNOWLEDGE BASE CONTEXTS ===\n\n"
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+TRUNCATION_MARK = " …"
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 4000
+SENTENCE_END_RE = re.compile(r"[.!?\n]\s")
+
+
+def model_token_budget(model: str, override: Optional[Any] = None) -> int:
+    """Input token budget for a model: node override, CONTEXT_MODEL_BUDGETS, then the default"""
+    try:
+        if override:
+            return max(1, int(override))
+    except (TypeError, ValueError):
+        pass
+    for entry in settings.CONTEXT_MODEL_BUDGETS.split(","):
+        name, _, tokens = entry.partition("=")
+        if name.strip() == model and tokens.strip().isdigit():
+            return int(tokens)
+    return settings.CONTEXT_TOKEN_BUDGET
+
+
+def overlap_length(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is also a prefix of b"""
+    limit = min(len(a), len(b), MAX_OVERLAP_CHARS)
+    if limit < MIN_OVERLAP_CHARS:
+        return 0
+    probe = b[:MIN_OVERLAP_CHARS]
+    position = a.find(probe, len(a) - limit)
+    while position != -1:
+        if b.startswith(a[position:]):
+            return len(a) - position
+        position = a.find(probe, position + 1)
+    return 0
+
+
+class Candidate:
+    """One retrieved chunk competing for a place in the prompt"""
+    
+    def __init__(self, kb: int, rank: int, text: str, metadata: Dict[str, Any]):
+        self.kb = kb
+        self.rank = rank
+        self.text = text
+        self.metadata = metadata
+        self.included = text  # text that makes it into the prompt
+        self.truncated = False
+    
+    @property
+    def position(self) -> Optional[Tuple[str, int]]:
+        """(collection, chunk_index) when the chunk's place in its document is known"""
+        index = self.metadata.get("chunk_index")
+        if index is None:
+            return None
+        return self.metadata.get("collection_name") or "", int(index)
+    
+    def describe(self, filename: str, reason: str, tokens: int) -> Dict[str, Any]:
+        return {
+            "source": filename,
+            "chunk_index": self.metadata.get("chunk_index"),
+            "rank": self.rank + 1,
+            "tokens": tokens,
+            "reason": reason
+        }
+
+
+class PackedContext(NamedTuple):
+    kb_context: str
+    web_results: str
+    chat_history: List[Dict[str, Any]]
+    conversation_memory: str
+    report: Dict[str, Any]
+
+
+class ContextBudgetManager:
+    """
+    Assembles LLM prompt material into a fixed input token budget.
+    
+    The system prompt, query template and query are always sent. Chat
+    history (conversation memory, then turns newest first) and web results
+    are capped at a share of what remains; knowledge base chunks get the rest. Chunks are taken in
+    relevance order (rank 1 of every knowledge base, then rank 2, ...);
+    duplicates are skipped, the overlap between adjacent chunks of one
+    document is counted and sent once, and the first chunk that does not
+    fit is truncated and everything after it dropped. Tokens are
+    estimated from character counts, which is all prompt sizing needs.
+    """
+    
+    def __init__(
+        self,
+        token_budget: int,
+        history_share: Optional[float] = None,
+        web_share: Optional[float] = None,
+        chars_per_token: Optional[float] = None,
+        min_truncated_tokens: int = 48
+    ):
+        self.token_budget = max(1, token_budget)
+        self.history_share = settings.CONTEXT_HISTORY_SHARE if history_share is None else history_share
+        self.web_share = settings.CONTEXT_WEB_SHARE if web_share is None else web_share
+        self.chars_per_token = max(1.0, settings.CONTEXT_CHARS_PER_TOKEN if chars_per_token is None else chars_per_token)
+        self.min_truncated_tokens = min_truncated_tokens
+    
+    def count_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+    
+    def truncate(self, text: str, tokens: int) -> str:
+        """Cut text to about `tokens` tokens, at a sentence end when one is near"""
+        limit = max(0, int(tokens * self.chars_per_token) - len(TRUNCATION_MARK))
+        if len(text) <= limit:
+            return text
+        cut = text[:limit]
+        sentence_ends = [match.end() for match in SENTENCE_END_RE.finditer(cut)]
+        if sentence_ends and sentence_ends[-1] > limit // 2:
+            cut = cut[:sentence_ends[-1]]
+        elif " " in cut[limit // 2:]:
+            cut = cut[:cut.rindex(" ")]
+        return cut.rstrip() + TRUNCATION_MARK
+    
+    def pack(
+        self,
+        query: str,
+        kb_contexts: List[Dict[str, Any]],
+        web_results: str = "",
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        system_prompt: Optional[str] = None,
+        query_template: Optional[str] = None,
+        conversation_memory: str = ""
+    ) -> PackedContext:
+        chat_history = chat_history or []
+        fixed = sum(self.count_tokens(part or "") for part in (system_prompt, query_template, query))
+        available = max(0, self.token_budget - fixed)
+        dropped: List[Dict[str, Any]] = []
+        
+        # Summarized / recalled conversation memory comes out of the history share first
+        history_cap = int(available * self.history_share)
+        memory_tokens = self.count_tokens(conversation_memory)
+        if memory_tokens > history_cap:
+            dropped.append({"source": "conversation memory", "tokens": memory_tokens - history_cap, "reason": "truncated"})
+            conversation_memory = self.truncate(conversation_memory, history_cap) if history_cap >= self.min_truncated_tokens else ""
+            memory_tokens = self.count_tokens(conversation_memory)
+        history, history_tokens = self._pack_history(chat_history, history_cap - memory_tokens)
+        
+        web_tokens = self.count_tokens(web_results)
+        web_cap = int(available * self.web_share)
+        if web_tokens > web_cap:
+            dropped.append({"source": "web search", "tokens": web_tokens - web_cap, "reason": "truncated"})
+            web_results = self.truncate(web_results, web_cap) if web_cap >= self.min_truncated_tokens else ""
+            web_tokens = self.count_tokens(web_results)
+        
+        kb_context, kb_tokens, kb_stats = self._pack_knowledge(
+            kb_contexts, available - memory_tokens - history_tokens - web_tokens, dropped
+        )
+        
+        # Budget the knowledge bases left over goes to older history
+        if len(history) < len(chat_history):
+            history, history_tokens = self._pack_history(
+                chat_history, available - memory_tokens - web_tokens - kb_tokens
+            )
+        if len(history) < len(chat_history):
+            dropped.append({
+                "source": "chat history",
+                "messages": len(chat_history) - len(history),
+                "reason": "budget"
+            })
+        
+        used = fixed + memory_tokens + history_tokens + web_tokens + kb_tokens
+        report = {
+            "token_budget": self.token_budget,
+            "tokens_used": used,
+            "over_budget": used > self.token_budget,
+            "sections": {
+                "fixed": fixed,
+                "conversation_memory": memory_tokens,
+                "chat_history": history_tokens,
+                "web_results": web_tokens,
+                "knowledge_base": kb_tokens
+            },
+            "history_messages": f"{len(history)}/{len(chat_history)}",
+            **kb_stats,
+            "dropped": dropped
+        }
+        return PackedContext(kb_context, web_results, history, conversation_memory, report)
+    
+    def _pack_history(self, messages: List[Dict[str, Any]], cap: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Most recent messages that fit in cap, in conversation order"""
+        kept, used = 0, 0
+        for message in reversed(messages):
+            tokens = self.count_tokens(message.get("content", "")) + 2  # role label
+            if used + tokens > cap:
+                break
+            kept += 1
+            used += tokens
+        return messages[len(messages) - kept:], used
+    
+    def _pack_knowledge(
+        self,
+        kb_contexts: List[Dict[str, Any]],
+        budget: int,
+        dropped: List[Dict[str, Any]]
+    ) -> Tuple[str, int, Dict[str, Any]]:
+        filenames = [kb.get("filename", "Unknown") for kb in kb_contexts]
+        candidates = []
+        for kb_index, kb in enumerate(kb_contexts):
+            chunks = kb.get("chunks") or [{"text": kb.get("content", ""), "metadata": {}}]
+            for rank, chunk in enumerate(chunks):
+                if chunk.get("text"):
+                    candidates.append(Candidate(kb_index, rank, chunk["text"], chunk.get("metadata") or {}))
+        candidates.sort(key=lambda c: (c.rank, c.kb))
+        
+        selected: List[Candidate] = []
+        by_position: Dict[Tuple[int, str, int], Candidate] = {}
+        seen_texts: List[str] = []
+        opened = set()
+        used = self.count_tokens(KB_HEADER) if candidates else 0
+        duplicates = overlap_saved = 0
+        budget_hit = False
+        
+        for candidate in candidates:
+            filename = filenames[candidate.kb]
+            tokens = self.count_tokens(candidate.text)
+            normalized = " ".join(candidate.text.split())
+            if any(normalized in text for text in seen_texts):
+                duplicates += 1
+                dropped.append(candidate.describe(filename, "duplicate", tokens))
+                continue
+            if budget_hit:
+                dropped.append(candidate.describe(filename, "budget", tokens))
+                continue
+            
+            # Overlap with an already selected neighbour is sent only once
+            shared = 0
+            position = candidate.position
+            if position is not None:
+                previous = by_position.get((candidate.kb, position[0], position[1] - 1))
+                following = by_position.get((candidate.kb, position[0], position[1] + 1))
+                if previous:
+                    shared += overlap_length(previous.included, candidate.text)
+                if following:
+                    shared += overlap_length(candidate.text, following.included)
+            cost = self.count_tokens(candidate.text[shared:]) if shared < len(candidate.text) else 0
+            cost += self.count_tokens(PASSAGE_SEPARATOR)
+            if candidate.kb not in opened:
+                cost += self.count_tokens(f"--- Document {candidate.kb + 1}: {filename} ---\n")
+            
+            if used + cost > budget:
+                budget_hit = True
+                remaining = budget - (used + cost - tokens)
+                if remaining < self.min_truncated_tokens or shared:
+                    dropped.append(candidate.describe(filename, "budget", tokens))
+                    continue
+                candidate.included = self.truncate(candidate.text, remaining)
+                candidate.truncated = True
+                dropped.append(candidate.describe(filename, "truncated", tokens - self.count_tokens(candidate.included)))
+                cost = cost - tokens + self.count_tokens(candidate.included)
+            
+            used += cost
+            overlap_saved += shared
+            selected.append(candidate)
+            seen_texts.append(normalized)
+            opened.add(candidate.kb)
+            if position is not None and not candidate.truncated:
+                by_position[(candidate.kb, position[0], position[1])] = candidate
+        
+        stats = {
+            "kb_chunks": f"{len(selected)}/{len(candidates)}",
+            "kb_duplicates": duplicates,
+            "kb_overlap_chars_removed": overlap_saved
+        }
+        if not selected:
+            return "", 0, stats
+        context = KB_HEADER + "".join(
+            f"--- Document {kb_index + 1}: {filenames[kb_index]} ---\n"
+            + PASSAGE_SEPARATOR.join(self._passages([c for c in selected if c.kb == kb_index]))
+            + "\n\n"
+            for kb_index in sorted(opened)
+        )
+        return context, used, stats
+    
+    def _passages(self, selected: List[Candidate]) -> List[str]:
+        """
+        Join runs of adjacent chunks into single passages without the
+        repeated overlap; passages stay in relevance order.
+        """
+        by_position = {c.position: c for c in selected if c.position is not None}
+        passages = []
+        merged = set()
+        for candidate in selected:
+            if id(candidate) in merged:
+                continue
+            position = candidate.position
+            if position is None:
+                passages.append(candidate.included)
+                continue
+            collection, index = position
+            while (collection, index - 1) in by_position and id(by_position[(collection, index - 1)]) not in merged:
+                index -= 1
+            text = ""
+            while (collection, index) in by_position and id(by_position[(collection, index)]) not in merged:
+                part = by_position[(collection, index)]
+                merged.add(id(part))
+                shared = overlap_length(text, part.included) if text else 0
+                text = f"{text}\n{part.included[shared:]}" if text and not shared else text + part.included[shared:]
+                if part.truncated:
+                    break
+                index += 1
+            passages.append(text)
+        return passages
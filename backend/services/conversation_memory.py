@@ -0,0 +1,336 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+import re
+import threading
+import numpy as np
+
+from config import settings
+from database import SessionLocal
+from models.chat import ChatLog, ConversationSummary, ChatTurnEmbedding
+
+
+SUMMARY_MODES = ("extractive", "llm", "off")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+# Characters of a recalled turn put back into the prompt
+RECALL_CHARS = 800
+# Turns that aged out of the window but are not yet in the stored summary
+# (its refresh is still queued) are folded in on the fly, up to this many
+UNFOLDED_TURNS_MAX = 20
+
+
+class Turn(NamedTuple):
+    user: str
+    assistant: str
+
+
+class ConversationContext(NamedTuple):
+    """What a chat turn sends the LLM about the conversation so far"""
+    messages: List[Dict[str, str]]  # recent turns, verbatim
+    text: str  # rolling summary and recalled earlier turns ("" if none)
+    stats: Dict[str, Any]
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    match = SENTENCE_END_RE.search(text)
+    return _clip(text[:match.start()] if match else text, limit)
+
+
+def _turn_text(turn: Turn) -> str:
+    return f"User: {turn.user}\nAssistant: {turn.assistant}"
+
+
+def _to_turn(log: ChatLog) -> Turn:
+    return Turn(log.user_message or "", log.assistant_message or "")
+
+
+def _to_messages(turns: List[Turn]) -> List[Dict[str, str]]:
+    messages = []
+    for turn in turns:
+        messages.append({"role": "user", "content": turn.user})
+        messages.append({"role": "assistant", "content": turn.assistant})
+    return messages
+
+
+class ConversationMemory:
+    """
+    Bounded conversation memory for chat prompts.
+    
+    The last `history_turns` turns are sent verbatim. Older turns are
+    folded into a rolling summary per (user, workflow), stored in
+    conversation_summaries and updated incrementally in the background
+    after each saved turn, and the few older turns most similar to the
+    new query are recalled through the embedding service. Prompt size
+    therefore stays bounded however long the conversation gets.
+    """
+    
+    def __init__(
+        self,
+        embedding_service: Any,
+        history_turns: Optional[int] = None,
+        summary_mode: Optional[str] = None,
+        summary_max_chars: Optional[int] = None,
+        recall_turns: Optional[int] = None,
+        recall_min_score: Optional[float] = None,
+        recall_scan: Optional[int] = None
+    ):
+        self.embedding_service = embedding_service
+        self.history_turns = max(0, settings.CHAT_HISTORY_TURNS if history_turns is None else history_turns)
+        self.summary_mode = settings.CHAT_SUMMARY_MODE if summary_mode is None else summary_mode
+        if self.summary_mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode '{self.summary_mode}'. Available: {list(SUMMARY_MODES)}")
+        self.summary_max_chars = settings.CHAT_SUMMARY_MAX_CHARS if summary_max_chars is None else summary_max_chars
+        self.recall_turns = settings.CHAT_RECALL_TURNS if recall_turns is None else recall_turns
+        self.recall_min_score = settings.CHAT_RECALL_MIN_SCORE if recall_min_score is None else recall_min_score
+        self.recall_scan = settings.CHAT_RECALL_SCAN if recall_scan is None else recall_scan
+        
+        # One worker keeps refreshes of the same conversation in order
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-memory")
+        self._pending: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+    
+    def load(
+        self,
+        query: str,
+        user_id: Optional[int] = None,
+        workflow_id: Optional[int] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> ConversationContext:
+        """
+        Memory for the next turn. A client-sent history is windowed and its
+        older part summarized on the fly; without one, saved conversations
+        are read from the database.
+        """
+        if chat_history is None and user_id is not None and workflow_id is not None:
+            db = SessionLocal()
+            try:
+                return self._load_saved(db, query, user_id, workflow_id)
+            finally:
+                db.close()
+        return self._load_unsaved(chat_history or [])
+    
+    def _load_saved(self, db, query: str, user_id: int, workflow_id: int) -> ConversationContext:
+        conversation = (ChatLog.user_id == user_id, ChatLog.workflow_id == workflow_id)
+        recent = db.query(ChatLog).filter(*conversation).order_by(ChatLog.id.desc()).limit(self.history_turns).all()
+        recent.reverse()
+        stats: Dict[str, Any] = {"recent_turns": len(recent), "summarized_turns": 0, "recalled": []}
+        
+        # Anything older than the window?
+        cutoff = recent[0].id if recent else None
+        older = db.query(ChatLog.id).filter(*conversation)
+        if cutoff is not None:
+            older = older.filter(ChatLog.id < cutoff)
+        if older.first() is None:
+            return ConversationContext(_to_messages([_to_turn(log) for log in recent]), "", stats)
+        
+        summary = ""
+        if self.summary_mode != "off":
+            row = db.query(ConversationSummary).filter(
+                ConversationSummary.user_id == user_id,
+                ConversationSummary.workflow_id == workflow_id
+            ).first()
+            summary = row.summary if row else ""
+            stats["summarized_turns"] = row.turns_summarized if row else 0
+            unfolded = db.query(ChatLog).filter(*conversation, ChatLog.id > (row.last_chat_log_id if row else 0))
+            if cutoff is not None:
+                unfolded = unfolded.filter(ChatLog.id < cutoff)
+            unfolded = unfolded.order_by(ChatLog.id.desc()).limit(UNFOLDED_TURNS_MAX).all()
+            if unfolded:
+                summary = self.fold_extractive(summary, [_to_turn(log) for log in reversed(unfolded)])
+                stats["summarized_turns"] += len(unfolded)
+        
+        recalled: List[Turn] = []
+        if self.recall_turns > 0:
+            matches = self._recall(db, query, user_id, workflow_id, cutoff)
+            if matches:
+                logs = {log.id: log for log in db.query(ChatLog).filter(ChatLog.id.in_([m[0] for m in matches])).all()}
+                for chat_log_id, score in sorted(matches):
+                    if chat_log_id in logs:
+                        recalled.append(_to_turn(logs[chat_log_id]))
+                        stats["recalled"].append({"chat_log_id": chat_log_id, "score": round(score, 3)})
+        
+        return ConversationContext(
+            _to_messages([_to_turn(log) for log in recent]),
+            self._render(summary, recalled),
+            stats
+        )
+    
+    def _load_unsaved(self, messages: List[Dict[str, str]]) -> ConversationContext:
+        keep = 2 * self.history_turns
+        recent = messages[-keep:] if keep else []
+        older = messages[:len(messages) - len(recent)]
+        stats = {"recent_turns": len(recent) // 2, "summarized_turns": 0, "recalled": []}
+        if not older or self.summary_mode == "off":
+            return ConversationContext(recent, "", stats)
+        
+        turns: List[Turn] = []
+        for message in older:
+            if message.get("role") == "user" or not turns or turns[-1].assistant:
+                turns.append(Turn("", ""))
+            field = "user" if message.get("role") == "user" else "assistant"
+            turns[-1] = turns[-1]._replace(**{field: message.get("content", "")})
+        stats["summarized_turns"] = len(turns)
+        return ConversationContext(recent, self._render(self.fold_extractive("", turns), []), stats)
+    
+    def _recall(
+        self,
+        db,
+        query: str,
+        user_id: int,
+        workflow_id: int,
+        cutoff: Optional[int]
+    ) -> List[Tuple[int, float]]:
+        """(chat_log_id, cosine similarity) of the older turns closest to the query"""
+        rows = db.query(ChatTurnEmbedding.chat_log_id, ChatTurnEmbedding.vector).filter(
+            ChatTurnEmbedding.user_id == user_id,
+            ChatTurnEmbedding.workflow_id == workflow_id
+        )
+        if cutoff is not None:
+            rows = rows.filter(ChatTurnEmbedding.chat_log_id < cutoff)
+        rows = rows.order_by(ChatTurnEmbedding.chat_log_id.desc()).limit(self.recall_scan).all()
+        if not rows:
+            return []
+        
+        query_vector = np.asarray(self.embedding_service.generate_query_embedding(query), dtype=np.float32)
+        matrix = np.frombuffer(b"".join(row.vector for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        scores = matrix @ query_vector / (
+            np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0) + 1e-12
+        )
+        best = np.argsort(-scores, kind="stable")[:self.recall_turns]
+        return [(rows[i].chat_log_id, float(scores[i])) for i in best if scores[i] >= self.recall_min_score]
+    
+    def _render(self, summary: str, recalled: List[Turn]) -> str:
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if recalled:
+            exchanges = "\n".join(
+                f"User: {_clip(turn.user, RECALL_CHARS // 2)}\nAssistant: {_clip(turn.assistant, RECALL_CHARS)}"
+                for turn in recalled
+            )
+            parts.append(f"Relevant earlier exchanges:\n{exchanges}")
+        return "\n\n".join(parts)
+    
+    def fold_extractive(self, summary: str, turns: List[Turn]) -> str:
+        """Append one line per turn; the oldest lines fall off past summary_max_chars"""
+        lines = summary.splitlines() if summary else []
+        for turn in turns:
+            lines.append(f"- User: {_first_sentence(turn.user, 160)} / Assistant: {_first_sentence(turn.assistant, 240)}")
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_max_chars:
+            lines.pop(0)
+        return _clip(lines[0], self.summary_max_chars) if len(lines) == 1 else "\n".join(lines)
+    
+    def fold_llm(self, summary: str, turns: List[Turn], api_key: str) -> str:
+        """Rewrite the summary with Gemini to cover the new turns"""
+        from services.llm import LLMService
+        
+        llm = LLMService(api_key, settings.CHAT_SUMMARY_MODEL)
+        exchanges = "\n\n".join(_turn_text(turn) for turn in turns)
+        prompt = (
+            "Update the running summary of a conversation with the new exchanges below. "
+            "Keep names, numbers, decisions and open questions; drop pleasantries. "
+            f"Reply with the summary only, at most {self.summary_max_chars} characters.\n\n"
+            f"Current summary:\n{summary or '(empty)'}\n\nNew exchanges:\n{exchanges}"
+        )
+        text = llm.generate_response(query=prompt, temperature=0.2).strip()
+        return text[:self.summary_max_chars]
+    
+    def schedule_refresh(self, user_id: int, workflow_id: int, api_key: Optional[str] = None):
+        """Queue a background refresh; a refresh already queued for the conversation covers this one"""
+        key = (user_id, workflow_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        try:
+            self._pool.submit(self._refresh_job, user_id, workflow_id, api_key)
+        except RuntimeError:
+            # Pool shut down (application stopping)
+            with self._lock:
+                self._pending.discard(key)
+    
+    def _refresh_job(self, user_id: int, workflow_id: int, api_key: Optional[str]):
+        with self._lock:
+            self._pending.discard((user_id, workflow_id))
+        try:
+            self.refresh(user_id, workflow_id, api_key)
+        except Exception as e:
+            print(f"Conversation memory refresh failed for workflow {workflow_id}: {e}")
+    
+    def refresh(self, user_id: int, workflow_id: int, api_key: Optional[str] = None):
+        """Fold turns that left the window into the summary and embed new turns"""
+        db = SessionLocal()
+        try:
+            conversation = (ChatLog.user_id == user_id, ChatLog.workflow_id == workflow_id)
+            window = db.query(ChatLog.id).filter(*conversation).order_by(ChatLog.id.desc()).limit(self.history_turns).all()
+            cutoff = None
+            if self.history_turns:
+                cutoff = window[-1].id if len(window) == self.history_turns else 0
+            
+            if self.summary_mode != "off" and cutoff != 0:
+                row = db.query(ConversationSummary).filter(
+                    ConversationSummary.user_id == user_id,
+                    ConversationSummary.workflow_id == workflow_id
+                ).first()
+                if row is None:
+                    row = ConversationSummary(user_id=user_id, workflow_id=workflow_id, summary="", last_chat_log_id=0, turns_summarized=0)
+                    db.add(row)
+                aged_out = db.query(ChatLog).filter(*conversation, ChatLog.id > row.last_chat_log_id)
+                if cutoff is not None:
+                    aged_out = aged_out.filter(ChatLog.id < cutoff)
+                aged_out = aged_out.order_by(ChatLog.id).all()
+                if aged_out:
+                    turns = [_to_turn(log) for log in aged_out]
+                    summary = None
+                    if self.summary_mode == "llm" and api_key:
+                        try:
+                            summary = self.fold_llm(row.summary, turns, api_key)
+                        except Exception as e:
+                            print(f"LLM summary failed, using extractive summary: {e}")
+                    row.summary = summary or self.fold_extractive(row.summary, turns)
+                    row.last_chat_log_id = aged_out[-1].id
+                    row.turns_summarized += len(aged_out)
+            
+            if self.recall_turns > 0:
+                # Embed every turn (recent ones too) so it is ready once it ages out
+                missing = db.query(ChatLog).outerjoin(
+                    ChatTurnEmbedding, ChatTurnEmbedding.chat_log_id == ChatLog.id
+                ).filter(*conversation, ChatTurnEmbedding.chat_log_id.is_(None)).order_by(
+                    ChatLog.id.desc()
+                ).limit(self.recall_scan).all()
+                if missing:
+                    vectors = self.embedding_service.generate_embeddings(
+                        [_turn_text(_to_turn(log)) for log in missing]
+                    )
+                    for log, vector in zip(missing, vectors):
+                        db.add(ChatTurnEmbedding(
+                            chat_log_id=log.id,
+                            user_id=user_id,
+                            workflow_id=workflow_id,
+                            vector=np.asarray(vector, dtype=np.float32).tobytes()
+                        ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def clear(self, db, user_id: int, workflow_id: int):
+        """Drop the summary and turn embeddings of a conversation (caller commits)"""
+        db.query(ChatTurnEmbedding).filter(
+            ChatTurnEmbedding.user_id == user_id,
+            ChatTurnEmbedding.workflow_id == workflow_id
+        ).delete(synchronize_session=False)
+        db.query(ConversationSummary).filter(
+            ConversationSummary.user_id == user_id,
+            ConversationSummary.workflow_id == workflow_id
+        ).delete(synchronize_session=False)
+    
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
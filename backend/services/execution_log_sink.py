@@ -0,0 +1,232 @@
+import io
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.execution_log import ExecutionLog
+
+
+COLUMNS = ("execution_id", "workflow_id", "step_name", "status", "message", "log_metadata")
+
+
+class ExecutionLogSink:
+    """
+    Bulk writer for ExecutionLog rows.
+    
+    Rows are inserted with one multi-row statement per batch (COPY on
+    PostgreSQL) instead of one ORM object per entry. When buffered, entries
+    from many executions are queued in memory and a background thread writes
+    them every `batch_size` rows or `flush_interval_ms`, whichever comes
+    first, so requests do not wait on the insert. If the buffer is full the
+    caller writes its own rows in its transaction instead. A batch that
+    fails to insert is retried once and then written row by row, so only
+    rows that cannot be inserted at all are dropped.
+    """
+    
+    def __init__(
+        self,
+        buffered: bool = True,
+        batch_size: int = 500,
+        flush_interval_ms: float = 1000,
+        max_buffer: int = 10000,
+        use_copy: bool = True,
+        session_factory: Callable[[], Session] = SessionLocal
+    ):
+        self.buffered = buffered
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.use_copy = use_copy
+        self.session_factory = session_factory
+        self._rows: List[Dict[str, Any]] = []
+        self._first_at = 0.0
+        self._in_flight = 0
+        self._flush_waiters = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._counts = {
+            "buffered_rows": 0,
+            "direct_rows": 0,
+            "written_rows": 0,
+            "dropped_rows": 0,
+            "flushes": 0,
+            "retries": 0,
+            "overflows": 0
+        }
+        self._last_flush_ms: Optional[float] = None
+        self._worker: Optional[threading.Thread] = None
+        if buffered:
+            self._worker = threading.Thread(target=self._run, name="execution-log-sink", daemon=True)
+            self._worker.start()
+    
+    @staticmethod
+    def rows(execution_id: str, workflow_id: Optional[int], logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "execution_id": execution_id,
+                "workflow_id": workflow_id,
+                "step_name": log["step_name"],
+                "status": log["status"],
+                "message": log["message"],
+                "log_metadata": log.get("metadata")
+            }
+            for log in logs
+        ]
+    
+    def write(self, db: Session, execution_id: str, workflow_id: Optional[int], logs: List[Dict[str, Any]]):
+        """
+        Persist the log entries of one execution. Buffered entries return
+        immediately; otherwise they are added to `db`'s transaction and the
+        caller commits.
+        """
+        rows = self.rows(execution_id, workflow_id, logs)
+        if not rows:
+            return
+        if self.buffered:
+            with self._cond:
+                if not self._stopped and len(self._rows) + len(rows) <= self.max_buffer:
+                    if not self._rows:
+                        self._first_at = time.monotonic()
+                    self._rows.extend(rows)
+                    self._counts["buffered_rows"] += len(rows)
+                    self._cond.notify_all()
+                    return
+                if not self._stopped:
+                    self._counts["overflows"] += 1
+        self.insert(db, rows)
+        with self._cond:
+            self._counts["direct_rows"] += len(rows)
+    
+    def insert(self, db: Session, rows: List[Dict[str, Any]]):
+        """Add rows to the session's transaction in one round trip"""
+        connection = db.connection()
+        if self.use_copy and connection.dialect.name == "postgresql":
+            cursor = connection.connection.cursor()
+            try:
+                if hasattr(cursor, "copy_expert"):
+                    cursor.copy_expert(
+                        f"COPY {ExecutionLog.__tablename__} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                        self._csv(rows)
+                    )
+                    return
+            finally:
+                cursor.close()
+        # executemany; SQLAlchemy batches it into multi-row INSERTs
+        db.execute(insert(ExecutionLog.__table__), rows)
+    
+    @staticmethod
+    def _csv(rows: List[Dict[str, Any]]) -> io.StringIO:
+        # Strings are always quoted and None left bare, which COPY reads as NULL
+        def field(value: Any) -> str:
+            if value is None:
+                return ""
+            if isinstance(value, int):
+                return str(value)
+            return '"' + str(value).replace('"', '""') + '"'
+        
+        buffer = io.StringIO()
+        for row in rows:
+            metadata = row["log_metadata"]
+            values = [row[column] for column in COLUMNS[:-1]]
+            values.append(None if metadata is None else json.dumps(metadata, default=str))
+            buffer.write(",".join(field(value) for value in values) + "\n")
+        buffer.seek(0)
+        return buffer
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._rows and not self._stopped:
+                    self._cond.wait()
+                if not self._rows:
+                    return
+                deadline = self._first_at + self.flush_interval
+                while len(self._rows) < self.batch_size and not self._stopped and not self._flush_waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._rows[:self.batch_size]
+                del self._rows[:self.batch_size]
+                self._first_at = time.monotonic()
+                self._in_flight = len(batch)
+            self._flush(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+    
+    def _flush(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        written = self._write(batch)
+        if written is None:
+            # Lost connections and lock timeouts usually pass on a second try
+            with self._cond:
+                self._counts["retries"] += 1
+            written = self._write(batch)
+        if written is None:
+            # One bad row fails the whole statement; write the rows one by
+            # one so only the rows that still fail are lost
+            written = sum(self._write([row], report=False) or 0 for row in batch)
+        dropped = len(batch) - written
+        if dropped:
+            print(f"Execution log flush failed, {dropped} of {len(batch)} rows dropped")
+        with self._cond:
+            self._counts["flushes"] += 1
+            self._counts["written_rows"] += written
+            self._counts["dropped_rows"] += dropped
+            self._last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+    
+    def _write(self, rows: List[Dict[str, Any]], report: bool = True) -> Optional[int]:
+        """Insert and commit rows in a session of their own; None if that failed"""
+        db = self.session_factory()
+        try:
+            self.insert(db, rows)
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            if report:
+                print(f"Execution log write of {len(rows)} rows failed: {e}")
+            return None
+        finally:
+            db.close()
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write everything buffered so far; False if it did not finish within timeout"""
+        if self._worker is None:
+            return True
+        with self._cond:
+            if not self._rows and not self._in_flight:
+                return True
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._rows and not self._in_flight, timeout)
+            finally:
+                self._flush_waiters -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "buffered": self.buffered,
+                "batch_size": self.batch_size,
+                "flush_interval_ms": self.flush_interval * 1000,
+                "max_buffer": self.max_buffer,
+                "pending_rows": len(self._rows) + self._in_flight,
+                "last_flush_ms": self._last_flush_ms,
+                **self._counts
+            }
+    
+    def shutdown(self, timeout: float = 10.0):
+        """Write the remaining rows and stop the background thread"""
+        if self._worker is None:
+            return
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._worker.join(timeout=timeout)
@@ -1,6 +1,7 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
+import threading
 import time
 
 
@@ -21,33 +22,78 @@ class ExecutionLogger:
     """
     Collects structured logs during workflow execution.
     Logs are collected in-memory and returned at the end of execution.
+    An optional listener receives every entry (and any other event passed
+    to emit) as it happens, e.g. to stream progress to the client.
     """
     
-    def __init__(self, execution_id: str, workflow_id: Optional[int] = None):
+    def __init__(
+        self,
+        execution_id: str,
+        workflow_id: Optional[int] = None,
+        listener: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ):
         self.execution_id = execution_id
         self.workflow_id = workflow_id
+        self.listener = listener
         self.logs: List[LogEntry] = []
         self._step_start_times: Dict[str, float] = {}
+        # Nodes of one workflow may log from several threads at once
+        self._lock = threading.Lock()
     
-    def start_step(self, step_name: str, message: str = "", metadata: Optional[Dict] = None):
-        """Log the start of a workflow step"""
-        self._step_start_times[step_name] = time.time()
+    def emit(self, event: str, data: Dict[str, Any]):
+        """Forward a live event to the listener, if any"""
+        if self.listener:
+            try:
+                self.listener(event, data)
+            except Exception as e:
+                print(f"[LOG] listener error: {e}")
+    
+    def _append(self, entry: LogEntry):
+        with self._lock:
+            self.logs.append(entry)
+        self.emit("log", entry.to_dict())
+    
+    def _elapsed_ms(self, step_key: str) -> Optional[int]:
+        """Pop the start time of a step and return its duration"""
+        with self._lock:
+            started = self._step_start_times.pop(step_key, None)
+        if started is None:
+            return None
+        return int((time.time() - started) * 1000)
+    
+    def start_step(
+        self,
+        step_name: str,
+        message: str = "",
+        metadata: Optional[Dict] = None,
+        step_id: Optional[str] = None
+    ):
+        """
+        Log the start of a workflow step.
+        step_id distinguishes concurrent steps sharing a name (e.g. one per
+        node) so their durations are timed separately.
+        """
+        with self._lock:
+            self._step_start_times[step_id or step_name] = time.time()
         entry = LogEntry(
             step_name=step_name,
             status="started",
             message=message or f"Starting {step_name}",
             metadata=metadata or {}
         )
-        self.logs.append(entry)
+        self._append(entry)
         print(f"[LOG] {step_name}: started - {entry.message}")
     
-    def complete_step(self, step_name: str, message: str = "", metadata: Optional[Dict] = None):
+    def complete_step(
+        self,
+        step_name: str,
+        message: str = "",
+        metadata: Optional[Dict] = None,
+        step_id: Optional[str] = None
+    ):
         """Log the successful completion of a workflow step"""
         # Calculate duration if we have a start time
-        duration_ms = None
-        if step_name in self._step_start_times:
-            duration_ms = int((time.time() - self._step_start_times[step_name]) * 1000)
-            del self._step_start_times[step_name]
+        duration_ms = self._elapsed_ms(step_id or step_name)
         
         meta = metadata or {}
         if duration_ms is not None:
@@ -59,16 +105,19 @@ class ExecutionLogger:
             message=message or f"Completed {step_name}",
             metadata=meta
         )
-        self.logs.append(entry)
+        self._append(entry)
         print(f"[LOG] {step_name}: completed - {entry.message} ({duration_ms}ms)")
     
-    def error_step(self, step_name: str, error_message: str, metadata: Optional[Dict] = None):
+    def error_step(
+        self,
+        step_name: str,
+        error_message: str,
+        metadata: Optional[Dict] = None,
+        step_id: Optional[str] = None
+    ):
         """Log an error in a workflow step"""
         # Calculate duration if we have a start time
-        duration_ms = None
-        if step_name in self._step_start_times:
-            duration_ms = int((time.time() - self._step_start_times[step_name]) * 1000)
-            del self._step_start_times[step_name]
+        duration_ms = self._elapsed_ms(step_id or step_name)
         
         meta = metadata or {}
         if duration_ms is not None:
@@ -80,7 +129,7 @@ class ExecutionLogger:
             message=error_message,
             metadata=meta
         )
-        self.logs.append(entry)
+        self._append(entry)
         print(f"[LOG] {step_name}: ERROR - {error_message}")
     
     def info(self, step_name: str, message: str, metadata: Optional[Dict] = None):
@@ -91,9 +140,16 @@ class ExecutionLogger:
             message=message,
             metadata=metadata or {}
         )
-        self.logs.append(entry)
+        self._append(entry)
         print(f"[LOG] {step_name}: info - {message}")
     
+    def timings(self, step_name: str, timings_ms: Dict[str, float], metadata: Optional[Dict] = None):
+        """Log the per-stage durations of a step as one entry"""
+        rounded = {stage: round(ms, 1) for stage, ms in timings_ms.items()}
+        message = "Stage timings: " + ", ".join(f"{stage} {ms:g}ms" for stage, ms in rounded.items())
+        self.info(step_name, message, {**(metadata or {}), "timings_ms": rounded})
+    
     def get_logs(self) -> List[Dict[str, Any]]:
         """Get all logs as a list of dictionaries"""
-        return [log.to_dict() for log in self.logs]
+        with self._lock:
+            return [log.to_dict() for log in self.logs]
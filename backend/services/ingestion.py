@@ -0,0 +1,370 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+from config import settings
+from database import SessionLocal
+from models.document import Document
+from models.ingestion_job import IngestionJob
+from services.text_extractor import TextExtractor
+from services.chunking import create_chunker
+from services.chunk_store import ChunkEmbeddingStore
+
+
+# Pipeline stages in order; a job's last_completed_stage tells a retry where to resume
+STAGES = ("extracting", "embedding", "indexing")
+TERMINAL_STATUSES = ("ready", "failed")
+
+# Characters of extracted text stored on the Document row
+PREVIEW_CHARS = 5000
+
+
+def file_referenced(db, file_path: str) -> bool:
+    """Whether a document or an unfinished job uses a content-addressed upload"""
+    document_ref = db.query(Document.id).filter(Document.file_path == file_path).first()
+    job_ref = db.query(IngestionJob.id).filter(
+        IngestionJob.file_path == file_path,
+        IngestionJob.status.notin_(TERMINAL_STATUSES)
+    ).first()
+    return bool(document_ref or job_ref)
+
+
+def remove_unreferenced_file(db, file_path: str):
+    """
+    Remove a content-addressed upload once no document or unfinished job
+    uses it. Failed jobs do not count, so they do not pin their file.
+    
+    An upload reuses an existing file only after committing the job that
+    references it, so the file is moved aside and the references checked
+    again before it is deleted; if one appeared it is moved back. Callers
+    must have committed their changes.
+    """
+    if not file_path or file_referenced(db, file_path):
+        return
+    removing = f"{file_path}.{os.getpid()}.{threading.get_ident()}.removing"
+    try:
+        os.replace(file_path, removing)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"Could not remove {file_path}: {e}")
+        return
+    # End the read transaction so the second check sees newer commits
+    db.commit()
+    try:
+        if file_referenced(db, file_path):
+            # Same content as any copy placed meanwhile, so replacing is safe
+            os.replace(removing, file_path)
+        else:
+            os.remove(removing)
+    except OSError as e:
+        print(f"Could not remove {file_path}: {e}")
+
+
+class IngestionPipeline:
+    """
+    Background document ingestion: extract -> embed -> index.
+    
+    Each stage has its own worker pool, so different uploads overlap
+    (one is extracted while another is embedded). Stage outputs are written
+    to a per-job work directory, which lets a failed or interrupted job
+    resume from the last completed stage instead of starting over.
+    """
+    
+    def __init__(
+        self,
+        embedding_service: Any,
+        vector_store: Any,
+        lexical_index: Any = None,
+        response_cache: Any = None,
+        extract_workers: int = 2,
+        embed_workers: int = 1,
+        index_workers: int = 1,
+        embed_batch_size: int = 64,
+        reuse_embeddings: bool = True
+    ):
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.response_cache = response_cache
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.chunk_store = ChunkEmbeddingStore(max_entries=settings.CHUNK_EMBEDDING_STORE_MAX_ENTRIES) if reuse_embeddings else None
+        self._pools = {
+            "extracting": ThreadPoolExecutor(max(1, extract_workers), thread_name_prefix="ingest-extract"),
+            "embedding": ThreadPoolExecutor(max(1, embed_workers), thread_name_prefix="ingest-embed"),
+            "indexing": ThreadPoolExecutor(max(1, index_workers), thread_name_prefix="ingest-index"),
+        }
+        self._handlers = {
+            "extracting": self._extract,
+            "embedding": self._embed,
+            "indexing": self._index,
+        }
+    
+    @staticmethod
+    def work_dir(job_id: str) -> str:
+        return os.path.join(settings.UPLOAD_DIR, "jobs", job_id)
+    
+    def submit(self, job_id: str):
+        """Queue a job at the stage after its last completed one"""
+        db = SessionLocal()
+        try:
+            job = db.get(IngestionJob, job_id)
+            if job is None or job.status == "ready":
+                return
+            stage = self._next_stage(job.last_completed_stage)
+            job.status = "queued"
+            job.error = None
+            job.attempts = (job.attempts or 0) + 1
+            db.commit()
+        finally:
+            db.close()
+        self._pools[stage].submit(self._run_stage, job_id, stage)
+    
+    def resume_pending(self) -> int:
+        """Re-queue jobs interrupted by a restart; returns how many"""
+        db = SessionLocal()
+        try:
+            job_ids = [
+                job.id for job in db.query(IngestionJob).filter(
+                    IngestionJob.status.notin_(TERMINAL_STATUSES)
+                ).all()
+            ]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+    
+    @staticmethod
+    def _next_stage(last_completed: Optional[str]) -> str:
+        if last_completed not in STAGES:
+            return STAGES[0]
+        return STAGES[min(STAGES.index(last_completed) + 1, len(STAGES) - 1)]
+    
+    def _run_stage(self, job_id: str, stage: str):
+        db = SessionLocal()
+        try:
+            job = db.get(IngestionJob, job_id)
+            if job is None:
+                return
+            job.status = stage
+            db.commit()
+            
+            after_commit = self._handlers[stage](job, db)
+            
+            job.last_completed_stage = stage
+            if stage == STAGES[-1]:
+                job.status = "ready"
+            db.commit()
+            if after_commit is not None:
+                after_commit()
+            print(f"[INGEST] {job_id}: {stage} completed")
+            
+            if stage != STAGES[-1]:
+                next_stage = STAGES[STAGES.index(stage) + 1]
+                self._pools[next_stage].submit(self._run_stage, job_id, next_stage)
+        except Exception as e:
+            db.rollback()
+            job = db.get(IngestionJob, job_id)
+            if job is not None:
+                if stage == "indexing" and job.target_document_id is None and job.document_id is None:
+                    self._discard_index(job)
+                job.status = "failed"
+                job.error = f"{stage}: {str(e)}"
+                db.commit()
+                # A failed job no longer holds on to its upload
+                remove_unreferenced_file(db, job.file_path)
+            print(f"[INGEST] {job_id}: {stage} failed - {e}")
+        finally:
+            db.close()
+    
+    def _extract(self, job: IngestionJob, db):
+        extractor = TextExtractor()
+        chunking = dict(job.chunking or {})
+        chunker = create_chunker(
+            chunking.pop("strategy", settings.CHUNKING_STRATEGY),
+            self.embedding_service.tokenizer,
+            self.embedding_service.max_input_tokens,
+            chunking
+        )
+        chunks, pages, sections = [], [], []
+        preview_parts, preview_length = [], 0
+        
+        def tee(stream):
+            # Keep the first few thousand characters as the document preview
+            nonlocal preview_length
+            for page_number, segment in stream:
+                if preview_length < PREVIEW_CHARS:
+                    preview_parts.append(segment[:PREVIEW_CHARS - preview_length])
+                    preview_length += len(preview_parts[-1])
+                yield page_number, segment
+        
+        for chunk in chunker.chunk(tee(extractor.iter_pages(job.file_path))):
+            chunks.append(chunk["text"])
+            pages.append([chunk["page_start"], chunk["page_end"]])
+            sections.append(chunk["section"])
+        if not chunks:
+            raise ValueError("No text could be extracted from the document")
+        
+        self._write_json(job.id, "chunks.json", {
+            "chunks": chunks,
+            "pages": pages,
+            "sections": sections,
+            "preview": "".join(preview_parts)
+        })
+        job.chunks_total = len(chunks)
+        job.chunks_embedded = 0
+        job.chunk_stats = chunker.stats.to_dict()
+        print(f"[INGEST] {job.id}: {chunker.name} chunking -> {job.chunk_stats}")
+    
+    def _embed(self, job: IngestionJob, db):
+        """
+        Embed the job's chunks, reusing vectors from the content-hash index.
+        
+        Only chunk texts never seen before (by any upload) are encoded;
+        duplicates within the document are encoded once.
+        """
+        chunks = self._read_json(job.id, "chunks.json")["chunks"]
+        keys = [self.embedding_service.content_key(chunk) for chunk in chunks]
+        vectors = self.chunk_store.lookup(keys) if self.chunk_store is not None else {}
+        job.chunks_reused = sum(1 for key in keys if key in vectors)
+        job.chunks_embedded = job.chunks_reused
+        db.commit()
+        
+        # First occurrence of each key that still needs encoding
+        missing = {}
+        for key, chunk in zip(keys, chunks):
+            if key not in vectors and key not in missing:
+                missing[key] = chunk
+        missing_keys = list(missing)
+        
+        for start in range(0, len(missing_keys), self.embed_batch_size):
+            batch = missing_keys[start:start + self.embed_batch_size]
+            encoded = self.embedding_service.generate_embeddings([missing[key] for key in batch])
+            new_vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(batch, encoded)}
+            vectors.update(new_vectors)
+            if self.chunk_store is not None:
+                self.chunk_store.save(new_vectors)
+            job.chunks_embedded = sum(1 for key in keys if key in vectors)
+            db.commit()  # progress
+        
+        job.chunks_reused = len(chunks) - len(missing_keys)
+        if self.chunk_store is not None and missing_keys:
+            removed = self.chunk_store.prune()
+            if removed:
+                print(f"[INGEST] {job.id}: pruned {removed} least recently used stored embeddings")
+        np.save(
+            os.path.join(self.work_dir(job.id), "embeddings.npy"),
+            np.asarray([vectors[key] for key in keys], dtype=np.float32)
+        )
+    
+    def _index(self, job: IngestionJob, db):
+        """Sync the vector and BM25 indexes and create or update the Document row"""
+        data = self._read_json(job.id, "chunks.json")
+        chunks = data["chunks"]
+        embeddings = np.load(os.path.join(self.work_dir(job.id), "embeddings.npy"))
+        
+        # An update must not resurrect a document deleted while it was
+        # queued; the row stays locked until the commit, so a delete cannot
+        # slip in between
+        updating = job.target_document_id is not None or job.document_id is not None
+        document = None
+        if updating:
+            document = db.query(Document).filter(
+                Document.id == (job.target_document_id or job.document_id)
+            ).with_for_update().first()
+            if document is None:
+                raise ValueError("Document was deleted during the update")
+        
+        # Diff against whatever is stored (a previous version of the document or
+        # a partial earlier attempt), so unchanged chunks are left alone
+        metadatas = self._chunk_metadatas(job, data)
+        job.chunk_diff = self.vector_store.sync_chunks(
+            collection_name=job.collection_name,
+            texts=chunks,
+            embeddings=embeddings.tolist(),
+            metadatas=metadatas,
+            user_id=job.user_id
+        )
+        print(f"[INGEST] {job.id}: index diff {job.chunk_diff}")
+        if self.lexical_index is not None:
+            self.lexical_index.build(job.collection_name, chunks, metadatas, user_id=job.user_id)
+        
+        work_dir = self.work_dir(job.id)
+        previous_path = None
+        if document is None:
+            document = Document(
+                user_id=job.user_id,
+                filename=job.filename,
+                file_path=job.file_path,
+                content=data.get("preview", ""),
+                collection_name=job.collection_name
+            )
+            db.add(document)
+            db.flush()
+            job.document_id = document.id
+        else:
+            # Update of an existing document: same row, same collection name
+            previous_path = document.file_path
+            document.filename = job.filename
+            document.file_path = job.file_path
+            document.content = data.get("preview", "")
+        
+        def after_commit():
+            # Intermediate files stay until the commit succeeds so a failed
+            # commit can still be resumed
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if updating:
+                # Cached answers used the old version; the old file may only
+                # go once the new version is committed
+                if self.response_cache is not None:
+                    self.response_cache.invalidate_collection(job.collection_name)
+                if previous_path and previous_path != job.file_path:
+                    remove_unreferenced_file(db, previous_path)
+        return after_commit
+    
+    def _discard_index(self, job: IngestionJob):
+        """
+        Remove the chunks a new upload wrote before its indexing failed, so
+        no orphaned vectors or keyword entries are left behind. A retry
+        re-adds them from the stored embeddings. Updates keep theirs: the
+        collection still serves the current version of the document.
+        """
+        self.vector_store.delete_collection(job.collection_name, user_id=job.user_id)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(job.collection_name)
+    
+    def _chunk_metadatas(self, job: IngestionJob, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Per-chunk metadata, including page numbers and section headings when known"""
+        pages = data.get("pages") or [[None, None]] * len(data["chunks"])
+        sections = data.get("sections") or [None] * len(data["chunks"])
+        keys = [self.embedding_service.content_key(chunk) for chunk in data["chunks"]]
+        metadatas = []
+        for i, ((page_start, page_end), section) in enumerate(zip(pages, sections)):
+            meta = {"chunk_index": i, "filename": job.filename, "content_hash": keys[i]}
+            if page_start is not None:
+                meta["page_start"] = page_start
+                meta["page_end"] = page_end
+            if section:
+                meta["section"] = section
+            metadatas.append(meta)
+        return metadatas
+    
+    def _write_json(self, job_id: str, name: str, payload: Dict[str, Any]):
+        directory = self.work_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+    
+    def _read_json(self, job_id: str, name: str) -> Dict[str, Any]:
+        with open(os.path.join(self.work_dir(job_id), name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def shutdown(self, wait: bool = False):
+        """Stop the stage pools; unfinished jobs resume on next startup"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,230 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+# Words, plus compound identifiers such as ERR-404, v1.2.3, foo_bar or a/b
+TOKEN_RE = re.compile(r"\w+(?:[-.:/]\w+)*")
+COMPOUND_SPLIT_RE = re.compile(r"[-.:/_]")
+# Collection names become directory names
+SAFE_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by part"""
+    terms = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        if not term.isalnum():
+            terms.extend(part for part in COMPOUND_SPLIT_RE.split(term) if part)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked lists: score(d) = sum over lists of 1 / (k + rank of d)"""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Read-only BM25 index over one document's chunks.
+    
+    Postings are stored as flat arrays (term offsets, chunk ids, term
+    frequencies) and chunk texts as one UTF-8 blob; all of them are
+    memory-mapped, so opening an index is cheap and pages are loaded on
+    demand.
+    """
+    
+    FILES = ("term_offsets.npy", "postings.npy", "frequencies.npy", "lengths.npy", "text_offsets.npy")
+    
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.user_id: Optional[int] = meta.get("user_id")
+        self.metadatas: List[Dict[str, Any]] = meta["metadatas"]
+        self.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        self.term_offsets, self.postings, self.frequencies, self.lengths, self.text_offsets = (
+            np.load(os.path.join(path, name), mmap_mode="r") for name in self.FILES
+        )
+        self.texts = np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r") \
+            if self.text_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        self.count = len(self.lengths)
+        self.average_length = float(self.lengths.mean()) if self.count else 0.0
+    
+    @staticmethod
+    def write(path: str, texts: List[str], metadatas: List[Dict[str, Any]], user_id: Optional[int] = None):
+        """Build the index files for a list of chunk texts into path"""
+        os.makedirs(path, exist_ok=True)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for chunk_id, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths[chunk_id] = len(terms)
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((chunk_id, frequency))
+        
+        terms = sorted(postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            term_offsets[i + 1] = term_offsets[i] + len(postings[term])
+        flat = [entry for term in terms for entry in postings[term]]
+        chunk_ids = np.fromiter((entry[0] for entry in flat), dtype=np.int32, count=len(flat))
+        frequencies = np.fromiter((entry[1] for entry in flat), dtype=np.int32, count=len(flat))
+        
+        encoded = [text.encode("utf-8") for text in texts]
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(data) for data in encoded]) if encoded else []
+        with open(os.path.join(path, "texts.bin"), "wb") as f:
+            for data in encoded:
+                f.write(data)
+        
+        for name, array in zip(BM25Index.FILES, (term_offsets, chunk_ids, frequencies, lengths, text_offsets)):
+            np.save(os.path.join(path, name), array)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"user_id": user_id, "terms": terms, "metadatas": metadatas}, f)
+    
+    def search(self, query: str, n_results: int) -> List[Tuple[int, float]]:
+        """Return up to n_results (chunk_id, score) pairs, best first"""
+        if not self.count:
+            return []
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+            chunk_ids = self.postings[start:end]
+            frequencies = self.frequencies[start:end].astype(np.float32)
+            document_frequency = end - start
+            idf = math.log(1 + (self.count - document_frequency + 0.5) / (document_frequency + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_ids] / (self.average_length or 1.0))
+            # A term lists each chunk once, so fancy-index accumulation is safe
+            scores[chunk_ids] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(chunk_id), float(scores[chunk_id])) for chunk_id in ranked]
+    
+    def text(self, chunk_id: int) -> str:
+        start, end = int(self.text_offsets[chunk_id]), int(self.text_offsets[chunk_id + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+
+class LexicalIndexStore:
+    """
+    On-disk BM25 indexes, one per logical collection (doc_<uuid>).
+    
+    Indexes are rebuilt whole at ingestion time (a document's chunks only,
+    so this is cheap next to embedding) and swapped in atomically; opened
+    indexes are kept in a small LRU.
+    """
+    
+    def __init__(self, base_dir: str, cache_size: int = 64):
+        self.base_dir = base_dir
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(base_dir, exist_ok=True)
+    
+    def _path(self, collection_name: str) -> str:
+        if not SAFE_NAME_RE.match(collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        return os.path.join(self.base_dir, collection_name)
+    
+    def build(
+        self,
+        collection_name: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        user_id: Optional[int] = None
+    ):
+        """(Re)build the index of a collection and swap it in"""
+        path = self._path(collection_name)
+        staging = f"{path}.building-{uuid.uuid4().hex}"
+        BM25Index.write(staging, texts, metadatas, user_id)
+        retired = f"{path}.old-{uuid.uuid4().hex}"
+        with self._lock:
+            self._cache.pop(collection_name, None)
+            if os.path.exists(path):
+                os.replace(path, retired)
+            os.replace(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+    
+    def delete(self, collection_name: str):
+        path = self._path(collection_name)
+        with self._lock:
+            self._cache.pop(collection_name, None)
+        shutil.rmtree(path, ignore_errors=True)
+    
+    def has(self, collection_name: str) -> bool:
+        if not SAFE_NAME_RE.match(collection_name):
+            return False
+        return os.path.exists(os.path.join(self._path(collection_name), "meta.json"))
+    
+    def get(self, collection_name: str) -> Optional[BM25Index]:
+        """Open (or reuse) the index of a collection; None if it has none"""
+        with self._lock:
+            index = self._cache.get(collection_name)
+            if index is not None:
+                self._cache.move_to_end(collection_name)
+                return index
+        if not self.has(collection_name):
+            return None
+        index = BM25Index(self._path(collection_name))
+        with self._lock:
+            self._cache[collection_name] = index
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return index
+    
+    def search(
+        self,
+        collection_names: List[str],
+        query: str,
+        n_results: int = 5,
+        user_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        BM25 search over several collections, best scores first.
+        
+        Returns Chroma-shaped results ({"documents", "metadatas", "scores"}),
+        or None when none of the collections has a lexical index.
+        """
+        hits = []
+        indexed = False
+        for name in collection_names:
+            index = self.get(name)
+            if index is None or (user_id is not None and index.user_id not in (None, user_id)):
+                continue
+            indexed = True
+            for chunk_id, score in index.search(query, n_results):
+                metadata = {**index.metadatas[chunk_id], "collection_name": name}
+                hits.append((score, index.text(chunk_id), metadata))
+        if not indexed:
+            return None
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        hits = hits[:n_results]
+        return {
+            "documents": [[hit[1] for hit in hits]],
+            "metadatas": [[hit[2] for hit in hits]],
+            "scores": [[hit[0] for hit in hits]]
+        }
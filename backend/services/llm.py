@@ -1,27 +1,44 @@
-import google.generativeai as genai
-from typing import Optional
+from typing import Optional, Callable
+
 from config import settings
+from services.llm_providers import (
+    GeminiClientPool,
+    GeminiProvider,
+    LLMProvider,
+    create_provider,
+    iterate_sync,
+    run_sync,
+    shutdown_providers
+)
 
 
 class LLMService:
-    """Service for interacting with Gemini LLM"""
+    """Builds prompts and generates responses through an LLM provider (Gemini by default)"""
+    
+    DEFAULT_MODEL = 'gemini-2.5-flash'
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, model_name: str = DEFAULT_MODEL, provider: Optional[str] = None):
         self.api_key = api_key or settings.GEMINI_API_KEY
-        self.model = None
-        if self.api_key:
-            self._configure()
+        self.model_name = model_name
+        self.provider: LLMProvider = create_provider(provider, self.api_key, model_name)
     
-    def _configure(self):
-        """Configure the Gemini client"""
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    @classmethod
+    def client_pool(cls) -> GeminiClientPool:
+        return GeminiProvider.client_pool()
     
-    def configure(self, api_key: str, model_name: str = 'gemini-2.5-flash'):
+    @classmethod
+    def shutdown(cls):
+        shutdown_providers()
+    
+    def configure(self, api_key: str, model_name: str = DEFAULT_MODEL):
         """Configure the service with a new API key and model"""
         self.api_key = api_key
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.provider = create_provider(self.provider.name, api_key, model_name)
+    
+    def bind(self, api_key: str, model_name: str = DEFAULT_MODEL, provider: Optional[str] = None) -> "LLMService":
+        """A service for another key / model / provider; safe to use alongside this one"""
+        return type(self)(api_key, model_name, provider or self.provider.name)
     
     def generate_response(
         self,
@@ -29,12 +46,15 @@ class LLMService:
         context: Optional[str] = None,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        chat_history: Optional[list] = None
+        chat_history: Optional[list] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        conversation_memory: Optional[str] = None
     ) -> str:
-        """Generate a response using Gemini"""
-        if not self.api_key or not self.model:
-            raise ValueError("Gemini API key not configured")
-        
+        """
+        Generate a response with the configured provider.
+        When on_token is given the response is streamed and each text
+        fragment is passed to it as it arrives; the full text is still returned.
+        """
         # Build the prompt
         prompt_parts = []
         
@@ -44,6 +64,10 @@ class LLMService:
         if context:
             prompt_parts.append(f"Context from Knowledge Base:\n{context}\n")
         
+        # Summary and recalled turns from before the verbatim history window
+        if conversation_memory:
+            prompt_parts.append(f"Earlier in this conversation:\n{conversation_memory}\n")
+        
         # Add chat history for conversation memory
         if chat_history:
             prompt_parts.append("Previous conversation:")
@@ -57,17 +81,17 @@ class LLMService:
         full_prompt = "\n\n".join(prompt_parts)
         
         try:
-            generation_config = genai.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=2048
-            )
+            if on_token is None:
+                return run_sync(self.provider.generate(full_prompt, temperature=temperature, max_output_tokens=2048))
+            
+            fragments = []
             
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config
-            )
+            def collect(text: str):
+                fragments.append(text)
+                on_token(text)
             
-            return response.text
+            iterate_sync(self.provider.stream(full_prompt, temperature=temperature, max_output_tokens=2048), collect)
+            return "".join(fragments)
         except Exception as e:
             raise Exception(f"Error generating response: {str(e)}")
     
@@ -78,7 +102,9 @@ class LLMService:
         context: Optional[str] = None,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        chat_history: Optional[list] = None
+        chat_history: Optional[list] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        conversation_memory: Optional[str] = None
     ) -> str:
         """Generate a response with web search results included"""
         enhanced_context = ""
@@ -94,5 +120,7 @@ class LLMService:
             context=enhanced_context if enhanced_context else None,
             system_prompt=system_prompt,
             temperature=temperature,
-            chat_history=chat_history
+            chat_history=chat_history,
+            on_token=on_token,
+            conversation_memory=conversation_memory
         )
@@ -0,0 +1,377 @@
+import asyncio
+import hashlib
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, Iterator, Optional, Tuple
+
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+from config import settings
+
+
+# Errors worth another attempt: rate limits, overload and timeouts
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded
+)
+
+
+class LLMProvider:
+    """
+    A text generation backend. Implementations are async so many calls can
+    be in flight on one event loop; LLMService drives them from worker
+    threads through run_sync / iterate_sync.
+    """
+    
+    name = ""
+    
+    def __init__(self, api_key: Optional[str] = None, model_name: str = ""):
+        self.api_key = api_key
+        self.model_name = model_name
+    
+    async def generate(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> str:
+        raise NotImplementedError
+    
+    async def stream(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield ""
+
+
+class _TimeoutClient:
+    """GenerativeServiceClient wrapper that puts a deadline on every call"""
+    
+    def __init__(self, client: glm.GenerativeServiceClient, timeout: float):
+        self._client = client
+        self._timeout = timeout
+    
+    def generate_content(self, request, **kwargs):
+        kwargs.setdefault("timeout", self._timeout)
+        return self._client.generate_content(request, **kwargs)
+    
+    def stream_generate_content(self, request, **kwargs):
+        kwargs.setdefault("timeout", self._timeout)
+        return self._client.stream_generate_content(request, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class GeminiClientPool:
+    """
+    Bounded LRU pool of Gemini models keyed by (api_key, model).
+    
+    Each API key gets its own transport client, shared by that key's
+    models, so concurrent requests with different keys never touch the
+    process-wide `genai.configure` state.
+    """
+    
+    def __init__(self, max_size: int = 32, timeout: float = 60):
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._models: "OrderedDict[Tuple[str, str], genai.GenerativeModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, api_key: str, model_name: str) -> genai.GenerativeModel:
+        key = (api_key, model_name)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+            client = next((m._client for (k, _), m in self._models.items() if k == api_key), None)
+        
+        if client is None:
+            client = _TimeoutClient(glm.GenerativeServiceClient(client_options={"api_key": api_key}), self.timeout)
+        model = genai.GenerativeModel(model_name)
+        # GenerativeModel falls back to the globally configured client when
+        # _client is unset; bind it to this key's client instead
+        model._client = client
+        
+        with self._lock:
+            model = self._models.setdefault(key, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_size:
+                # Evicted clients are not closed; a request may still hold them
+                self._models.popitem(last=False)
+                self.evictions += 1
+        return model
+    
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "api_keys": len({k for k, _ in self._models}),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Gemini through pooled, per-key clients. The pinned SDK's async client
+    only reads the global configuration, so blocking calls run on the
+    event loop's executor instead.
+    """
+    
+    name = "gemini"
+    
+    _pool: Optional[GeminiClientPool] = None  # Shared across instances and requests
+    _pool_lock = threading.Lock()
+    
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-2.5-flash"):
+        super().__init__(api_key, model_name)
+        self.model = self.client_pool().get(api_key, model_name) if api_key else None
+    
+    @classmethod
+    def client_pool(cls) -> GeminiClientPool:
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = GeminiClientPool(settings.LLM_CLIENT_POOL_SIZE, settings.LLM_TIMEOUT_SECONDS)
+        return cls._pool
+    
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        ceiling = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, ceiling)
+    
+    def _retry_wait(self, attempt: int, error: Exception):
+        delay = self._backoff(attempt)
+        print(f"⚠️ Gemini {type(error).__name__}, retry {attempt + 1}/{settings.LLM_MAX_RETRIES} in {delay:.2f}s")
+        time.sleep(delay)
+    
+    def _config(self, temperature: float, max_output_tokens: int) -> genai.GenerationConfig:
+        if not self.model:
+            raise ValueError("Gemini API key not configured")
+        return genai.GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+    
+    def generate_sync(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> str:
+        """Blocking call, retrying transient errors"""
+        generation_config = self._config(temperature, max_output_tokens)
+        attempt = 0
+        while True:
+            try:
+                return self.model.generate_content(prompt, generation_config=generation_config).text
+            except RETRYABLE_ERRORS as e:
+                if attempt >= settings.LLM_MAX_RETRIES:
+                    raise
+                self._retry_wait(attempt, e)
+                attempt += 1
+    
+    def stream_sync(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> Iterator[str]:
+        """Blocking stream; only retried if it failed before the first fragment"""
+        generation_config = self._config(temperature, max_output_tokens)
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                for chunk in self.model.generate_content(prompt, generation_config=generation_config, stream=True):
+                    text = chunk.text
+                    if text:
+                        emitted = True
+                        yield text
+                return
+            except RETRYABLE_ERRORS as e:
+                if emitted or attempt >= settings.LLM_MAX_RETRIES:
+                    raise
+                self._retry_wait(attempt, e)
+                attempt += 1
+    
+    async def generate(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate_sync, prompt, temperature, max_output_tokens)
+    
+    async def stream(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        fragments: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        
+        def produce():
+            try:
+                for text in self.stream_sync(prompt, temperature, max_output_tokens):
+                    loop.call_soon_threadsafe(fragments.put_nowait, ("text", text))
+                loop.call_soon_threadsafe(fragments.put_nowait, ("done", None))
+            except BaseException as e:
+                loop.call_soon_threadsafe(fragments.put_nowait, ("error", e))
+        
+        loop.run_in_executor(None, produce)
+        while True:
+            kind, value = await fragments.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+
+
+class MockProviderError(Exception):
+    pass
+
+
+class MockLLMProvider(LLMProvider):
+    """
+    Deterministic local backend for benchmarks and load tests: no network,
+    no API key. The reply is derived from a hash of the prompt, arrives
+    after `latency_ms` and is streamed at `tokens_per_second` (0 sends it
+    at once). `error_rate` of calls fail with MockProviderError, drawn from
+    a generator seeded with `seed` so a run is reproducible.
+    """
+    
+    name = "mock"
+    
+    VOCABULARY = (
+        "the", "workflow", "context", "answer", "document", "result", "query", "model",
+        "response", "search", "based", "on", "retrieved", "passage", "summary", "detail",
+        "relevant", "source", "section", "data", "shows", "that", "and", "this"
+    )
+    
+    _rng: Optional[random.Random] = None  # Shared so error draws follow one seeded sequence
+    _rng_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_name: str = "mock",
+        latency_ms: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        response_tokens: Optional[int] = None
+    ):
+        super().__init__(api_key, model_name)
+        self.latency_ms = settings.LLM_MOCK_LATENCY_MS if latency_ms is None else latency_ms
+        self.tokens_per_second = settings.LLM_MOCK_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+        self.error_rate = settings.LLM_MOCK_ERROR_RATE if error_rate is None else error_rate
+        self.response_tokens = max(1, settings.LLM_MOCK_RESPONSE_TOKENS if response_tokens is None else response_tokens)
+    
+    @classmethod
+    def _draw(cls) -> float:
+        with cls._rng_lock:
+            if cls._rng is None:
+                cls._rng = random.Random(settings.LLM_MOCK_SEED)
+            return cls._rng.random()
+    
+    @classmethod
+    def reset(cls, seed: Optional[int] = None):
+        """Restart the error sequence (e.g. between benchmark runs)"""
+        with cls._rng_lock:
+            cls._rng = random.Random(settings.LLM_MOCK_SEED if seed is None else seed)
+    
+    def _tokens(self, prompt: str) -> list:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        words = [self.VOCABULARY[digest[i % len(digest)] % len(self.VOCABULARY)] for i in range(self.response_tokens - 1)]
+        return [f"[{self.model_name}]"] + words
+    
+    async def _start(self):
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.error_rate > 0 and self._draw() < self.error_rate:
+            raise MockProviderError("Injected mock provider failure")
+    
+    async def generate(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> str:
+        await self._start()
+        tokens = self._tokens(prompt)[:max_output_tokens]
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        return " ".join(tokens)
+    
+    async def stream(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048) -> AsyncIterator[str]:
+        await self._start()
+        for i, token in enumerate(self._tokens(prompt)[:max_output_tokens]):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield token if i == 0 else f" {token}"
+
+
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    MockLLMProvider.name: MockLLMProvider
+}
+
+
+def create_provider(name: Optional[str], api_key: Optional[str], model_name: str) -> LLMProvider:
+    """Instantiate a provider by name ("gemini", "mock"); None means LLM_PROVIDER"""
+    name = (name or settings.LLM_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name} (expected one of {', '.join(PROVIDERS)})")
+    return PROVIDERS[name](api_key, model_name)
+
+
+class _EventLoopThread:
+    """One background event loop that runs provider coroutines for sync callers"""
+    
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(
+                    max_workers=max(1, settings.LLM_MAX_CONCURRENCY),
+                    thread_name_prefix="llm"
+                ))
+                threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+                cls._loop = loop
+            return cls._loop
+    
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            loop, cls._loop = cls._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run a provider coroutine from a worker thread and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _EventLoopThread.get()).result()
+
+
+def iterate_sync(stream: AsyncIterator[str], on_item: Callable[[str], None]):
+    """Drain a provider stream from a worker thread, calling on_item in that thread"""
+    items: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    
+    async def pump():
+        try:
+            async for item in stream:
+                items.put(("item", item))
+            items.put(("done", None))
+        except BaseException as e:
+            items.put(("error", e))
+    
+    future = asyncio.run_coroutine_threadsafe(pump(), _EventLoopThread.get())
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            on_item(value)
+    finally:
+        future.cancel()
+
+
+def shutdown_providers():
+    """Stop the background event loop"""
+    _EventLoopThread.shutdown()
@@ -1,11 +1,297 @@
 from sentence_transformers import SentenceTransformer
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import Future
+import bisect
+import queue
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+from config import settings
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by model name + normalized text.
+    
+    Vectors are kept as float32 numpy arrays. When a persist path is given,
+    entries are also written to a size-bounded SQLite file so they survive
+    restarts. Concurrent lookups of the same key share one computation.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        persist_path: Optional[str] = None,
+        max_disk_entries: int = 100000
+    ):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if persist_path:
+            self._open_disk(persist_path)
+    
+    @staticmethod
+    def make_key(model_name: str, text: str, lowercase: bool = False) -> str:
+        """Cache key for a text; lowercase only when the model's tokenizer does"""
+        normalized = unicodedata.normalize("NFC", text)
+        normalized = re.sub(r"\s+", " ", normalized).strip()
+        if lowercase:
+            normalized = normalized.lower()
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+    
+    def get_or_compute(self, key: str, compute: Callable[[], np.ndarray]) -> Tuple[np.ndarray, bool]:
+        """Return (vector, hit), computing and storing the vector on a miss"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector, True
+            pending = self._in_flight.get(key)
+            if pending is None:
+                pending = Future()
+                self._in_flight[key] = pending
+                owner = True
+            else:
+                owner = False
+        
+        if not owner:
+            # Another thread is already computing this key
+            vector = pending.result()
+            with self._lock:
+                self.hits += 1
+            return vector, True
+        
+        try:
+            vector = self._disk_get(key)
+            hit = vector is not None
+            if not hit:
+                vector = np.asarray(compute(), dtype=np.float32)
+                self._disk_put(key, vector)
+            with self._lock:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                self._store(key, vector)
+            pending.set_result(vector)
+            return vector, hit
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+    
+    def _store(self, key: str, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _open_disk(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+            self._db.commit()
+    
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            return np.frombuffer(row[0], dtype=np.float32)
+        except sqlite3.Error as e:
+            print(f"Embedding cache read error: {e}")
+            return None
+    
+    def _disk_put(self, key: str, vector: np.ndarray):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time())
+                )
+                count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if count > self.max_disk_entries:
+                    self._db.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (count - self.max_disk_entries,)
+                    )
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Embedding cache write error: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Histogram:
+    """Fixed-bucket histogram (counts of observations <= each upper bound)"""
+    
+    def __init__(self, bounds: List[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+    
+    def to_dict(self) -> Dict[str, object]:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.total,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "buckets": buckets
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text encode requests into batched calls.
+    
+    Requests are queued; a worker thread takes the first one, waits up to
+    max_wait_ms for more (or until max_batch_size is reached), encodes the
+    whole batch in one forward pass and resolves each caller's future.
+    """
+    
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.latency_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+        self._stopped = False
+        # Orders encode()'s enqueue against stop()'s sentinel
+        self._state_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+    
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text, sharing a forward pass with concurrent callers"""
+        future: Future = Future()
+        with self._state_lock:
+            stopped = self._stopped
+            if not stopped:
+                self._queue.put((text, future, time.monotonic()))
+        if stopped:
+            return self.model.encode(text, convert_to_numpy=True)
+        return future.result()
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then exit
+                    break
+                batch.append(item)
+            self._encode_batch(batch)
+    
+    def _encode_batch(self, batch):
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = self.model.encode(texts, convert_to_numpy=True)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        
+        done_at = time.monotonic()
+        with self._stats_lock:
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued_at in batch:
+                self.latency_ms.observe((done_at - enqueued_at) * 1000)
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+    
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batch_size": self.batch_sizes.to_dict(),
+                "latency_ms": self.latency_ms.to_dict()
+            }
+    
+    def stop(self):
+        """Stop the worker after the queued requests are served"""
+        with self._state_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        self._worker.join(timeout=5)
+        # Serve anything the worker did not get to (e.g. the join timed out)
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            self._encode_batch(leftover)
 
 
 class LocalEmbeddingService:
     """Service for generating embeddings using local sentence-transformers model"""
     
     _model = None  # Singleton model to avoid reloading
+    _query_cache: Optional[EmbeddingCache] = None  # Shared across instances and requests
+    _batcher: Optional[EmbeddingBatcher] = None  # Shared micro-batching worker
     
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         """
@@ -17,10 +303,42 @@ class LocalEmbeddingService:
             print(f"Loading local embedding model: {model_name}")
             LocalEmbeddingService._model = SentenceTransformer(model_name)
         self.model = LocalEmbeddingService._model
+        if LocalEmbeddingService._query_cache is None:
+            LocalEmbeddingService._query_cache = EmbeddingCache(
+                max_entries=settings.EMBEDDING_CACHE_SIZE,
+                persist_path=settings.EMBEDDING_CACHE_PATH or None,
+                max_disk_entries=settings.EMBEDDING_CACHE_DISK_ENTRIES
+            )
+        self.query_cache = LocalEmbeddingService._query_cache
+        if LocalEmbeddingService._batcher is None and settings.EMBEDDING_BATCHING:
+            LocalEmbeddingService._batcher = EmbeddingBatcher(
+                self.model,
+                max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS
+            )
+        self.batcher = LocalEmbeddingService._batcher
+        # Uncased models (like MiniLM) lowercase input, so case can be folded in keys
+        self._lowercase = bool(getattr(self.model.tokenizer, "do_lower_case", False))
+    
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, used to size chunks"""
+        return self.model.tokenizer
+    
+    @property
+    def max_input_tokens(self) -> int:
+        """Content tokens the model embeds before truncating (excludes [CLS]/[SEP])"""
+        return self.model.max_seq_length - 2
+    
+    def _encode_one(self, text: str) -> np.ndarray:
+        """Encode a single text, coalescing with concurrent callers when batching is on"""
+        if self.batcher is not None:
+            return self.batcher.encode(text)
+        return self.model.encode(text, convert_to_numpy=True)
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text"""
-        embedding = self.model.encode(text, convert_to_numpy=True)
+        embedding = self._encode_one(text)
         return embedding.tolist()
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
@@ -28,6 +346,33 @@ class LocalEmbeddingService:
         embeddings = self.model.encode(texts, convert_to_numpy=True)
         return embeddings.tolist()
     
+    def content_key(self, text: str) -> str:
+        """Content-addressed key for a text under this model"""
+        return EmbeddingCache.make_key(self.model_name, text, lowercase=self._lowercase)
+    
+    def lookup_query_embedding(self, query: str) -> Tuple[List[float], bool]:
+        """Return (embedding, cache_hit) for a query, using the shared query cache"""
+        key = self.content_key(query)
+        vector, hit = self.query_cache.get_or_compute(
+            key,
+            lambda: self._encode_one(query)
+        )
+        return vector.tolist(), hit
+    
     def generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for a query (same as document embedding for this model)"""
-        return self.generate_embedding(query)
+        return self.lookup_query_embedding(query)[0]
+    
+    def stats(self) -> Dict[str, object]:
+        """Query cache and micro-batcher metrics"""
+        return {
+            "cache": self.query_cache.stats(),
+            "batcher": self.batcher.stats() if self.batcher is not None else None
+        }
+    
+    @classmethod
+    def shutdown(cls):
+        """Stop the shared batching worker"""
+        if cls._batcher is not None:
+            cls._batcher.stop()
+            cls._batcher = None
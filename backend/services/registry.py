@@ -0,0 +1,141 @@
+import threading
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.local_embedding import LocalEmbeddingService
+from services.vector_store import VectorStoreService
+from services.llm import LLMService
+from services.web_search import WebSearchService
+from services.ingestion import IngestionPipeline
+from services.lexical_index import LexicalIndexStore
+from services.reranker import CrossEncoderReranker
+from services.conversation_memory import ConversationMemory
+from services.response_cache import ResponseCache
+from services.execution_log_sink import ExecutionLogSink
+from config import settings
+
+
+class ServiceRegistry:
+    """
+    Process-wide holder for expensive, shareable services.
+    
+    Built once on application startup so requests reuse a single ChromaDB
+    client, a single embedding model, the lexical indexes, conversation
+    memory, the response cache, the execution log sink and a pooled HTTP
+    session instead of reopening them per call.
+    """
+    
+    def __init__(self, http_pool_size: int = 20):
+        self.chroma_client = VectorStoreService.create_client()
+        self.vector_store = VectorStoreService(client=self.chroma_client)
+        self.embedding_service = LocalEmbeddingService()
+        self.lexical_index = LexicalIndexStore(settings.LEXICAL_INDEX_DIR, settings.LEXICAL_INDEX_CACHE_SIZE)
+        self.reranker = CrossEncoderReranker(  # model loads on first rerank
+            settings.RERANK_MODEL,
+            batch_size=settings.RERANK_BATCH_SIZE,
+            cache_size=settings.RERANK_CACHE_SIZE
+        )
+        self.memory = ConversationMemory(self.embedding_service)
+        self.response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_SIZE,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY
+        )
+        self.log_sink = self._create_log_sink()
+        self.http_session = self._create_http_session(http_pool_size)
+        self.ingestion = IngestionPipeline(
+            embedding_service=self.embedding_service,
+            vector_store=self.vector_store,
+            lexical_index=self.lexical_index,
+            response_cache=self.response_cache,
+            extract_workers=settings.INGEST_EXTRACT_WORKERS,
+            embed_workers=settings.INGEST_EMBED_WORKERS,
+            index_workers=settings.INGEST_INDEX_WORKERS,
+            embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+            reuse_embeddings=settings.INGEST_REUSE_EMBEDDINGS
+        )
+    
+    @staticmethod
+    def _create_log_sink() -> ExecutionLogSink:
+        return ExecutionLogSink(
+            buffered=settings.EXECUTION_LOG_MODE == "buffered",
+            batch_size=settings.EXECUTION_LOG_BATCH_SIZE,
+            flush_interval_ms=settings.EXECUTION_LOG_FLUSH_MS,
+            max_buffer=settings.EXECUTION_LOG_BUFFER_SIZE,
+            use_copy=settings.EXECUTION_LOG_COPY
+        )
+    
+    @staticmethod
+    def _create_http_session(pool_size: int) -> requests.Session:
+        """HTTP session with keep-alive connection pooling"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def create_executor(self) -> Any:
+        """
+        Build a WorkflowExecutor wired to the shared services.
+        
+        LLM and web search services keep per-execution configuration (API
+        keys), so each executor gets its own lightweight instance backed by
+        the shared HTTP session.
+        """
+        from engine.executor import WorkflowExecutor
+        
+        return WorkflowExecutor(
+            embedding_service=self.embedding_service,
+            vector_store=self.vector_store,
+            llm_service=LLMService(),
+            web_search_service=WebSearchService(session=self.http_session),
+            lexical_index=self.lexical_index,
+            reranker=self.reranker,
+            response_cache=self.response_cache
+        )
+    
+    def close(self):
+        """Release pooled connections, worker pools and the ChromaDB client"""
+        self.ingestion.shutdown()
+        self.memory.shutdown()
+        self.log_sink.shutdown()
+        self.http_session.close()
+        WebSearchService.shutdown()
+        LLMService.shutdown()
+        LocalEmbeddingService.shutdown()
+        try:
+            # chromadb keeps one cached System per persist path; stop it so
+            # SQLite handles and HNSW segments are flushed and closed
+            self.chroma_client.clear_system_cache()
+        except Exception:
+            pass
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def init_registry() -> ServiceRegistry:
+    """Create the process-wide registry (idempotent)"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ServiceRegistry()
+    return _registry
+
+
+def get_registry() -> ServiceRegistry:
+    """Dependency for getting the shared service registry"""
+    return init_registry()
+
+
+def shutdown_registry():
+    """Close the process-wide registry if it was created"""
+    global _registry
+    with _registry_lock:
+        if _registry is not None:
+            _registry.close()
+            _registry = None
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import threading
+import time
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores (query, chunk) pairs with a local cross-encoder on CPU.
+    
+    Candidates are scored in batches, in first-stage rank order, until the
+    latency budget runs out; candidates left unscored keep their original
+    order behind the scored ones. Scores are cached per (query, chunk).
+    The model is loaded on first use and shared by all instances.
+    """
+    
+    _models: Dict[str, Any] = {}
+    _models_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 16,
+        cache_size: int = 20000,
+        max_length: int = 512
+    ):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.cache_size = max(1, cache_size)
+        self.max_length = max_length
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    @property
+    def model(self) -> Any:
+        model = CrossEncoderReranker._models.get(self.model_name)
+        if model is None:
+            with CrossEncoderReranker._models_lock:
+                model = CrossEncoderReranker._models.get(self.model_name)
+                if model is None:
+                    from sentence_transformers import CrossEncoder
+                    print(f"Loading cross-encoder model: {self.model_name}")
+                    model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+                    CrossEncoderReranker._models[self.model_name] = model
+        return model
+    
+    def _key(self, query: str, text: str) -> str:
+        normalized_query = " ".join(query.split())
+        digest = hashlib.sha256(f"{normalized_query}\0{text}".encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+    
+    def rerank(
+        self,
+        query: str,
+        texts: List[str],
+        top_k: int,
+        budget_ms: Optional[float] = None
+    ) -> Tuple[List[int], List[Optional[float]], Dict[str, Any]]:
+        """
+        Rank candidate texts for a query.
+        
+        Returns (indices of the best top_k texts, score per text or None if
+        unscored, stats).
+        """
+        model = self.model  # load outside the latency budget
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000 if budget_ms else None
+        
+        keys = [self._key(query, text) for text in texts]
+        scores: List[Optional[float]] = [None] * len(texts)
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    scores[i] = score
+        cached = sum(score is not None for score in scores)
+        
+        pending = [i for i, score in enumerate(scores) if score is None]
+        batches = 0
+        budget_exhausted = False
+        for start in range(0, len(pending), self.batch_size):
+            if deadline is not None and time.perf_counter() >= deadline:
+                budget_exhausted = True
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = model.predict(
+                [(query, texts[i]) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            batches += 1
+            with self._cache_lock:
+                for i, score in zip(batch, predicted):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        scored = sorted((i for i, score in enumerate(scores) if score is not None), key=lambda i: -scores[i])
+        unscored = [i for i, score in enumerate(scores) if score is None]
+        stats = {
+            "candidates": len(texts),
+            "cached": cached,
+            "scored": len(scored) - cached,
+            "batches": batches,
+            "budget_exhausted": budget_exhausted,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        return (scored + unscored)[:top_k], scores, stats
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {"model": self.model_name, "cache_entries": len(self._cache)}
@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+from sqlalchemy import func
+
+from database import SessionLocal
+from models.document import Document
+from models.ingestion_job import IngestionJob
+
+
+class CacheHit(NamedTuple):
+    response: str
+    match: str  # "exact" or "semantic"
+    similarity: float
+    age_seconds: float
+    cached_query: str
+
+
+class _Entry:
+    __slots__ = ("scope", "query", "response", "created", "collections", "embedding")
+    
+    def __init__(self, scope: str, query: str, response: str, collections: Tuple[str, ...], embedding: Optional[np.ndarray]):
+        self.scope = scope
+        self.query = query
+        self.response = response
+        self.created = time.monotonic()
+        self.collections = collections
+        self.embedding = embedding
+
+
+def normalize_query(query: str) -> str:
+    normalized = unicodedata.normalize("NFC", query)
+    return re.sub(r"\s+", " ", normalized).strip().casefold()
+
+
+class ResponseCache:
+    """
+    In-memory cache of final workflow responses.
+    
+    Entries live in a scope that pins everything a response depends on
+    besides the question: workflow definition hash (which covers prompts),
+    model and temperature of each LLM node and the version of every
+    knowledge base collection; per-conversation scopes add the user and the
+    conversation so far. Within a scope, a question is matched exactly
+    (after whitespace/case normalization) or, when similarity_threshold > 0,
+    to the most similar cached question by embedding. Entries expire after ttl_seconds; the least recently used
+    go first when the cache is full.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.0,
+        max_scope_entries: int = 256
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_scope_entries = max(1, max_scope_entries)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._scopes: Dict[str, Dict[str, None]] = {}  # scope -> normalized queries, oldest first
+        self._by_collection: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+    
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold > 0
+    
+    @staticmethod
+    def collection_versions(collection_names: Iterable[str], user_id: Optional[int] = None) -> Dict[str, str]:
+        """
+        Current version of each collection: its document id and the finish
+        time of its latest ingestion ("missing" once deleted, or when it is
+        not one of user_id's documents). Read from the database so
+        re-uploads done by another process are seen too.
+        """
+        names = sorted(set(collection_names))
+        versions = {name: "missing" for name in names}
+        if not names:
+            return versions
+        db = SessionLocal()
+        try:
+            query = db.query(
+                Document.collection_name,
+                Document.id,
+                func.max(IngestionJob.updated_at)
+            ).outerjoin(
+                IngestionJob,
+                (IngestionJob.document_id == Document.id) & (IngestionJob.status == "ready")
+            ).filter(
+                Document.collection_name.in_(names)
+            )
+            if user_id is not None:
+                query = query.filter(Document.user_id == user_id)
+            rows = query.group_by(Document.collection_name, Document.id).all()
+        finally:
+            db.close()
+        for name, document_id, indexed_at in rows:
+            versions[name] = f"{document_id}:{indexed_at.isoformat() if indexed_at else 0}"
+        return versions
+    
+    @staticmethod
+    def scope_key(**parts: Any) -> str:
+        canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def get(
+        self,
+        scope: str,
+        query: str,
+        embed: Optional[Callable[[str], List[float]]] = None
+    ) -> Optional[CacheHit]:
+        """Look up a response; embed is only called for a semantic lookup after an exact miss"""
+        key = (scope, normalize_query(query))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return CacheHit(entry.response, "exact", 1.0, now - entry.created, entry.query)
+            candidates = list(self._scopes.get(scope, ()))
+        
+        if not (self.semantic and embed and candidates):
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        vector = np.asarray(embed(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        best: Optional[Tuple[float, Tuple[str, str]]] = None
+        with self._lock:
+            for normalized in candidates:
+                entry = self._entries.get((scope, normalized))
+                if entry is None or entry.embedding is None or now - entry.created > self.ttl_seconds:
+                    continue
+                similarity = float(entry.embedding @ vector)
+                if similarity >= self.similarity_threshold and (best is None or similarity > best[0]):
+                    best = (similarity, (scope, normalized))
+            if best is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best[1]]
+            self._entries.move_to_end(best[1])
+            self.hits += 1
+            self.semantic_hits += 1
+            return CacheHit(entry.response, "semantic", best[0], now - entry.created, entry.query)
+    
+    def put(
+        self,
+        scope: str,
+        query: str,
+        response: str,
+        collections: Iterable[str] = (),
+        embed: Optional[Callable[[str], List[float]]] = None
+    ):
+        embedding = None
+        if self.semantic and embed:
+            embedding = np.asarray(embed(query), dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+        key = (scope, normalize_query(query))
+        entry = _Entry(scope, query, response, tuple(sorted(set(collections))), embedding)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._scopes.setdefault(scope, {})[key[1]] = None
+            for name in entry.collections:
+                self._by_collection.setdefault(name, set()).add(key)
+            scope_queries = self._scopes[scope]
+            while len(scope_queries) > self.max_scope_entries:
+                self._remove((scope, next(iter(scope_queries))))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def invalidate_collection(self, collection_name: str) -> int:
+        """Drop every response that used a collection (re-uploaded or deleted document)"""
+        with self._lock:
+            keys = list(self._by_collection.get(collection_name, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+            return len(keys)
+    
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        scope_queries = self._scopes.get(entry.scope)
+        if scope_queries is not None:
+            scope_queries.pop(key[1], None)
+            if not scope_queries:
+                del self._scopes[entry.scope]
+        for name in entry.collections:
+            keys = self._by_collection.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_collection[name]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self._by_collection.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidated": self.invalidated
+            }
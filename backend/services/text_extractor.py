@@ -1,31 +1,128 @@
 import fitz  # PyMuPDF
-from typing import List
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import multiprocessing
 import os
 
+from config import settings
+
+
+# (page number, text) pairs; page is None for formats without pages
+PageStream = Iterator[Tuple[Optional[int], str]]
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) in a worker process"""
+    doc = fitz.open(file_path)
+    try:
+        return [doc[page_num].get_text() for page_num in range(start, end)]
+    finally:
+        doc.close()
+
 
 class TextExtractor:
     """Service for extracting text from documents"""
     
     SUPPORTED_EXTENSIONS = ['.pdf', '.txt', '.md']
+    TEXT_BLOCK_SIZE = 64 * 1024  # characters read at a time from text files
     
-    def extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from a PDF file"""
-        text_content = []
-        doc = None
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        parallel_min_pages: Optional[int] = None,
+        pages_per_shard: Optional[int] = None
+    ):
+        self.processes = settings.PDF_EXTRACT_PROCESSES if processes is None else processes
+        self.parallel_min_pages = (
+            settings.PDF_PARALLEL_MIN_PAGES if parallel_min_pages is None else parallel_min_pages
+        )
+        self.pages_per_shard = max(1, settings.PDF_PAGES_PER_SHARD if pages_per_shard is None else pages_per_shard)
+    
+    def iter_pdf_pages(self, file_path: str) -> PageStream:
+        """
+        Yield (page_number, text) for each page of a PDF, in order.
         
+        Large documents are split into page ranges that are extracted in a
+        process pool; only a few ranges are in flight at once, so memory use
+        does not grow with the page count.
+        """
         try:
             doc = fitz.open(file_path)
-            page_count = doc.page_count
-            for page_num in range(page_count):
-                page = doc[page_num]
-                text_content.append(page.get_text())
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
-        finally:
-            if doc:
+        
+        page_count = doc.page_count
+        if self.processes <= 1 or page_count < self.parallel_min_pages:
+            try:
+                for page_num in range(page_count):
+                    yield page_num + 1, doc[page_num].get_text()
+            except Exception as e:
+                raise Exception(f"Error extracting text from PDF: {str(e)}")
+            finally:
                 doc.close()
+            return
+        
+        doc.close()
+        shards = deque(
+            (start, min(start + self.pages_per_shard, page_count))
+            for start in range(0, page_count, self.pages_per_shard)
+        )
+        # spawn instead of fork: the server process runs model and pool threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=context) as pool:
+            in_flight = deque()
+            try:
+                while shards or in_flight:
+                    while shards and len(in_flight) < self.processes * 2:
+                        start, end = shards.popleft()
+                        in_flight.append((start, pool.submit(_extract_page_range, file_path, start, end)))
+                    start, future = in_flight.popleft()
+                    for offset, text in enumerate(future.result()):
+                        yield start + offset + 1, text
+            except Exception as e:
+                for _, future in in_flight:
+                    future.cancel()
+                raise Exception(f"Error extracting text from PDF: {str(e)}")
+    
+    def iter_txt_blocks(self, file_path: str) -> PageStream:
+        """Yield a text file in fixed-size blocks (page is always None)"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                while True:
+                    block = f.read(self.TEXT_BLOCK_SIZE)
+                    if not block:
+                        return
+                    yield None, block
+        except Exception as e:
+            raise Exception(f"Error reading text file: {str(e)}")
+    
+    def iter_pages(self, file_path: str) -> PageStream:
+        """
+        Stream a document as (page_number, segment) pairs.
+        
+        Concatenating the segments gives exactly the text returned by
+        extract(); PDF pages after the first carry the leading newline that
+        separates them from the previous page.
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        _, ext = os.path.splitext(file_path)
+        ext = ext.lower()
         
-        return "\n".join(text_content)
+        if ext == '.pdf':
+            for page_number, text in self.iter_pdf_pages(file_path):
+                yield page_number, text if page_number == 1 else "\n" + text
+        elif ext in ['.txt', '.md']:
+            yield from self.iter_txt_blocks(file_path)
+        else:
+            raise ValueError(f"Unsupported file type: {ext}")
+    
+    def extract_from_pdf(self, file_path: str) -> str:
+        """Extract text from a PDF file"""
+        return "\n".join(text for _, text in self.iter_pdf_pages(file_path))
     
     def extract_from_txt(self, file_path: str) -> str:
         """Extract text from a text file"""
@@ -50,6 +147,82 @@ class TextExtractor:
         else:
             raise ValueError(f"Unsupported file type: {ext}")
     
+    def chunk_pages(
+        self,
+        pages: Iterable[Tuple[Optional[int], str]],
+        chunk_size: int = 1000,
+        overlap: int = 200
+    ) -> Iterator[Dict[str, object]]:
+        """
+        Chunk a page stream without materializing the whole text.
+        
+        Produces the same chunks as chunk_text() on the concatenated
+        segments, each as {"text", "page_start", "page_end"}. Only the text
+        not yet chunked (plus the overlap) is kept in memory.
+        """
+        buffer = ""
+        buffer_offset = 0  # absolute offset of buffer[0]
+        total = 0
+        start = 0
+        page_offsets: List[int] = []  # absolute offset where each buffered segment begins
+        page_numbers: List[Optional[int]] = []
+        
+        def page_at(position: int) -> Optional[int]:
+            return page_numbers[max(0, bisect_right(page_offsets, position) - 1)]
+        
+        def make_chunk(end: int, at_end: bool) -> Tuple[Optional[Dict[str, object]], int]:
+            local = start - buffer_offset
+            chunk = buffer[local:local + chunk_size]
+            
+            # Try to break at sentence boundary
+            if not at_end:
+                last_period = chunk.rfind('.')
+                last_newline = chunk.rfind('\n')
+                break_point = max(last_period, last_newline)
+                
+                if break_point > chunk_size // 2:
+                    chunk = chunk[:break_point + 1]
+                    end = start + break_point + 1
+            
+            text = chunk.strip()
+            item = None
+            if text:
+                item = {
+                    "text": text,
+                    "page_start": page_at(start),
+                    "page_end": page_at(min(end, total) - 1)
+                }
+            return item, max(end - overlap, start + 1)
+        
+        for page_number, segment in pages:
+            if not segment:
+                continue
+            page_offsets.append(total)
+            page_numbers.append(page_number)
+            buffer += segment
+            total += len(segment)
+            
+            # A chunk is final once text beyond its end has arrived
+            while start + chunk_size < total:
+                item, start = make_chunk(start + chunk_size, at_end=False)
+                if item:
+                    yield item
+            
+            # Drop text and page markers that no future chunk can reach
+            if start > buffer_offset:
+                buffer = buffer[start - buffer_offset:]
+                buffer_offset = start
+            keep = max(0, bisect_right(page_offsets, start) - 1)
+            if keep:
+                del page_offsets[:keep]
+                del page_numbers[:keep]
+        
+        while start < total:
+            end = start + chunk_size
+            item, start = make_chunk(end, at_end=end >= total)
+            if item:
+                yield item
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into overlapping chunks for embedding"""
         if not text:
@@ -1,15 +1,33 @@
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
 from config import settings
 
 
 class VectorStoreService:
-    """Service for managing ChromaDB vector storage"""
+    """
+    Service for managing ChromaDB vector storage.
     
-    def __init__(self):
-        self.client = chromadb.PersistentClient(
+    Documents are addressed by a logical collection name (``doc_<uuid>``,
+    stored on Document.collection_name and referenced by workflows). In
+    "per_document" mode each logical name is its own Chroma collection. In
+    "shared" mode all chunks live in one collection per user (or one global
+    collection) and are tagged with ``collection_name``/``user_id`` metadata,
+    so a query is a single filtered lookup in one index.
+    """
+    
+    SHARED_METADATA_KEY = "collection_name"
+    
+    def __init__(self, client: Any = None, mode: Optional[str] = None, shared_scope: Optional[str] = None):
+        self.client = client or self.create_client()
+        self.mode = mode or settings.VECTOR_STORE_MODE
+        self.shared_scope = shared_scope or settings.VECTOR_STORE_SHARED_SCOPE
+    
+    @staticmethod
+    def create_client() -> Any:
+        """Open the persistent ChromaDB client on CHROMA_PERSIST_DIR"""
+        return chromadb.PersistentClient(
             path=settings.CHROMA_PERSIST_DIR,
             settings=ChromaSettings(anonymized_telemetry=False)
         )
@@ -21,22 +39,56 @@ class VectorStoreService:
             metadata={"hnsw:space": "cosine"}
         )
     
+    @property
+    def is_shared(self) -> bool:
+        return self.mode == "shared"
+    
+    def shared_collection_name(self, user_id: Optional[int] = None) -> str:
+        """Physical collection holding shared-mode chunks for a user"""
+        if self.shared_scope == "user" and user_id is not None:
+            return f"user_{user_id}_chunks"
+        return "shared_chunks"
+    
+    def _shared_collection(self, user_id: Optional[int] = None) -> Any:
+        return self.client.get_or_create_collection(
+            name=self.shared_collection_name(user_id),
+            # Filtered HNSW searches need a wider beam to fill k results
+            metadata={"hnsw:space": "cosine", "hnsw:search_ef": 200}
+        )
+    
+    def _shared_where(self, collection_names: List[str], user_id: Optional[int]) -> Dict[str, Any]:
+        if len(collection_names) == 1:
+            where: Dict[str, Any] = {self.SHARED_METADATA_KEY: collection_names[0]}
+        else:
+            where = {self.SHARED_METADATA_KEY: {"$in": list(collection_names)}}
+        if user_id is not None:
+            where = {"$and": [where, {"user_id": user_id}]}
+        return where
+    
     def add_documents(
         self, 
         collection_name: str, 
         texts: List[str], 
         embeddings: List[List[float]],
-        metadatas: List[Dict] = None
+        metadatas: List[Dict] = None,
+        user_id: Optional[int] = None
     ) -> List[str]:
         """Add documents with embeddings to a collection"""
-        collection = self.create_collection(collection_name)
-        
         # Generate unique IDs for each document
         ids = [str(uuid.uuid4()) for _ in texts]
         
         if metadatas is None:
             metadatas = [{"chunk_index": i} for i in range(len(texts))]
         
+        if self.is_shared:
+            collection = self._shared_collection(user_id)
+            tags = {self.SHARED_METADATA_KEY: collection_name}
+            if user_id is not None:
+                tags["user_id"] = user_id
+            metadatas = [{**meta, **tags} for meta in metadatas]
+        else:
+            collection = self.create_collection(collection_name)
+        
         collection.add(
             ids=ids,
             documents=texts,
@@ -50,9 +102,63 @@ class VectorStoreService:
         self, 
         collection_name: str, 
         query_embedding: List[float], 
-        n_results: int = 5
+        n_results: int = 5,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """Query the collection for similar documents"""
+        if self.is_shared:
+            return self.query_many([collection_name], query_embedding, n_results, user_id)
+        return self._query_legacy(collection_name, query_embedding, n_results)
+    
+    def query_many(
+        self,
+        collection_names: List[str],
+        query_embedding: List[float],
+        n_results: int = 5,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Query several documents at once.
+        
+        In shared mode this is one filtered search; documents not migrated
+        yet are still answered from their own ``doc_*`` collection.
+        """
+        if not self.is_shared:
+            if len(collection_names) == 1:
+                return self._query_legacy(collection_names[0], query_embedding, n_results)
+            return self._merge_results([
+                self._query_legacy(name, query_embedding, n_results) for name in collection_names
+            ], n_results)
+        
+        try:
+            results = self._shared_collection(user_id).query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=self._shared_where(collection_names, user_id),
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception as e:
+            raise Exception(f"Error querying collection: {str(e)}")
+        
+        found = {
+            (meta or {}).get(self.SHARED_METADATA_KEY)
+            for meta in (results.get("metadatas") or [[]])[0]
+        }
+        legacy = [name for name in collection_names if name not in found and self._has_collection(name)]
+        if legacy:
+            results = self._merge_results(
+                [results] + [self._query_legacy(name, query_embedding, n_results) for name in legacy],
+                n_results
+            )
+        return results
+    
+    def _query_legacy(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        n_results: int
+    ) -> Dict[str, Any]:
+        """Query a dedicated per-document collection"""
         try:
             collection = self.client.get_collection(collection_name)
             results = collection.query(
@@ -64,13 +170,176 @@ class VectorStoreService:
         except Exception as e:
             raise Exception(f"Error querying collection: {str(e)}")
     
-    def delete_collection(self, name: str):
+    @staticmethod
+    def _merge_results(results_list: List[Dict[str, Any]], n_results: int) -> Dict[str, Any]:
+        """Merge single-query result sets by ascending distance"""
+        rows = []
+        for results in results_list:
+            rows.extend(zip(
+                (results.get("ids") or [[]])[0],
+                (results.get("documents") or [[]])[0],
+                (results.get("metadatas") or [[]])[0],
+                (results.get("distances") or [[]])[0]
+            ))
+        rows.sort(key=lambda row: row[3])
+        rows = rows[:n_results]
+        return {
+            "ids": [[row[0] for row in rows]],
+            "documents": [[row[1] for row in rows]],
+            "metadatas": [[row[2] for row in rows]],
+            "distances": [[row[3] for row in rows]]
+        }
+    
+    def _has_collection(self, name: str) -> bool:
+        try:
+            self.client.get_collection(name)
+            return True
+        except Exception:
+            return False
+    
+    def delete_collection(self, name: str, user_id: Optional[int] = None):
         """Delete a collection"""
+        if self.is_shared:
+            try:
+                self._shared_collection(user_id).delete(where={self.SHARED_METADATA_KEY: name})
+            except Exception:
+                pass
         try:
             self.client.delete_collection(name)
         except Exception:
             pass  # Collection might not exist
     
+    def get_document_chunks(
+        self,
+        collection_name: str,
+        user_id: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """All stored chunks of one document (Chroma ``get`` result)"""
+        include = include or ["documents", "metadatas"]
+        try:
+            if self.is_shared:
+                return self._shared_collection(user_id).get(
+                    where={self.SHARED_METADATA_KEY: collection_name},
+                    include=include
+                )
+            return self.client.get_collection(collection_name).get(include=include)
+        except Exception:
+            return {"ids": [], "documents": [], "metadatas": []}  # Collection might not exist yet
+    
+    def _document_chunks(self, collection_name: str, user_id: Optional[int]) -> Dict[str, Optional[str]]:
+        """Map chunk id -> content_hash metadata for a document's stored chunks"""
+        stored = self.get_document_chunks(collection_name, user_id, include=["metadatas"])
+        return {
+            chunk_id: (meta or {}).get("content_hash")
+            for chunk_id, meta in zip(stored["ids"], stored["metadatas"])
+        }
+    
+    def sync_chunks(
+        self,
+        collection_name: str,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        user_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Make a document's stored chunks match a new chunk list.
+        
+        Chunks are matched by their ``content_hash`` metadata: matches keep
+        their id and have their text, vector and metadata rewritten (the
+        hash ignores case and whitespace, so the stored text may differ),
+        new chunks are added and chunks no longer present are deleted.
+        Returns counts of added, kept and removed chunks.
+        """
+        if self.is_shared and self._has_collection(collection_name):
+            # Not migrated yet; rebuild it in the shared store
+            self.client.delete_collection(collection_name)
+        
+        available: Dict[str, List[str]] = {}
+        removed: List[str] = []
+        for chunk_id, content_hash in self._document_chunks(collection_name, user_id).items():
+            if content_hash:
+                available.setdefault(content_hash, []).append(chunk_id)
+            else:
+                removed.append(chunk_id)  # stored before hashes were recorded
+        
+        kept_ids, kept, kept_metadatas, added = [], [], [], []
+        for i, meta in enumerate(metadatas):
+            matches = available.get(meta.get("content_hash"))
+            if matches:
+                kept_ids.append(matches.pop())
+                kept.append(i)
+                kept_metadatas.append(meta)
+            else:
+                added.append(i)
+        removed.extend(chunk_id for ids in available.values() for chunk_id in ids)
+        
+        if self.is_shared:
+            collection = self._shared_collection(user_id)
+            tags = {self.SHARED_METADATA_KEY: collection_name}
+            if user_id is not None:
+                tags["user_id"] = user_id
+            kept_metadatas = [{**meta, **tags} for meta in kept_metadatas]
+        else:
+            collection = self.create_collection(collection_name)
+        
+        if removed:
+            collection.delete(ids=removed)
+        if kept_ids:
+            # Embeddings are passed too, otherwise Chroma would re-embed the
+            # documents with its default embedding function
+            collection.update(
+                ids=kept_ids,
+                documents=[texts[i] for i in kept],
+                embeddings=[embeddings[i] for i in kept],
+                metadatas=kept_metadatas
+            )
+        if added:
+            self.add_documents(
+                collection_name=collection_name,
+                texts=[texts[i] for i in added],
+                embeddings=[embeddings[i] for i in added],
+                metadatas=[metadatas[i] for i in added],
+                user_id=user_id
+            )
+        return {"added": len(added), "kept": len(kept_ids), "removed": len(removed)}
+    
+    def migrate_collection(self, name: str, user_id: Optional[int] = None, batch_size: int = 1000) -> int:
+        """
+        Move a legacy per-document collection into the shared store.
+        
+        Copies ids, texts, embeddings and metadata (tagged with the logical
+        collection name and user) and drops the old collection. Returns the
+        number of chunks moved.
+        """
+        source = self.client.get_collection(name)
+        target = self._shared_collection(user_id)
+        tags = {self.SHARED_METADATA_KEY: name}
+        if user_id is not None:
+            tags["user_id"] = user_id
+        
+        moved = 0
+        total = source.count()
+        while moved < total:
+            batch = source.get(
+                limit=batch_size,
+                offset=moved,
+                include=["documents", "embeddings", "metadatas"]
+            )
+            if not batch["ids"]:
+                break
+            target.upsert(
+                ids=batch["ids"],
+                documents=batch["documents"],
+                embeddings=batch["embeddings"],
+                metadatas=[{**(meta or {}), **tags} for meta in batch["metadatas"]]
+            )
+            moved += len(batch["ids"])
+        
+        self.client.delete_collection(name)
+        return moved
+    
     def list_collections(self) -> List[str]:
         """List all collections"""
         collections = self.client.list_collections()
@@ -1,14 +1,251 @@
 import requests
-from typing import Optional, List, Dict
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional, List, Dict, Tuple
+import re
+import threading
+import time
 from config import settings
 
 
+SearchKey = Tuple[str, str, int]  # (provider, normalized query, result count)
+
+
+class ProviderError(Exception):
+    """
+    A failed provider call. `unhealthy` is False for errors that say nothing
+    about the provider's health (e.g. a rejected API key), which the circuit
+    breaker ignores.
+    """
+    
+    def __init__(self, message: str, unhealthy: bool = True):
+        super().__init__(message)
+        self.unhealthy = unhealthy
+
+
+class CircuitOpenError(ProviderError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker: opens after `failure_threshold` consecutive
+    failures, lets one trial call through after `reset_seconds`, and closes
+    again when that call succeeds.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"  # closed, open or half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+class LatencyTracker:
+    """Call counts and latency percentiles over the most recent calls of a provider"""
+    
+    def __init__(self, window: int = 256):
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+    
+    def observe(self, elapsed_ms: float, ok: bool):
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self.calls += 1
+            if not ok:
+                self.failures += 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            calls, failures = self.calls, self.failures
+        
+        def percentile(q: float) -> Optional[float]:
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))], 1) if samples else None
+        
+        return {
+            "calls": calls,
+            "failures": failures,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99)
+        }
+
+
+class SearchResultCache:
+    """
+    TTL + LRU cache of normalized search results with request coalescing.
+    
+    Concurrent lookups of a key that is being fetched wait for that one
+    call instead of starting their own.
+    """
+    
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 900):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[SearchKey, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._inflight: Dict[SearchKey, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+    
+    @staticmethod
+    def make_key(provider: str, query: str, num_results: int) -> SearchKey:
+        return provider, re.sub(r"\s+", " ", query).strip().casefold(), num_results
+    
+    def get_or_fetch(self, key: SearchKey, fetch: Callable[[], List[Dict]]) -> List[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        
+        try:
+            results = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                self._inflight.pop(key, None)
+            raise
+        with self._lock:
+            if self.ttl_seconds > 0:
+                self._entries[key] = (time.monotonic(), results)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(results)
+        return results
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0
+            }
+
+
 class WebSearchService:
     """Service for web search using SerpAPI or Brave Search"""
     
-    def __init__(self, serp_api_key: str = None, brave_api_key: str = None):
+    PROVIDERS = ("serpapi", "brave")  # in order of preference
+    
+    _cache: Optional[SearchResultCache] = None  # Shared across instances and requests
+    _session: Optional[requests.Session] = None  # Fallback pooled session
+    _pool: Optional[ThreadPoolExecutor] = None  # Provider calls for hedged searches
+    _breakers: Dict[str, CircuitBreaker] = {}
+    _latency: Dict[str, LatencyTracker] = {}
+    _hedges = {"searches": 0, "hedged": 0, "secondary_wins": 0}
+    _shared_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        serp_api_key: str = None,
+        brave_api_key: str = None,
+        session: Optional[requests.Session] = None
+    ):
         self.serp_api_key = serp_api_key or settings.SERP_API_KEY
         self.brave_api_key = brave_api_key or settings.BRAVE_API_KEY
+        # Reuse a pooled session when one is shared, else the class-wide one
+        self.http = session or WebSearchService._default_session()
+        self.timeout = (settings.WEB_SEARCH_CONNECT_TIMEOUT, settings.WEB_SEARCH_READ_TIMEOUT)
+        self.cache = WebSearchService.shared_cache()
+    
+    @classmethod
+    def shared_cache(cls) -> SearchResultCache:
+        with cls._shared_lock:
+            if cls._cache is None:
+                cls._cache = SearchResultCache(
+                    max_entries=settings.WEB_SEARCH_CACHE_SIZE,
+                    ttl_seconds=settings.WEB_SEARCH_CACHE_TTL_SECONDS
+                )
+            return cls._cache
+    
+    @classmethod
+    def _provider_state(cls, provider: str) -> Tuple[CircuitBreaker, LatencyTracker]:
+        with cls._shared_lock:
+            if provider not in cls._breakers:
+                cls._breakers[provider] = CircuitBreaker(
+                    settings.WEB_SEARCH_BREAKER_FAILURES,
+                    settings.WEB_SEARCH_BREAKER_RESET_SECONDS
+                )
+                cls._latency[provider] = LatencyTracker()
+            return cls._breakers[provider], cls._latency[provider]
+    
+    @classmethod
+    def _search_pool(cls) -> ThreadPoolExecutor:
+        with cls._shared_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(
+                    max_workers=max(2, settings.WEB_SEARCH_WORKERS),
+                    thread_name_prefix="web-search"
+                )
+            return cls._pool
+    
+    @classmethod
+    def _default_session(cls) -> requests.Session:
+        """Keep-alive session for instances created without one"""
+        with cls._shared_lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._session = session
+            return cls._session
     
     def configure(self, serp_api_key: str = None, brave_api_key: str = None):
         """Configure API keys"""
@@ -18,19 +255,22 @@ class WebSearchService:
             self.brave_api_key = brave_api_key
     
     def search_serpapi(self, query: str, num_results: int = 5) -> List[Dict]:
-        """Search using SerpAPI"""
+        """Search using SerpAPI (cached per normalized query)"""
         if not self.serp_api_key:
             raise ValueError("SerpAPI key not configured")
         
+        key = SearchResultCache.make_key("serpapi", query, num_results)
+        return self.cache.get_or_fetch(key, lambda: self._call("serpapi", self._fetch_serpapi, query, num_results))
+    
+    def _fetch_serpapi(self, query: str, num_results: int) -> List[Dict]:
         try:
-            url = "https://serpapi.com/search"
             params = {
                 "q": query,
                 "api_key": self.serp_api_key,
                 "num": num_results
             }
             
-            response = requests.get(url, params=params)
+            response = self.http.get(settings.SERPAPI_URL, params=params, timeout=self.timeout)
             response.raise_for_status()
             data = response.json()
             
@@ -46,15 +286,18 @@ class WebSearchService:
             
             return results
         except Exception as e:
-            raise Exception(f"SerpAPI search error: {str(e)}")
+            raise ProviderError(f"SerpAPI search error: {str(e)}", unhealthy=self._unhealthy(e))
     
     def search_brave(self, query: str, num_results: int = 5) -> List[Dict]:
-        """Search using Brave Search API"""
+        """Search using Brave Search API (cached per normalized query)"""
         if not self.brave_api_key:
             raise ValueError("Brave API key not configured")
         
+        key = SearchResultCache.make_key("brave", query, num_results)
+        return self.cache.get_or_fetch(key, lambda: self._call("brave", self._fetch_brave, query, num_results))
+    
+    def _fetch_brave(self, query: str, num_results: int) -> List[Dict]:
         try:
-            url = "https://api.search.brave.com/res/v1/web/search"
             headers = {
                 "Accept": "application/json",
                 "Accept-Encoding": "gzip",
@@ -65,7 +308,7 @@ class WebSearchService:
                 "count": num_results
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.http.get(settings.BRAVE_SEARCH_URL, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             data = response.json()
             
@@ -81,27 +324,105 @@ class WebSearchService:
             
             return results
         except Exception as e:
-            raise Exception(f"Brave search error: {str(e)}")
+            raise ProviderError(f"Brave search error: {str(e)}", unhealthy=self._unhealthy(e))
+    
+    @staticmethod
+    def _unhealthy(error: Exception) -> bool:
+        """Client errors other than rate limiting say nothing about provider health"""
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return status >= 500 or status == 429
+        return True
+    
+    def _call(self, provider: str, fetch: Callable[[str, int], List[Dict]], query: str, num_results: int) -> List[Dict]:
+        """One upstream call, guarded by the provider's circuit breaker and timed"""
+        breaker, latency = self._provider_state(provider)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{provider} circuit open")
+        started = time.perf_counter()
+        try:
+            results = fetch(query, num_results)
+        except ProviderError as e:
+            latency.observe((time.perf_counter() - started) * 1000, ok=False)
+            if e.unhealthy:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        latency.observe((time.perf_counter() - started) * 1000, ok=True)
+        breaker.record_success()
+        return results
+    
+    def _providers(self) -> List[Tuple[str, Callable[[str, int], List[Dict]]]]:
+        configured = {"serpapi": (self.serp_api_key, self.search_serpapi), "brave": (self.brave_api_key, self.search_brave)}
+        return [(name, configured[name][1]) for name in self.PROVIDERS if configured[name][0]]
+    
+    def _hedged(self, providers: List[Tuple[str, Callable]], query: str, num_results: int) -> List[Dict]:
+        """
+        Start the primary provider; start the next one if no answer arrived
+        within the hedge delay (or the primary failed), and take the first
+        success. Losers cannot be interrupted mid-request: queued ones are
+        cancelled, running ones finish within their timeouts and only warm
+        the cache.
+        """
+        pool = self._search_pool()
+        delay = settings.WEB_SEARCH_HEDGE_DELAY_MS / 1000
+        waiting = list(providers)
+        running: Dict[Future, str] = {}
+        next_start = 0.0
+        last_error: Optional[Exception] = None
+        with self._shared_lock:
+            self._hedges["searches"] += 1
+        
+        while running or waiting:
+            now = time.monotonic()
+            if waiting and (not running or now >= next_start):
+                name, search = waiting.pop(0)
+                running[pool.submit(search, query, num_results)] = name
+                next_start = now + delay
+                if len(waiting) < len(providers) - 1:
+                    with self._shared_lock:
+                        self._hedges["hedged"] += 1
+                continue
+            
+            timeout = max(0.0, next_start - now) if waiting else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                for other in running:
+                    other.cancel()
+                if name != providers[0][0]:
+                    with self._shared_lock:
+                        self._hedges["secondary_wins"] += 1
+                return results
+        raise last_error or ProviderError("No web search provider available")
     
     def search(self, query: str, num_results: int = 5) -> str:
         """Search and return formatted results"""
-        results = []
+        providers = self._providers()
+        if not providers:
+            return ""
         
-        # Try SerpAPI first, then Brave
         try:
-            if self.serp_api_key:
-                results = self.search_serpapi(query, num_results)
-            elif self.brave_api_key:
-                results = self.search_brave(query, num_results)
+            if settings.WEB_SEARCH_HEDGING and len(providers) > 1:
+                results = self._hedged(providers, query, num_results)
             else:
-                return ""
+                # Try SerpAPI first, then Brave
+                results = []
+                for i, (_, search) in enumerate(providers):
+                    try:
+                        results = search(query, num_results)
+                        break
+                    except Exception:
+                        if i == len(providers) - 1:
+                            raise
         except Exception:
-            # If one fails, try the other
-            try:
-                if self.brave_api_key:
-                    results = self.search_brave(query, num_results)
-            except Exception:
-                return ""
+            return ""
         
         if not results:
             return ""
@@ -112,3 +433,29 @@ class WebSearchService:
             formatted.append(f"{i}. {r['title']}\n   {r['snippet']}\n   Source: {r['link']}")
         
         return "\n\n".join(formatted)
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Result cache, hedging, circuit breaker and provider latency metrics"""
+        with cls._shared_lock:
+            hedges = dict(cls._hedges)
+            providers = list(cls._breakers)
+        return {
+            "cache": cls.shared_cache().stats(),
+            "hedging": hedges,
+            "providers": {
+                name: {**cls._latency[name].to_dict(), "breaker": cls._breakers[name].to_dict()}
+                for name in providers
+            }
+        }
+    
+    @classmethod
+    def shutdown(cls):
+        """Stop the provider call pool and close the fallback session"""
+        with cls._shared_lock:
+            pool, session = cls._pool, cls._session
+            cls._pool = cls._session = None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if session is not None:
+            session.close()
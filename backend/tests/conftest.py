@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Tests run against throwaway storage; set before config is imported
+DATA_DIR = tempfile.mkdtemp(prefix="genai-stack-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}"
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(DATA_DIR, "chroma")
+os.environ["UPLOAD_DIR"] = os.path.join(DATA_DIR, "uploads")
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(DATA_DIR, "lexical")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
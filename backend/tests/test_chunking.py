@@ -0,0 +1,132 @@
+import re
+
+import pytest
+
+from services.chunking import CharacterChunker, TokenChunker, create_chunker
+
+
+class WordTokenizer:
+    """One token per word or punctuation mark, with the tokenizer call signature the chunkers use"""
+    
+    PIECE_RE = re.compile(r"\w+|[^\w\s]")
+    
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, **kwargs):
+        matches = list(self.PIECE_RE.finditer(text))
+        encoding = {"input_ids": list(range(len(matches)))}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = [match.span() for match in matches]
+        return encoding
+
+
+def count_tokens(text):
+    return len(WordTokenizer.PIECE_RE.findall(text))
+
+
+def sentences(count, words=5, start=0):
+    return " ".join(
+        " ".join(f"w{i}x{j}" for j in range(words - 1)) + f" end{i}."
+        for i in range(start, start + count)
+    )
+
+
+def test_chunks_stay_within_max_tokens():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=20, overlap_tokens=0)
+    
+    chunks = list(chunker.chunk([(1, sentences(30))]))
+    
+    assert len(chunks) > 1
+    assert all(chunk["tokens"] <= 20 for chunk in chunks)
+    assert all(chunk["tokens"] == count_tokens(chunk["text"]) for chunk in chunks)
+    assert chunker.stats.to_dict()["chunk_count"] == len(chunks)
+    assert chunker.stats.over_limit == 0
+
+
+def test_chunks_end_on_sentence_boundaries():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=20, overlap_tokens=0)
+    
+    chunks = list(chunker.chunk([(1, sentences(30))]))
+    
+    assert all(chunk["text"].endswith(".") for chunk in chunks)
+    assert " ".join(chunk["text"] for chunk in chunks) == sentences(30)
+
+
+def test_overlap_repeats_trailing_sentences():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=20, overlap_tokens=6)
+    
+    first, second = list(chunker.chunk([(1, sentences(5))]))[:2]
+    
+    last_sentence = first["text"].rsplit(". ", 1)[-1]
+    assert second["text"].startswith(last_sentence)
+
+
+def test_long_sentence_is_split_on_token_boundaries():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=10, overlap_tokens=0)
+    text = " ".join(f"word{i}" for i in range(35)) + "."
+    
+    chunks = list(chunker.chunk([(1, text)]))
+    
+    assert [chunk["tokens"] for chunk in chunks] == [10, 10, 10, 6]
+    assert " ".join(chunk["text"] for chunk in chunks) == text
+
+
+def test_headings_start_a_chunk_and_label_the_following_ones():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=200, overlap_tokens=0)
+    text = f"Intro text here.\n\n# Install\n\n{sentences(2)}\n\n## Configure\n\n{sentences(2, start=5)}"
+    
+    chunks = list(chunker.chunk([(1, text)]))
+    
+    assert [chunk["section"] for chunk in chunks] == [None, "Install", "Configure"]
+    assert chunks[1]["text"].startswith("# Install")
+    assert chunks[2]["text"].startswith("## Configure")
+
+
+def test_page_numbers_follow_the_text():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=25, overlap_tokens=0)
+    pages = [(1, sentences(4) + "\n\n"), (2, sentences(4, start=10) + "\n\n"), (3, sentences(4, start=20))]
+    
+    chunks = list(chunker.chunk(pages))
+    
+    assert chunks[0]["page_start"] == 1
+    assert chunks[-1]["page_end"] == 3
+    assert all(chunk["page_start"] <= chunk["page_end"] for chunk in chunks)
+    assert any("end10." in chunk["text"] and chunk["page_start"] == 2 for chunk in chunks)
+
+
+def test_paragraph_split_across_pages_is_kept_together():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=200, overlap_tokens=0)
+    
+    chunks = list(chunker.chunk([(1, "First half of a"), (2, " sentence.\n\nNext paragraph.")]))
+    
+    assert chunks[0]["text"] == "First half of a sentence.\n\nNext paragraph."
+    assert (chunks[0]["page_start"], chunks[0]["page_end"]) == (1, 2)
+
+
+def test_empty_input_yields_no_chunks():
+    chunker = TokenChunker(WordTokenizer())
+    
+    assert list(chunker.chunk([(1, ""), (2, "  \n\n  ")])) == []
+
+
+def test_create_chunker_clamps_max_tokens_to_the_model_limit():
+    chunker = create_chunker("tokens", WordTokenizer(), 128, {"max_tokens": 1000, "overlap_tokens": 16})
+    
+    assert isinstance(chunker, TokenChunker)
+    assert chunker.max_tokens == 128
+    assert chunker.overlap_tokens == 16
+    assert create_chunker("tokens", WordTokenizer(), 128, {"max_tokens": None}).max_tokens == 128
+
+
+def test_create_chunker_rejects_unknown_strategies():
+    with pytest.raises(ValueError):
+        create_chunker("paragraphs", WordTokenizer(), 128)
+
+
+def test_character_chunker_reports_token_counts():
+    chunker = create_chunker("characters", WordTokenizer(), 128)
+    
+    chunks = list(chunker.chunk([(1, sentences(100))]))
+    
+    assert isinstance(chunker, CharacterChunker)
+    assert len(chunks) > 1
+    assert all(chunk["tokens"] == count_tokens(chunk["text"]) for chunk in chunks)
+    assert all(chunk["section"] is None for chunk in chunks)
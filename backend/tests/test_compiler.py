@@ -0,0 +1,135 @@
+import pytest
+
+from engine.compiler import PlanCache, WorkflowValidationError, compile_workflow, validate_workflow
+
+
+def node(node_id, node_type, **data):
+    return {"id": node_id, "type": node_type, "data": data}
+
+
+def edge(source, target):
+    return {"source": source, "target": target}
+
+
+def rag_workflow():
+    """query -> two knowledge bases -> LLM -> output"""
+    return {
+        "nodes": [
+            node("out", "output"),
+            node("llm", "llmEngine", model="gemini-2.5-flash"),
+            node("kb2", "knowledgeBase", collectionName="doc_b"),
+            node("kb1", "knowledgeBase", collectionName="doc_a"),
+            node("query", "userQuery"),
+        ],
+        "edges": [
+            edge("query", "kb1"),
+            edge("query", "kb2"),
+            edge("kb1", "llm"),
+            edge("kb2", "llm"),
+            edge("llm", "out"),
+        ],
+    }
+
+
+def test_order_is_topological_and_follows_definition_order():
+    plan = compile_workflow(rag_workflow())
+    
+    assert plan.order == ("query", "kb2", "kb1", "llm", "out")
+    assert plan.positions["query"] == 0
+    assert plan.nodes_of_type("knowledgeBase") == ["kb2", "kb1"]
+
+
+def test_order_does_not_depend_on_edge_order():
+    definition = rag_workflow()
+    reversed_edges = dict(definition, edges=list(reversed(definition["edges"])))
+    
+    assert compile_workflow(definition).order == compile_workflow(reversed_edges).order
+
+
+def test_llm_node_waits_for_every_context_writer_before_it():
+    definition = rag_workflow()
+    # kb2 no longer feeds the LLM directly, but still writes the shared context
+    definition["edges"] = [e for e in definition["edges"] if e != edge("kb2", "llm")]
+    
+    plan = compile_workflow(definition)
+    
+    assert plan.dependencies["llm"] == {"kb1", "kb2", "query"}
+    assert plan.ancestors["out"] == {"query", "kb1", "kb2", "llm"}
+    assert plan.ancestors["kb1"] == {"query"}
+
+
+def test_node_data_is_read_only():
+    plan = compile_workflow(rag_workflow())
+    
+    with pytest.raises(TypeError):
+        plan.node_data("llm")["model"] = "other"
+
+
+def test_cycle_between_integer_ids_is_a_validation_error():
+    definition = {
+        "nodes": [node(1, "llmEngine"), node(2, "output")],
+        "edges": [edge(1, 2), edge(2, 1)],
+    }
+    
+    assert validate_workflow(definition) == ["Workflow contains a cycle involving: 1, 2"]
+
+
+@pytest.mark.parametrize("data", [[1], "text", 3])
+def test_node_data_must_be_an_object(data):
+    definition = rag_workflow()
+    definition["nodes"][1]["data"] = data
+    
+    assert validate_workflow(definition) == ["Node llm data must be an object"]
+
+
+@pytest.mark.parametrize("definition, message", [
+    ([], "Workflow definition must be an object"),
+    ({"nodes": {"a": {}}, "edges": []}, "Workflow nodes and edges must be lists"),
+    ({"nodes": [], "edges": "a->b"}, "Workflow nodes and edges must be lists"),
+])
+def test_malformed_definitions(definition, message):
+    assert validate_workflow(definition) == [message]
+
+
+def test_every_problem_is_reported():
+    definition = {
+        "nodes": [
+            node("a", "userQuery"),
+            node("a", "output"),
+            node("b", "mystery"),
+            {"type": "output"},
+        ],
+        "edges": ["a->b", edge("a", "missing"), edge({"id": "a"}, "b")],
+    }
+    
+    errors = validate_workflow(definition)
+    
+    assert "Duplicate node id: a" in errors
+    assert "Unknown node type 'mystery' for node b" in errors
+    assert "Node without an id" in errors
+    assert "Malformed edge: a->b" in errors
+    assert "Edge a -> missing references missing node(s): missing" in errors
+    assert "Edge {'id': 'a'} -> b references missing node(s): {'id': 'a'}" in errors
+    assert "Workflow must include an LLM Engine node" in errors
+    assert "Workflow must include an Output node" in errors
+
+
+def test_incomplete_workflows_can_be_saved():
+    definition = {"nodes": [node("query", "userQuery")], "edges": []}
+    
+    assert validate_workflow(definition, require_complete=False) == []
+    with pytest.raises(WorkflowValidationError):
+        compile_workflow(definition)
+
+
+def test_plan_cache_reuses_plans_by_content():
+    cache = PlanCache(max_size=1)
+    
+    first = cache.get_plan(rag_workflow())
+    assert cache.get_plan(rag_workflow()) is first
+    
+    other = rag_workflow()
+    other["nodes"][1]["data"]["model"] = "gemini-2.5-pro"
+    assert cache.get_plan(other) is not first
+    assert cache.get_plan(rag_workflow()) is not first  # evicted
+    assert (cache.hits, cache.misses) == (1, 3)
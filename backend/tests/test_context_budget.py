@@ -0,0 +1,142 @@
+import pytest
+
+from config import settings
+from services.context_budget import ContextBudgetManager, TRUNCATION_MARK, model_token_budget, overlap_length
+
+
+def manager(budget, **kwargs):
+    # One character per token keeps the arithmetic readable
+    kwargs.setdefault("history_share", 0.25)
+    kwargs.setdefault("web_share", 0.25)
+    return ContextBudgetManager(budget, chars_per_token=1, min_truncated_tokens=10, **kwargs)
+
+
+def kb(filename, *chunks, collection="doc_a"):
+    return {
+        "filename": filename,
+        "chunks": [
+            {"text": text, "metadata": {"collection_name": collection, "chunk_index": index}}
+            for index, text in chunks
+        ],
+    }
+
+
+def test_model_budget_prefers_override_then_table_then_default(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_MODEL_BUDGETS", "gemini-2.5-flash=9000, gpt-4o-mini=5000")
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 3000)
+    
+    assert model_token_budget("gpt-4o-mini", override="1200") == 1200
+    assert model_token_budget("gpt-4o-mini", override="lots") == 5000
+    assert model_token_budget("gemini-2.5-flash") == 9000
+    assert model_token_budget("unknown-model") == 3000
+
+
+def test_overlap_length_needs_a_real_suffix_prefix_match():
+    shared = "the quick brown fox jumps over"
+    
+    assert overlap_length("Intro. " + shared, shared + " the lazy dog") == len(shared)
+    assert overlap_length("short tail", "short tail and more") == 0
+    assert overlap_length("Intro. " + shared, "something else entirely, no overlap") == 0
+
+
+def test_truncate_prefers_a_sentence_end():
+    text = "First sentence is here. Second sentence runs on for a while longer."
+    
+    cut = manager(100).truncate(text, 40)
+    
+    assert cut == "First sentence is here." + TRUNCATION_MARK
+    assert manager(100).truncate(text, 200) == text
+
+
+def test_small_inputs_are_sent_unchanged():
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    
+    packed = manager(1000).pack("query", [kb("a.txt", (0, "alpha"))], "web", history)
+    
+    assert packed.chat_history == history
+    assert packed.web_results == "web"
+    assert "--- Document 1: a.txt ---\nalpha" in packed.kb_context
+    assert packed.report["over_budget"] is False
+    assert packed.report["dropped"] == []
+
+
+def test_history_keeps_the_newest_messages_that_fit():
+    history = [{"role": "user", "content": "x" * 40} for _ in range(5)]
+    
+    # 100 tokens of history share at 42 tokens per message
+    packed = manager(400).pack("", [kb("a.txt", (0, "y" * 350))], chat_history=history)
+    
+    assert packed.chat_history == history[-2:]
+    assert packed.report["history_messages"] == "2/5"
+    assert {"source": "chat history", "messages": 3, "reason": "budget"} in packed.report["dropped"]
+
+
+def test_unused_knowledge_base_budget_goes_to_older_history():
+    history = [{"role": "user", "content": "x" * 40} for _ in range(5)]
+    
+    packed = manager(400).pack("", [kb("a.txt", (0, "short"))], chat_history=history)
+    
+    assert packed.chat_history == history
+
+
+def test_web_results_are_capped_at_their_share():
+    packed = manager(400).pack("", [], web_results="word " * 100)
+    
+    assert len(packed.web_results) <= 100
+    assert packed.web_results.endswith(TRUNCATION_MARK)
+    assert packed.report["dropped"][0]["source"] == "web search"
+
+
+def test_chunks_are_interleaved_by_rank_and_dropped_past_the_budget():
+    kb_contexts = [
+        kb("a.txt", (0, "a" * 60), (5, "A" * 60)),
+        kb("b.txt", (0, "b" * 60), (5, "B" * 60), collection="doc_b"),
+    ]
+    
+    packed = manager(225, history_share=0, web_share=0).pack("", kb_contexts)
+    
+    assert "a" * 60 in packed.kb_context and "b" * 60 in packed.kb_context
+    assert "A" * 60 not in packed.kb_context and "B" * 60 not in packed.kb_context
+    assert packed.report["kb_chunks"] == "2/4"
+    assert packed.report["tokens_used"] <= 225
+
+
+def test_duplicate_chunks_are_sent_once():
+    kb_contexts = [kb("a.txt", (0, "same text here")), kb("b.txt", (3, "same   text here"), collection="doc_b")]
+    
+    packed = manager(1000).pack("", kb_contexts)
+    
+    assert packed.report["kb_duplicates"] == 1
+    assert packed.kb_context.count("same") == 1
+    assert "Document 2" not in packed.kb_context
+
+
+def test_adjacent_chunks_share_their_overlap():
+    overlap = "and this sentence is repeated across the boundary."
+    first = "Opening sentence of the document. " + overlap
+    second = overlap + " Then the document continues."
+    
+    packed = manager(1000).pack("", [kb("a.txt", (1, second), (0, first))])
+    
+    assert packed.report["kb_overlap_chars_removed"] == len(overlap)
+    assert packed.kb_context.count(overlap) == 1
+    assert "Opening sentence of the document. " + overlap + " Then the document continues." in packed.kb_context
+
+
+def test_first_chunk_that_does_not_fit_is_truncated():
+    text = "Sentence number one is fine. " * 10
+    
+    packed = manager(200, history_share=0, web_share=0).pack("", [kb("a.txt", (0, text))])
+    
+    assert packed.kb_context.rstrip().endswith(TRUNCATION_MARK.strip())
+    assert packed.report["dropped"][0]["reason"] == "truncated"
+    assert packed.report["tokens_used"] <= 200
+
+
+@pytest.mark.parametrize("fixed", [{"system_prompt": "s" * 300}, {"query_template": "t" * 300}])
+def test_fixed_parts_are_always_sent_and_reported(fixed):
+    packed = manager(200).pack("query", [kb("a.txt", (0, "alpha"))], **fixed)
+    
+    assert packed.kb_context == ""
+    assert packed.report["sections"]["fixed"] == 305
+    assert packed.report["over_budget"] is True
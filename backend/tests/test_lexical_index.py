@@ -0,0 +1,100 @@
+import pytest
+
+from services.lexical_index import BM25Index, LexicalIndexStore, reciprocal_rank_fusion, tokenize
+
+
+TEXTS = [
+    "The deploy failed with ERR-404 while fetching the manifest.",
+    "Restart the worker after changing the queue configuration.",
+    "The manifest lists every package and its version v1.2.3.",
+    "Unrelated notes about lunch.",
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LexicalIndexStore(str(tmp_path / "lexical"), cache_size=2)
+
+
+def metadatas(count):
+    return [{"chunk_index": i} for i in range(count)]
+
+
+def test_tokenize_keeps_compound_identifiers_whole_and_by_part():
+    assert tokenize("Got ERR-404 in v1.2.3 of foo_bar") == [
+        "got", "err-404", "err", "404", "in", "v1.2.3", "v1", "2", "3", "of", "foo_bar", "foo", "bar"
+    ]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=60)
+    
+    assert [key for key, _ in fused] == ["b", "c", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_bm25_ranks_rarer_and_repeated_terms_higher(tmp_path):
+    BM25Index.write(str(tmp_path), TEXTS, metadatas(len(TEXTS)))
+    index = BM25Index(str(tmp_path))
+    
+    results = index.search("manifest ERR-404", n_results=10)
+    
+    assert [chunk_id for chunk_id, _ in results] == [0, 2]
+    assert results[0][1] > results[1][1] > 0
+    assert index.text(1) == TEXTS[1]
+
+
+def test_bm25_limits_results_and_ignores_unknown_terms(tmp_path):
+    BM25Index.write(str(tmp_path), TEXTS, metadatas(len(TEXTS)))
+    index = BM25Index(str(tmp_path))
+    
+    assert len(index.search("the", n_results=2)) == 2
+    assert index.search("kubernetes", n_results=5) == []
+
+
+def test_empty_index_returns_nothing(tmp_path):
+    BM25Index.write(str(tmp_path), [], [])
+    
+    assert BM25Index(str(tmp_path)).search("anything", n_results=5) == []
+
+
+def test_store_searches_across_collections_best_first(store):
+    store.build("doc_a", TEXTS[:2], metadatas(2))
+    store.build("doc_b", TEXTS[2:], metadatas(2))
+    
+    result = store.search(["doc_a", "doc_b"], "manifest version", n_results=5)
+    
+    assert result["documents"][0][0] == TEXTS[2]
+    assert [meta["collection_name"] for meta in result["metadatas"][0]] == ["doc_b", "doc_a"]
+    assert result["scores"][0] == sorted(result["scores"][0], reverse=True)
+
+
+def test_store_rebuild_replaces_the_index(store):
+    store.build("doc_a", TEXTS[:1], metadatas(1))
+    assert store.search(["doc_a"], "manifest")["documents"][0]
+    
+    store.build("doc_a", TEXTS[1:2], metadatas(1))
+    
+    assert store.search(["doc_a"], "manifest")["documents"][0] == []
+    assert store.search(["doc_a"], "worker")["documents"][0] == [TEXTS[1]]
+
+
+def test_store_hides_other_users_indexes(store):
+    store.build("doc_a", TEXTS, metadatas(len(TEXTS)), user_id=1)
+    
+    assert store.search(["doc_a"], "manifest", user_id=2) is None
+    assert store.search(["doc_a"], "manifest", user_id=1)["documents"][0]
+
+
+def test_store_without_indexes_returns_none(store):
+    store.build("doc_a", TEXTS, metadatas(len(TEXTS)))
+    store.delete("doc_a")
+    
+    assert not store.has("doc_a")
+    assert store.search(["doc_a", "doc_missing"], "manifest") is None
+
+
+def test_store_rejects_unsafe_collection_names(store):
+    with pytest.raises(ValueError):
+        store.build("../escape", TEXTS, metadatas(len(TEXTS)))
+    assert not store.has("../escape")
@@ -0,0 +1,197 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SessionLocal, init_db
+from engine.compiler import compile_workflow
+from engine.executor import WorkflowExecutor
+from models.document import Document
+from models.ingestion_job import IngestionJob
+from services.response_cache import ResponseCache, normalize_query
+
+
+EMBEDDINGS = {
+    "how do i reset my password": [1.0, 0.0, 0.0],
+    "how can i reset my password": [0.95, 0.05, 0.0],
+    "what is the refund policy": [0.0, 1.0, 0.0],
+}
+
+
+def embed(query):
+    return EMBEDDINGS[normalize_query(query).rstrip("?")]
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def add_document(db, user_id=1, indexed=True):
+    document = Document(user_id=user_id, filename="a.txt", collection_name=f"doc_{uuid.uuid4().hex}")
+    db.add(document)
+    db.commit()
+    if indexed:
+        db.add(IngestionJob(
+            id=str(uuid.uuid4()), user_id=user_id, document_id=document.id,
+            filename="a.txt", collection_name=document.collection_name, status="ready"
+        ))
+        db.commit()
+    return document
+
+
+def workflow(collection_name="doc_a", **llm_data):
+    return {
+        "nodes": [
+            {"id": "query", "type": "userQuery", "data": {}},
+            {"id": "kb", "type": "knowledgeBase", "data": {"collectionName": collection_name}},
+            {"id": "llm", "type": "llmEngine", "data": dict({"model": "gemini-2.5-flash", "cacheResponses": True}, **llm_data)},
+            {"id": "out", "type": "output", "data": {}},
+        ],
+        "edges": [
+            {"source": "query", "target": "kb"},
+            {"source": "kb", "target": "llm"},
+            {"source": "llm", "target": "out"},
+        ],
+    }
+
+
+def scope(definition, user_id=1, history=(), memory=""):
+    executor = WorkflowExecutor(
+        embedding_service=object(), vector_store=object(), llm_service=object(),
+        web_search_service=object(), response_cache=ResponseCache()
+    )
+    context = {"chat_history": list(history), "conversation_memory": memory}
+    return executor._response_cache_scope(compile_workflow(definition), context, user_id)
+
+
+def test_exact_match_ignores_case_and_whitespace():
+    cache = ResponseCache()
+    cache.put("s", "What is  the refund policy?", "30 days")
+    
+    hit = cache.get("s", "  what is the REFUND policy? ")
+    
+    assert hit.response == "30 days"
+    assert hit.match == "exact"
+    assert cache.get("other", "What is the refund policy?") is None
+
+
+def test_semantic_match_uses_the_threshold():
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.put("s", "How do I reset my password?", "Use the link", embed=embed)
+    
+    hit = cache.get("s", "How can I reset my password?", embed=embed)
+    
+    assert hit.match == "semantic"
+    assert hit.similarity > 0.9
+    assert cache.get("s", "What is the refund policy?", embed=embed) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_exact_lookups_do_not_embed():
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.put("s", "How do I reset my password?", "Use the link", embed=embed)
+    
+    def fail(query):
+        raise AssertionError("embedded an exact hit")
+    
+    assert cache.get("s", "how do i reset my password?", embed=fail).match == "exact"
+
+
+def test_entries_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("services.response_cache.time.monotonic", lambda: clock[0])
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put("s", "q", "a")
+    
+    clock[0] += 61
+    
+    assert cache.get("s", "q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("s", "first", "1")
+    cache.put("s", "second", "2")
+    cache.get("s", "first")
+    
+    cache.put("s", "third", "3")
+    
+    assert cache.get("s", "second") is None
+    assert cache.get("s", "first").response == "1"
+
+
+def test_scope_size_is_capped_per_scope():
+    cache = ResponseCache(max_scope_entries=1)
+    cache.put("a", "first", "1")
+    cache.put("b", "first", "1")
+    
+    cache.put("a", "second", "2")
+    
+    assert cache.get("a", "first") is None
+    assert cache.get("b", "first").response == "1"
+
+
+def test_invalidate_collection_drops_dependent_entries():
+    cache = ResponseCache()
+    cache.put("s", "uses a", "1", collections=["doc_a"])
+    cache.put("s", "uses a and b", "2", collections=["doc_a", "doc_b"])
+    cache.put("s", "uses b", "3", collections=["doc_b"])
+    
+    assert cache.invalidate_collection("doc_a") == 2
+    
+    assert cache.get("s", "uses b").response == "3"
+    assert cache.stats()["invalidated"] == 2
+    assert cache.stats()["hit_rate"] == 1.0
+
+
+def test_collection_versions_follow_reingestion_and_ownership(db):
+    document = add_document(db, user_id=1)
+    pending = add_document(db, user_id=1, indexed=False)
+    name = document.collection_name
+    before = ResponseCache.collection_versions([name, pending.collection_name, "doc_gone"], user_id=1)
+    
+    db.add(IngestionJob(
+        id=str(uuid.uuid4()), user_id=1, document_id=document.id, filename="a.txt",
+        collection_name=name, status="ready", updated_at=datetime.now() + timedelta(hours=1)
+    ))
+    db.commit()
+    
+    assert before[name].startswith(f"{document.id}:")
+    assert before[pending.collection_name] == f"{pending.id}:0"
+    assert before["doc_gone"] == "missing"
+    assert ResponseCache.collection_versions([name], user_id=1)[name] != before[name]
+    assert ResponseCache.collection_versions([name], user_id=2) == {name: "missing"}
+
+
+def test_workflow_scope_is_shared_across_users_and_conversations(db):
+    name = add_document(db, user_id=1).collection_name
+    
+    key, collections = scope(workflow(name), history=[{"role": "user", "content": "hi"}])
+    
+    assert collections == [name]
+    assert scope(workflow(name), history=[], memory="earlier")[0] == key
+    assert scope(workflow(name), user_id=2)[0] != key  # not the owner's document
+    assert scope(workflow(name, temperature=0.2))[0] != key
+    assert scope(workflow(name, systemPrompt="Be brief"))[0] != key
+
+
+def test_conversation_scope_keys_on_user_and_history(db):
+    name = add_document(db, user_id=1).collection_name
+    definition = workflow(name, cacheScope="conversation")
+    history = [{"role": "user", "content": "hi"}]
+    
+    key = scope(definition, history=history)[0]
+    
+    assert scope(definition, history=history)[0] == key
+    assert scope(definition, history=[])[0] != key
+    assert scope(definition, history=history, memory="summary")[0] != key
+
+
+@pytest.mark.parametrize("llm_data", [{"cacheResponses": False}, {"enableWebSearch": True}])
+def test_uncacheable_workflows_have_no_scope(llm_data):
+    assert scope(workflow(**llm_data)) is None
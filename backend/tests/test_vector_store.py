@@ -0,0 +1,99 @@
+import uuid
+
+import chromadb
+import pytest
+from chromadb.config import Settings as ChromaSettings
+
+from services.vector_store import VectorStoreService
+
+
+@pytest.fixture(params=["per_document", "shared"])
+def store(request):
+    client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+    return VectorStoreService(client=client, mode=request.param, shared_scope="user")
+
+
+@pytest.fixture
+def collection_name():
+    # Ephemeral clients share one in-memory system per process
+    return f"doc_{uuid.uuid4().hex}"
+
+
+def vector(seed):
+    return [float(seed), 1.0, 0.5]
+
+
+def chunks(texts, hashes=None):
+    hashes = hashes or [text.lower().replace(" ", "") for text in texts]
+    metadatas = [{"chunk_index": i, "filename": "a.txt", "content_hash": key} for i, key in enumerate(hashes)]
+    return texts, [vector(i) for i in range(len(texts))], metadatas
+
+
+def stored(store, collection_name, user_id=1):
+    result = store.get_document_chunks(collection_name, user_id, include=["documents", "metadatas"])
+    return {
+        meta["content_hash"]: (chunk_id, text, meta["chunk_index"])
+        for chunk_id, text, meta in zip(result["ids"], result["documents"], result["metadatas"])
+    }
+
+
+def test_first_sync_adds_every_chunk(store, collection_name):
+    texts, embeddings, metadatas = chunks(["alpha", "beta", "gamma"])
+    
+    diff = store.sync_chunks(collection_name, texts, embeddings, metadatas, user_id=1)
+    
+    assert diff == {"added": 3, "kept": 0, "removed": 0}
+    assert sorted(text for _, text, _ in stored(store, collection_name).values()) == ["alpha", "beta", "gamma"]
+
+
+def test_resync_keeps_unchanged_chunks_and_replaces_the_rest(store, collection_name):
+    store.sync_chunks(collection_name, *chunks(["alpha", "beta", "gamma"]), user_id=1)
+    before = stored(store, collection_name)
+    
+    diff = store.sync_chunks(collection_name, *chunks(["delta", "alpha", "gamma"]), user_id=1)
+    after = stored(store, collection_name)
+    
+    assert diff == {"added": 1, "kept": 2, "removed": 1}
+    assert set(after) == {"delta", "alpha", "gamma"}
+    assert after["alpha"][0] == before["alpha"][0]
+    assert after["alpha"][2] == 1  # metadata follows the new position
+
+
+def test_kept_chunks_get_the_new_text(store, collection_name):
+    store.sync_chunks(collection_name, *chunks(["about NASA launches"], hashes=["k"]), user_id=1)
+    
+    diff = store.sync_chunks(collection_name, *chunks(["about NASA   launches"], hashes=["k"]), user_id=1)
+    
+    assert diff == {"added": 0, "kept": 1, "removed": 0}
+    assert stored(store, collection_name)["k"][1] == "about NASA   launches"
+
+
+def test_duplicate_chunks_are_matched_one_to_one(store, collection_name):
+    store.sync_chunks(collection_name, *chunks(["same", "same"]), user_id=1)
+    
+    diff = store.sync_chunks(collection_name, *chunks(["same", "same", "same"]), user_id=1)
+    
+    assert diff == {"added": 1, "kept": 2, "removed": 0}
+
+
+def test_chunks_without_a_content_hash_are_replaced(store, collection_name):
+    texts, embeddings, metadatas = chunks(["legacy"])
+    del metadatas[0]["content_hash"]
+    store.add_documents(collection_name, texts, embeddings, metadatas, user_id=1)
+    
+    diff = store.sync_chunks(collection_name, *chunks(["legacy"]), user_id=1)
+    
+    assert diff == {"added": 1, "kept": 0, "removed": 1}
+
+
+def test_shared_mode_keeps_documents_apart():
+    client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+    store = VectorStoreService(client=client, mode="shared", shared_scope="global")
+    first, second = f"doc_{uuid.uuid4().hex}", f"doc_{uuid.uuid4().hex}"
+    store.sync_chunks(first, *chunks(["alpha", "beta"]), user_id=1)
+    store.sync_chunks(second, *chunks(["alpha"]), user_id=2)
+    
+    diff = store.sync_chunks(first, *chunks(["beta"]), user_id=1)
+    
+    assert diff == {"added": 0, "kept": 1, "removed": 1}
+    assert set(stored(store, second, user_id=2)) == {"alpha"}
@@ -28,6 +28,56 @@ export const documentsApi = {
       throw new Error(error.detail || 'Upload failed');
     }
     
+    return documentsApi.waitForJob(await response.json());
+  },
+  
+  update: async (id, file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    const response = await fetch(`${API_BASE_URL}/documents/${id}`, {
+      method: 'PUT',
+      headers: getAuthHeaders(),
+      body: formData,
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Update failed');
+    }
+    
+    return documentsApi.waitForJob(await response.json());
+  },
+  
+  // Processing runs in the background; poll the ingestion job until it finishes
+  waitForJob: async (job) => {
+    while (job.status !== 'ready' && job.status !== 'failed') {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = await documentsApi.getJob(job.id);
+    }
+    
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Document processing failed');
+    }
+    
+    return {
+      id: job.document_id,
+      filename: job.filename,
+      collection_name: job.collection_name,
+      chunks_count: job.chunks_total,
+      chunk_stats: job.chunk_stats,
+      chunk_diff: job.chunk_diff,
+    };
+  },
+  
+  getJob: async (jobId) => {
+    const response = await fetch(`${API_BASE_URL}/documents/jobs/${jobId}`, {
+      headers: getAuthHeaders(),
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Failed to fetch job status');
+    }
     return response.json();
   },
   
@@ -58,6 +108,12 @@ export const workflowsApi = {
       },
       body: JSON.stringify(workflow),
     });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Save failed');
+    }
+    
     return response.json();
   },
   
@@ -84,6 +140,12 @@ export const workflowsApi = {
       },
       body: JSON.stringify(workflow),
     });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Save failed');
+    }
+    
     return response.json();
   },
   
@@ -122,8 +184,12 @@ export const chatApi = {
     return response.json();
   },
   
-  getHistory: async (workflowId) => {
-    const response = await fetch(`${API_BASE_URL}/chat/history/${workflowId}`, {
+  getHistory: async (workflowId, { limit = null, before = null } = {}) => {
+    const params = new URLSearchParams();
+    if (limit) params.set('limit', limit);
+    if (before) params.set('before', before);
+    const query = params.toString() ? `?${params}` : '';
+    const response = await fetch(`${API_BASE_URL}/chat/history/${workflowId}${query}`, {
       headers: getAuthHeaders(),
     });
     return response.json();
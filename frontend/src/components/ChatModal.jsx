@@ -1,20 +1,31 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { chatApi } from '../api/client';
 
+// Turns loaded per page of saved chat history
+const HISTORY_PAGE_TURNS = 50;
+
 export default function ChatModal({ isOpen, onClose, workflow, config, workflowId }) {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [historyLoaded, setHistoryLoaded] = useState(false);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [executionLogs, setExecutionLogs] = useState([]);
   const [showLogs, setShowLogs] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
   useEffect(() => {
+    // Earlier pages are prepended; keep the reader where they were
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -29,6 +40,7 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
   useEffect(() => {
     if (!isOpen) {
       setHistoryLoaded(false);
+      setHasOlder(false);
       setExecutionLogs([]);
       setShowLogs(false);
     }
@@ -36,10 +48,11 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
 
   const loadChatHistory = async () => {
     try {
-      const history = await chatApi.getHistory(workflowId);
+      const history = await chatApi.getHistory(workflowId, { limit: HISTORY_PAGE_TURNS });
       if (history && history.length > 0) {
         setMessages(history);
       }
+      setHasOlder(Array.isArray(history) && history.length >= HISTORY_PAGE_TURNS * 2);
       setHistoryLoaded(true);
     } catch (error) {
       console.error('Failed to load chat history:', error);
@@ -47,6 +60,27 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
     }
   };
 
+  const loadOlderHistory = async () => {
+    const oldest = messages.find((message) => message.chat_log_id);
+    if (!oldest || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const page = await chatApi.getHistory(workflowId, {
+        limit: HISTORY_PAGE_TURNS,
+        before: oldest.chat_log_id,
+      });
+      if (Array.isArray(page)) {
+        skipScrollRef.current = true;
+        setMessages((prev) => [...page, ...prev]);
+        setHasOlder(page.length >= HISTORY_PAGE_TURNS * 2);
+      }
+    } catch (error) {
+      console.error('Failed to load earlier messages:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!input.trim() || loading) return;
@@ -61,9 +95,10 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
     setLoading(true);
 
     try {
-      // Send the current message history (excluding the just-added user message) as chat_history
-      // Also pass workflowId to persist the chat
-      const result = await chatApi.execute(workflow, userMessage, config, messages, workflowId);
+      // Saved chats (workflowId) let the server build the context from the
+      // stored conversation, since only its newest page is loaded here;
+      // unsaved chats send the current message history as chat_history
+      const result = await chatApi.execute(workflow, userMessage, config, workflowId ? null : messages, workflowId);
       
       // Store execution logs
       if (result.logs && result.logs.length > 0) {
@@ -92,6 +127,7 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
     try {
       await chatApi.clearHistory(workflowId);
       setMessages([]);
+      setHasOlder(false);
       setExecutionLogs([]);
     } catch (error) {
       console.error('Failed to clear history:', error);
@@ -197,6 +233,12 @@ export default function ChatModal({ isOpen, onClose, workflow, config, workflowI
 
           {/* Chat Messages */}
           <div className="chat-messages">
+            {hasOlder && (
+              <button className="btn-load-older" onClick={loadOlderHistory} disabled={loadingOlder}>
+                {loadingOlder ? 'Loading...' : 'Load earlier messages'}
+              </button>
+            )}
+
             {messages.length === 0 && (
               <div className="chat-message assistant">
                 <div className="message-avatar assistant">🤖</div>
@@ -97,6 +97,60 @@ export default function ConfigPanel({ selectedNode, onNodeUpdate, config, onConf
         </select>
       </div>
 
+      <div className="form-group">
+        <label className="form-label">Retrieval Mode</label>
+        <select
+          className="form-input form-select"
+          value={data.retrievalMode || ''}
+          onChange={(e) => handleChange('retrievalMode', e.target.value || null)}
+        >
+          <option value="">Server default (vector only unless configured)</option>
+          <option value="dense">Vector only</option>
+          <option value="hybrid">Hybrid (vector + keyword)</option>
+          <option value="sparse">Keyword only (BM25)</option>
+        </select>
+        <p className="form-hint">Keyword matching helps with exact terms like error codes, SKUs and function names.</p>
+      </div>
+
+      <div className="form-group">
+        <label className="form-label">Chunks to Retrieve</label>
+        <input
+          type="number"
+          className="form-input"
+          min="1"
+          max="50"
+          value={data.topK || 5}
+          onChange={(e) => handleChange('topK', parseInt(e.target.value, 10) || 5)}
+        />
+      </div>
+
+      <div className="form-group form-toggle">
+        <label className="form-label">Rerank Results</label>
+        <label className="toggle-switch">
+          <input
+            type="checkbox"
+            checked={data.rerank || false}
+            onChange={(e) => handleChange('rerank', e.target.checked)}
+          />
+          <span className="toggle-slider"></span>
+        </label>
+      </div>
+
+      {data.rerank && (
+        <div className="form-group">
+          <label className="form-label">Rerank Candidates</label>
+          <input
+            type="number"
+            className="form-input"
+            min="5"
+            max="200"
+            value={data.rerankCandidates || 50}
+            onChange={(e) => handleChange('rerankCandidates', parseInt(e.target.value, 10) || 50)}
+          />
+          <p className="form-hint">A cross-encoder re-scores this many retrieved chunks and keeps the best. More precise, but slower.</p>
+        </div>
+      )}
+
       {data.embeddingModel === 'gemini' && (
         <div className="form-group">
           <label className="form-label">Gemini API Key</label>
@@ -151,6 +205,19 @@ export default function ConfigPanel({ selectedNode, onNodeUpdate, config, onConf
 
   const renderLLMEngineConfig = () => (
     <>
+      <div className="form-group">
+        <label className="form-label">Provider</label>
+        <select
+          className="form-input form-select"
+          value={data.provider || ''}
+          onChange={(e) => handleChange('provider', e.target.value || null)}
+        >
+          <option value="">Server default</option>
+          <option value="gemini">Gemini</option>
+          <option value="mock">Mock (offline, for load testing)</option>
+        </select>
+      </div>
+
       <div className="form-group">
         <label className="form-label">Gemini API Key</label>
         <input
@@ -199,6 +266,47 @@ export default function ConfigPanel({ selectedNode, onNodeUpdate, config, onConf
         />
       </div>
 
+      <div className="form-group">
+        <label className="form-label">Context Token Budget</label>
+        <input
+          type="number"
+          className="form-input"
+          min="500"
+          step="500"
+          value={data.contextTokenBudget || ''}
+          onChange={(e) => handleChange('contextTokenBudget', parseInt(e.target.value, 10) || null)}
+          placeholder="Server default"
+        />
+        <p className="form-hint">Caps prompt size. The least relevant chunks and the oldest messages are dropped first.</p>
+      </div>
+
+      <div className="form-group form-toggle">
+        <label className="form-label">Cache Responses</label>
+        <label className="toggle-switch">
+          <input
+            type="checkbox"
+            checked={data.cacheResponses !== false}
+            onChange={(e) => handleChange('cacheResponses', e.target.checked)}
+          />
+          <span className="toggle-slider"></span>
+        </label>
+      </div>
+
+      {data.cacheResponses !== false && (
+        <div className="form-group">
+          <label className="form-label">Cache Scope</label>
+          <select
+            className="form-input form-select"
+            value={data.cacheScope || ''}
+            onChange={(e) => handleChange('cacheScope', e.target.value || null)}
+          >
+            <option value="">Server default</option>
+            <option value="workflow">Workflow (shared by every conversation)</option>
+            <option value="conversation">Conversation (follow-up questions)</option>
+          </select>
+        </div>
+      )}
+
       <div className="form-group form-toggle">
         <label className="form-label">Enable Web Search</label>
         <label className="toggle-switch">